@@ -89,9 +89,11 @@ def admin_users_list(request):
 
     response = paginator.get_paginated_response(results)
 
-    data = response.data
-    data["items"] = data.get("results", [])
-    data["data"] = data.get("results", [])
+    # Формат v1: те же результаты под items/data (рендерер кодирует их один раз)
+    if request.version == "1":
+        data = response.data
+        data["items"] = data["results"]
+        data["data"] = data["results"]
 
     return response
 
@@ -233,9 +235,7 @@ def admin_user_purge(request, pk: int):
 
     from storageapp import services as storage_services
 
-    qs = StoredFile.objects.filter(owner_id=u.id, is_folder=False).only("id", "rel_dir", "disk_name")
-    for sf in qs.iterator():
-        storage_services.delete_stored_file(sf)
+    storage_services.purge_items(StoredFile.objects.filter(owner_id=u.id))
 
     u.delete()
 
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_date_deleted'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='storage_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_storage_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='folder_version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
@@ -9,6 +9,10 @@ class User(AbstractBaseUser, PermissionsMixin):
     email = models.EmailField(unique=True)
     is_admin = models.BooleanField(default=False)
     storage_rel_path = models.CharField(max_length=255, default='')
+    # Счётчик изменений хранилища: растёт при любой мутации файлов пользователя
+    storage_version = models.BigIntegerField(default=0)
+    # Счётчик изменений дерева папок (ETag /api/folders/tree/)
+    folder_version = models.BigIntegerField(default=0)
 
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
@@ -180,6 +180,18 @@ class AdminUsersListTests(APITestCase):
         self.assertEqual(alpha["files_count"], 2)
         self.assertEqual(alpha["files_total_size"], 300)
 
+    def test_version_2_shape_has_results_only(self):
+        request = self.factory.get(
+            "/admin/users/", HTTP_ACCEPT="application/json; version=2"
+        )
+        force_authenticate(request, user=self.admin)
+        response = admin_users_list(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("results", response.data)
+        self.assertNotIn("items", response.data)
+        self.assertNotIn("data", response.data)
+
     def test_filter_by_query(self):
         request = self.factory.get("/admin/users/", {"q": "alp"})
         force_authenticate(request, user=self.admin)
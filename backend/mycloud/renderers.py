@@ -0,0 +1,82 @@
+"""
+Быстрый JSON-рендерер для DRF.
+
+Использует orjson, если он установлен, иначе — stdlib json с теми же
+компактными разделителями, что и стандартный JSONRenderer.
+"""
+import json
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson опционален
+    orjson = None
+
+
+_ENCODER = JSONEncoder()
+
+if orjson is not None:
+    # Даты отдаём через JSONEncoder DRF, чтобы формат не отличался от штатного
+    _ORJSON_OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+
+def dumps(data) -> bytes:
+    """
+    Компактный JSON (UTF-8) для data; неизвестные типы — через JSONEncoder DRF.
+    """
+    if orjson is not None:
+        return orjson.dumps(data, default=_ENCODER.default, option=_ORJSON_OPTIONS)
+    return json.dumps(
+        data,
+        cls=JSONEncoder,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode()
+
+
+def _dumps_shared(data: dict) -> bytes:
+    """
+    Кодирует dict верхнего уровня, сериализуя каждый список/словарь
+    только один раз, даже если он лежит под несколькими ключами
+    (results / items / data в постраничных ответах).
+    """
+    encoded: dict[int, bytes] = {}
+    parts = []
+    for key, value in data.items():
+        if isinstance(value, (list, dict)):
+            chunk = encoded.get(id(value))
+            if chunk is None:
+                chunk = encoded[id(value)] = dumps(value)
+        else:
+            chunk = dumps(value)
+        parts.append(dumps(str(key)) + b":" + chunk)
+    return b"{" + b",".join(parts) + b"}"
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson. Форматированный вывод (?indent / Browsable API)
+    по-прежнему строится штатным рендерером.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        if isinstance(data, dict):
+            containers = [id(v) for v in data.values() if isinstance(v, (list, dict))]
+            if len(containers) != len(set(containers)):
+                ret = _dumps_shared(data)
+            else:
+                ret = dumps(data)
+        else:
+            ret = dumps(data)
+
+        # Как и JSONRenderer, экранируем U+2028/U+2029 (строгое подмножество JS)
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
@@ -1,5 +1,6 @@
 from pathlib import Path
 import os
+import tempfile
 
 
 BASE_DIR = Path(__file__).resolve().parents[2]
@@ -96,6 +97,15 @@ REST_FRAMEWORK = {
     ],
     "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
     "PAGE_SIZE": 20,
+    "DEFAULT_RENDERER_CLASSES": [
+        "mycloud.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    # Версия формата ответа: Accept: application/json; version=2
+    # (v2 — списки без дублирующих ключей items/data)
+    "DEFAULT_VERSIONING_CLASS": "rest_framework.versioning.AcceptHeaderVersioning",
+    "DEFAULT_VERSION": "1",
+    "ALLOWED_VERSIONS": ["1", "2"],
 }
 
 # ---- Upload limits ----
@@ -103,6 +113,48 @@ MAX_UPLOAD_MB = int(os.environ.get("MAX_UPLOAD_MB", "2048"))  # 2 GB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 8 * 1024 * 1024    # 8 MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10 * 1024 * 1024   # 10 MB
 
+# ---- Listing cache (ключ включает User.storage_version) ----
+LISTING_CACHE_TIMEOUT = int(os.environ.get("LISTING_CACHE_TIMEOUT", "300"))
+
+# ---- Storage change feed (/api/changes/) ----
+# Курсоры старше срока хранения отвергаются (410), надгробия удаляются compact_changes
+STORAGE_CHANGES_RETENTION_DAYS = int(os.environ.get("STORAGE_CHANGES_RETENTION_DAYS", "30"))
+
+# ---- Live updates (SSE /api/events/, работает под ASGI) ----
+# LocalBroker — один процесс; FileBroker — несколько воркеров на одном хосте
+STORAGE_EVENTS_BACKEND = os.environ.get("STORAGE_EVENTS_BACKEND", "storageapp.events.LocalBroker")
+STORAGE_EVENTS_DIR = os.environ.get(
+    "STORAGE_EVENTS_DIR", os.path.join(tempfile.gettempdir(), "mycloud-events")
+)
+STORAGE_EVENTS_HEARTBEAT = int(os.environ.get("STORAGE_EVENTS_HEARTBEAT", "15"))
+
+# ---- Permanent deletion (корзина -> навсегда) ----
+# Строки удаляются пачками, блобы — после коммита пулом потоков ограниченного размера
+STORAGE_PURGE_BATCH_SIZE = int(os.environ.get("STORAGE_PURGE_BATCH_SIZE", "1000"))
+STORAGE_UNLINK_WORKERS = int(os.environ.get("STORAGE_UNLINK_WORKERS", "8"))
+
+# ---- Очистка просроченной корзины (manage.py purge_trash) ----
+# Ограничение скорости удаления блобов, файлов/с (0 — без ограничения)
+STORAGE_PURGE_UNLINK_RATE = int(os.environ.get("STORAGE_PURGE_UNLINK_RATE", "200"))
+# Каталог файловых блокировок фоновых задач (если БД не Postgres)
+STORAGE_LOCK_DIR = os.environ.get(
+    "STORAGE_LOCK_DIR", os.path.join(tempfile.gettempdir(), "mycloud-locks")
+)
+
+# ---- Серверное копирование (/api/files/copy/) ----
+# Блобы неизменяемы (запись — через os.replace), поэтому копия может быть
+# жёсткой ссылкой; False — всегда отдельный файл (reflink или копия в ядре)
+STORAGE_COPY_HARDLINKS = os.environ.get("STORAGE_COPY_HARDLINKS", "1") == "1"
+
+# ---- Idempotency-Key (повтор загрузок и массовых операций) ----
+# Сколько секунд хранится ответ запроса с ключом
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", str(24 * 3600)))
+# Как часто выполняющийся запрос продлевает свой ключ
+IDEMPOTENCY_HEARTBEAT = int(os.environ.get("IDEMPOTENCY_HEARTBEAT", "30"))
+# Через сколько секунд без продления незавершённый запрос с ключом считается
+# брошенным (воркер убит); несколько интервалов IDEMPOTENCY_HEARTBEAT
+IDEMPOTENCY_CLAIM_TIMEOUT = int(os.environ.get("IDEMPOTENCY_CLAIM_TIMEOUT", "120"))
+
 # ---- Storage quota per user ----
 USER_QUOTA_GB = int(os.environ.get("USER_QUOTA_GB", "5"))
 USER_QUOTA_BYTES = USER_QUOTA_GB * 1024 * 1024 * 1024
@@ -11,6 +11,14 @@ DATABASES = {
     }
 }
 
+# Тестовая БД откатывается между тестами, а id и storage_version
+# повторяются — общий LocMem-кэш листинга отдавал бы чужие данные.
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
+    }
+}
+
 CSRF_TRUSTED_ORIGINS = [
     "http://localhost:5173",
     "http://127.0.0.1:5173",
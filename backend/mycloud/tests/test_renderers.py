@@ -0,0 +1,51 @@
+import json
+from datetime import datetime, timezone as dt_timezone
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+
+from mycloud import renderers
+from mycloud.renderers import FastJSONRenderer
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def setUp(self):
+        self.renderer = FastJSONRenderer()
+
+    def test_matches_stock_renderer_output(self):
+        data = {
+            "name": "файл .txt",
+            "when": datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+            "n": [1, 2, 3],
+        }
+        self.assertEqual(
+            json.loads(self.renderer.render(data)),
+            json.loads(JSONRenderer().render(data)),
+        )
+        self.assertIn(b"\\u2028", self.renderer.render(data))
+
+    def test_shared_list_is_encoded_once(self):
+        results = [{"id": 1}, {"id": 2}]
+        data = {"count": 2, "results": results, "items": results, "data": results}
+
+        with patch.object(renderers, "dumps", wraps=renderers.dumps) as spy:
+            body = self.renderer.render(data)
+
+        encoded_lists = [c for c in spy.call_args_list if c.args[0] is results]
+        self.assertEqual(len(encoded_lists), 1)
+        self.assertEqual(json.loads(body), {
+            "count": 2, "results": results, "items": results, "data": results,
+        })
+
+    def test_stdlib_fallback(self):
+        with patch.object(renderers, "orjson", None):
+            body = self.renderer.render({"a": [1, "б"]})
+        self.assertEqual(json.loads(body), {"a": [1, "б"]})
+
+    def test_none_renders_empty(self):
+        self.assertEqual(self.renderer.render(None), b"")
+
+    def test_indent_falls_back_to_stock_renderer(self):
+        body = self.renderer.render({"a": 1}, "application/json; indent=2")
+        self.assertIn(b"\n", body)
@@ -0,0 +1,197 @@
+"""
+Рассылка уведомлений «хранилище пользователя изменилось» подписчикам SSE.
+
+Брокер выбирается настройкой STORAGE_EVENTS_BACKEND:
+- LocalBroker — внутри одного процесса (runserver, один воркер);
+- FileBroker — между воркерами одного хоста через файлы в STORAGE_EVENTS_DIR,
+  без внешних сервисов.
+
+Подписка хранит только последнее событие: медленный клиент не копит
+очередь, а при следующей отправке получает актуальное состояние.
+"""
+import asyncio
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+
+class Subscription:
+    """
+    Подписка одного SSE-соединения на события владельца owner_id.
+    Создаётся внутри работающего event loop.
+    """
+
+    def __init__(self, broker: "LocalBroker", owner_id: int):
+        self.broker = broker
+        self.owner_id = owner_id
+        self.loop = asyncio.get_running_loop()
+        self.coalesced = 0
+        self._event = asyncio.Event()
+        self._payload = None
+
+    def push(self, payload: dict) -> None:
+        """
+        Доставка события из любого потока.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self._push, payload)
+        except RuntimeError:
+            # loop уже закрыт — соединение умерло, отписка произойдёт в close()
+            pass
+
+    def _push(self, payload: dict) -> None:
+        if self._payload is not None:
+            self.coalesced += 1
+        self._payload = payload
+        self._event.set()
+
+    async def get(self, timeout: float) -> dict | None:
+        """
+        Ждёт событие не дольше timeout секунд; None — событий не было
+        (пора отправить heartbeat).
+        """
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._event.clear()
+        payload, self._payload = self._payload, None
+        return payload
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class LocalBroker:
+    """
+    Рассылка событий подписчикам текущего процесса.
+    """
+
+    def __init__(self, **options):
+        self._lock = threading.Lock()
+        self._subscribers: dict[int, set[Subscription]] = {}
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        sub = Subscription(self, owner_id)
+        with self._lock:
+            self._subscribers.setdefault(owner_id, set()).add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.owner_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.owner_id]
+
+    def publish(self, owner_id: int, payload: dict) -> None:
+        self._deliver(owner_id, payload)
+
+    def _deliver(self, owner_id: int, payload: dict) -> None:
+        with self._lock:
+            subs = list(self._subscribers.get(owner_id, ()))
+        for sub in subs:
+            sub.push(payload)
+
+
+class FileBroker(LocalBroker):
+    """
+    Рассылка между процессами одного хоста.
+
+    publish атомарно перезаписывает <path>/<owner_id>.json, а фоновый поток
+    (один на процесс) раз в poll_interval делает stat() файлов только тех
+    владельцев, на которых в процессе есть подписчики.
+    """
+
+    def __init__(self, path: str | None = None, poll_interval: float = 0.5, **options):
+        super().__init__(**options)
+        self.path = Path(path or settings.STORAGE_EVENTS_DIR)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.poll_interval = poll_interval
+        self._stamps: dict[int, tuple | None] = {}
+        self._watcher: threading.Thread | None = None
+
+    def _file(self, owner_id: int) -> Path:
+        return self.path / f"{owner_id}.json"
+
+    def _stamp(self, owner_id: int) -> tuple | None:
+        try:
+            st = os.stat(self._file(owner_id))
+        except FileNotFoundError:
+            return None
+        # os.replace даёт новый inode, так что публикации не теряются
+        # даже при грубом разрешении mtime
+        return st.st_ino, st.st_mtime_ns, st.st_size
+
+    def subscribe(self, owner_id: int) -> Subscription:
+        stamp = self._stamp(owner_id)
+        sub = super().subscribe(owner_id)
+        with self._lock:
+            self._stamps.setdefault(owner_id, stamp)
+            if self._watcher is None:
+                self._watcher = threading.Thread(
+                    target=self._watch, name="storage-events", daemon=True
+                )
+                self._watcher.start()
+        return sub
+
+    def publish(self, owner_id: int, payload: dict) -> None:
+        target = self._file(owner_id)
+        tmp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(json.dumps(payload).encode())
+        os.replace(tmp, target)
+
+    def poll(self) -> None:
+        """
+        Один проход наблюдателя: рассылает события по изменившимся файлам.
+        """
+        with self._lock:
+            owners = list(self._subscribers)
+            for owner_id in set(self._stamps) - set(owners):
+                del self._stamps[owner_id]
+
+        for owner_id in owners:
+            stamp = self._stamp(owner_id)
+            if stamp is None or stamp == self._stamps.get(owner_id):
+                continue
+            self._stamps[owner_id] = stamp
+            try:
+                payload = json.loads(self._file(owner_id).read_bytes())
+            except (OSError, ValueError):
+                continue
+            self._deliver(owner_id, payload)
+
+    def _watch(self) -> None:
+        while True:
+            time.sleep(self.poll_interval)
+            self.poll()
+
+
+@lru_cache(maxsize=None)
+def get_broker() -> LocalBroker:
+    return import_string(settings.STORAGE_EVENTS_BACKEND)()
+
+
+def _publish(owner_ids: set[int]) -> None:
+    broker = get_broker()
+    payload = {"type": "storage", "at": time.time()}
+    for owner_id in owner_ids:
+        broker.publish(owner_id, payload)
+
+
+def publish_storage_changed(*owner_ids: int) -> None:
+    """
+    Уведомляет подписчиков владельцев после фиксации текущей транзакции.
+    Ошибка рассылки не должна ломать саму операцию (robust).
+    """
+    ids = {pk for pk in owner_ids if pk is not None}
+    if ids:
+        transaction.on_commit(lambda: _publish(ids), robust=True)
@@ -0,0 +1,201 @@
+"""
+Заголовок Idempotency-Key для загрузок и массовых операций.
+
+Клиент, не дождавшийся ответа (таймаут мобильной сети), повторяет запрос
+с тем же ключом и получает сохранённый ответ первого выполнения — без
+повторного чтения тела и без второй копии файла. Ключ уникален в пределах
+пользователя и живёт IDEMPOTENCY_KEY_TTL секунд.
+
+Пока запрос выполняется, процесс раз в IDEMPOTENCY_HEARTBEAT секунд
+продлевает занятый ключ; ключ без продления дольше
+IDEMPOTENCY_CLAIM_TIMEOUT считается брошенным и занимается заново.
+"""
+import functools
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+HEADER = "Idempotency-Key"
+REPLAY_HEADER = "Idempotent-Replayed"
+# Хэш тела от клиента (RFC 9530), если он его присылает
+DIGEST_HEADER = "Content-Digest"
+MAX_KEY_LENGTH = 255
+
+# Ключи запросов, которые сейчас выполняет этот процесс
+_active: set[int] = set()
+_lock = threading.Lock()
+_heartbeat: threading.Thread | None = None
+
+
+def _fingerprint(request) -> str:
+    """
+    sha256 query string, типа и длины тела и Content-Digest клиента.
+
+    Тело не читается: повтор загрузки получает сохранённый ответ, не
+    разбирая multipart заново. boundary из Content-Type отбрасывается —
+    клиент выбирает его при каждой отправке.
+    """
+    content_type = request.META.get("CONTENT_TYPE", "").split(";")[0].strip().lower()
+    payload = json.dumps(
+        [
+            request.META.get("QUERY_STRING", ""),
+            content_type,
+            request.META.get("CONTENT_LENGTH", ""),
+            request.headers.get(DIGEST_HEADER, ""),
+        ]
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _hold(pk: int) -> None:
+    global _heartbeat
+    with _lock:
+        _active.add(pk)
+        if _heartbeat is None:
+            _heartbeat = threading.Thread(
+                target=_watch, name="idempotency-heartbeat", daemon=True
+            )
+            _heartbeat.start()
+
+
+def _release(pk: int) -> None:
+    with _lock:
+        _active.discard(pk)
+
+
+def _beat() -> None:
+    """
+    Один проход heartbeat: продлевает ключи запросов, выполняемых процессом.
+    """
+    with _lock:
+        ids = list(_active)
+    if ids:
+        IdempotencyKey.objects.filter(pk__in=ids, status_code__isnull=True).update(
+            heartbeat_at=timezone.now()
+        )
+
+
+def _watch() -> None:
+    while True:
+        time.sleep(settings.IDEMPOTENCY_HEARTBEAT)
+        try:
+            _beat()
+        except DatabaseError:
+            logger.warning("Failed to extend %s claims", HEADER, exc_info=True)
+        finally:
+            close_old_connections()
+
+
+def _claim(
+    request, key: str, fingerprint: str
+) -> tuple[IdempotencyKey | None, IdempotencyKey | None]:
+    """
+    Занимает ключ под текущий запрос: (новая запись, None) или
+    (None, запись предыдущего запроса с тем же ключом).
+    Просроченные и брошенные (без heartbeat — обработчик погиб) записи
+    занимаются заново.
+    """
+    for _ in range(2):
+        try:
+            with transaction.atomic():
+                record = IdempotencyKey.objects.create(
+                    owner=request.user,
+                    key=key,
+                    method=request.method,
+                    path=request.path,
+                    fingerprint=fingerprint,
+                )
+            return record, None
+        except IntegrityError:
+            previous = IdempotencyKey.objects.filter(owner=request.user, key=key).first()
+            if previous is None:
+                continue
+            stale = IdempotencyKey.objects.expired() | IdempotencyKey.objects.abandoned()
+            if stale.filter(pk=previous.pk).exists():
+                previous.delete()
+                continue
+            return None, previous
+    return None, None
+
+
+def idempotent(view):
+    """
+    Декоратор изменяющего view (ставится под @api_view/@permission_classes).
+
+    Без заголовка и для безопасных методов view вызывается как обычно.
+    Ответ < 500 сохраняется и отдаётся повторам (с заголовком
+    Idempotent-Replayed: true); ошибка сервера освобождает ключ.
+    Повтор с другими методом, путём, query string, типом или длиной тела
+    (или Content-Digest) — 422.
+    """
+
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or request.method in ("GET", "HEAD", "OPTIONS"):
+            return view(request, *args, **kwargs)
+
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"detail": f"{HEADER} is longer than {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        fingerprint = _fingerprint(request)
+        record, previous = _claim(request, key, fingerprint)
+        if record is None:
+            if previous is None:
+                return Response(
+                    {"detail": f"Could not reserve {HEADER}, retry the request"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            if (previous.method, previous.path, previous.fingerprint) != (
+                request.method, request.path, fingerprint
+            ):
+                return Response(
+                    {"detail": f"{HEADER} was already used for another request"},
+                    status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                )
+            if previous.status_code is None:
+                return Response(
+                    {"detail": f"A request with this {HEADER} is still in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            return Response(
+                previous.response,
+                status=previous.status_code,
+                headers={REPLAY_HEADER: "true"},
+            )
+
+        _hold(record.pk)
+        try:
+            response = view(request, *args, **kwargs)
+        except BaseException:
+            record.delete()
+            raise
+        finally:
+            _release(record.pk)
+
+        # Потоковые ответы и ошибки сервера не сохраняются — повтор выполнится заново
+        if response.status_code >= 500 or not isinstance(response, Response):
+            record.delete()
+            return response
+
+        record.status_code = response.status_code
+        record.response = response.data
+        record.save(update_fields=["status_code", "response"])
+        return response
+
+    return wrapper
@@ -0,0 +1,45 @@
+"""
+Блокировка фоновых задач хранилища (purge_trash и т.п.):
+одновременно задачу выполняет только один процесс.
+
+На Postgres — сессионная advisory-блокировка (работает между узлами),
+на остальных СУБД — flock файла в STORAGE_LOCK_DIR (в пределах хоста).
+"""
+import fcntl
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.db import connection
+
+
+@contextmanager
+def advisory_lock(name: str):
+    """
+    Пытается взять блокировку name, не дожидаясь её освобождения.
+    Отдаёт True, если блокировка взята, и False, если её держит другой процесс.
+    """
+    if connection.vendor == "postgresql":
+        key = zlib.crc32(name.encode())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [key])
+            acquired = cursor.fetchone()[0]
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", [key])
+        return
+
+    path = Path(settings.STORAGE_LOCK_DIR)
+    path.mkdir(parents=True, exist_ok=True)
+    with open(path / f"{name}.lock", "a") as fh:
+        try:
+            fcntl.flock(fh, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        # Блокировка снимается при закрытии файла
+        yield True
@@ -0,0 +1,78 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from storageapp.media import MEDIA_FIELDS, SNIFF_BYTES, sniff
+from storageapp.models import StoredFile, bump_storage_version, file_category
+
+
+def _read_head(path: Path) -> bytes | None:
+    """
+    Первые SNIFF_BYTES байт блоба или None, если его нет на диске.
+    """
+    try:
+        with open(path, "rb") as f:
+            return f.read(SNIFF_BYTES)
+    except FileNotFoundError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill content_type and media metadata (width, height, duration) "
+        "for files uploaded before they were detected at upload time"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=500, help="Rows per keyset batch")
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Parallel read threads (default: STORAGE_UNLINK_WORKERS)",
+        )
+
+    def handle(self, *args, **options):
+        media_root = Path(settings.MEDIA_ROOT)
+        workers = options["workers"] or settings.STORAGE_UNLINK_WORKERS
+        qs = StoredFile.objects.filter(is_folder=False, content_type="").only(
+            "id", "owner_id", "original_name", "size", "rel_dir", "disk_name", *MEDIA_FIELDS
+        )
+
+        last_id = 0
+        updated = missing = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="media") as pool:
+            while True:
+                files = list(qs.filter(id__gt=last_id).order_by("id")[: options["batch"]])
+                if not files:
+                    break
+                last_id = files[-1].id
+
+                changed = []
+                paths = [
+                    media_root / StoredFile.blob_rel_path(sf.rel_dir, sf.disk_name)
+                    for sf in files
+                ]
+                heads = pool.map(_read_head, paths)
+                for sf, head in zip(files, heads):
+                    if head is None:
+                        missing += 1
+                        continue
+                    for field, value in sniff(head, sf.original_name, sf.size).items():
+                        setattr(sf, field, value)
+                    if sf.content_type:
+                        sf.category = file_category(sf.original_name, False, sf.content_type)
+                        changed.append(sf)
+
+                if changed:
+                    with transaction.atomic():
+                        StoredFile.objects.bulk_update(changed, [*MEDIA_FIELDS, "category"])
+                        bump_storage_version(*{sf.owner_id for sf in changed})
+                    updated += len(changed)
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Files updated: {updated} (missing on disk: {missing})")
+        )
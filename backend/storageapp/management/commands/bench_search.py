@@ -0,0 +1,103 @@
+import random
+import statistics
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from storageapp import services
+from storageapp.models import StoredFile
+
+WORDS = (
+    "report", "invoice", "photo", "backup", "draft", "contract", "scan",
+    "отчёт", "договор", "фото", "смета", "презентация", "архив", "видео",
+)
+EXTENSIONS = ("pdf", "docx", "jpg", "png", "mp4", "zip", "txt", "xlsx")
+PAGE = 21
+
+
+def _name(i: int) -> str:
+    """
+    Детерминированное имя i-й строки бенча (чтобы искать заведомо существующие).
+    """
+    n = len(WORDS)
+    return f"{WORDS[i % n]}_{WORDS[(i // n) % n]}_{i}.{EXTENSIONS[i % len(EXTENSIONS)]}"
+
+
+class Command(BaseCommand):
+    help = "Benchmark name search latency on a synthetic storage (creates and drops a bench user)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument("--queries", type=int, default=30)
+        parser.add_argument("--batch", type=int, default=10_000)
+        parser.add_argument(
+            "--keep",
+            action="store_true",
+            help="Do not delete the bench user and its rows afterwards",
+        )
+
+    def handle(self, *args, **options):
+        rnd = random.Random(42)
+        suffix = uuid.uuid4().hex[:8]
+        user = get_user_model().objects.create(
+            username=f"bench{suffix}",
+            email=f"bench{suffix}@example.com",
+            full_name="Search bench",
+        )
+
+        try:
+            self._fill(user, options["rows"], options["batch"], rnd)
+            with connection.cursor() as cursor:
+                if connection.vendor == "postgresql":
+                    cursor.execute("ANALYZE storageapp_storedfile")
+
+            terms = {
+                "exact": [_name(rnd.randrange(options["rows"])) for _ in range(options["queries"])],
+                "prefix": [rnd.choice(WORDS)[:4] for _ in range(options["queries"])],
+                "substring": [rnd.choice(WORDS)[2:6] for _ in range(options["queries"])],
+                "miss": [uuid.uuid4().hex[:6] for _ in range(options["queries"])],
+            }
+
+            sample = services.search_files(user.id, terms["substring"][0])
+            self.stdout.write(sample.values_list("id")[:PAGE].explain())
+
+            for kind, queries in terms.items():
+                timings = []
+                for q in queries:
+                    started = time.perf_counter()
+                    list(services.search_files(user.id, q).values_list("id", "rank")[:PAGE])
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(
+                    f"{kind:<10} p50={statistics.median(timings):.1f}ms "
+                    f"p95={timings[int(len(timings) * 0.95) - 1]:.1f}ms "
+                    f"max={timings[-1]:.1f}ms"
+                )
+        finally:
+            if not options["keep"]:
+                # Без коллектора Django: строки бенча ни на что не ссылаются
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f"DELETE FROM {StoredFile._meta.db_table} WHERE owner_id = %s",
+                        [user.id],
+                    )
+                user.delete()
+
+    def _fill(self, user, rows: int, batch: int, rnd: random.Random) -> None:
+        created = 0
+        while created < rows:
+            chunk = [
+                StoredFile(
+                    owner=user,
+                    original_name=_name(i),
+                    size=rnd.randrange(1, 10**7),
+                    rel_dir="bench",
+                )
+                for i in range(created, min(created + batch, rows))
+            ]
+            StoredFile.objects.bulk_create(chunk, batch_size=batch)
+            created += len(chunk)
+            self.stdout.write(f"inserted {created}/{rows}")
@@ -0,0 +1,26 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from storageapp.models import StorageChange
+
+
+class Command(BaseCommand):
+    help = "Compact the storage change log (drop superseded entries and old tombstones)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=None,
+            help="Drop delete tombstones older than N days "
+            "(default: STORAGE_CHANGES_RETENTION_DAYS)",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days is None:
+            days = settings.STORAGE_CHANGES_RETENTION_DAYS
+        removed = StorageChange.objects.compact(timedelta(days=days))
+        self.stdout.write(self.style.SUCCESS(f"Change log entries removed: {removed}"))
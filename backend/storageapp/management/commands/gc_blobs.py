@@ -0,0 +1,215 @@
+import json
+import os
+import shutil
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from storageapp.locks import advisory_lock
+from storageapp.models import StoredFile
+
+LOCK_NAME = "storageapp.gc_blobs"
+TMP_SUFFIX = ".tmp"
+
+
+def _user_dirs(root: Path):
+    """
+    Каталоги пользователей: MEDIA_ROOT/u/<xx>/<username>/ (см. ensure_user_storage_dir).
+    """
+    base = root / "u"
+    if not base.is_dir():
+        return
+    with os.scandir(base) as prefixes:
+        for prefix in prefixes:
+            if not prefix.is_dir(follow_symlinks=False):
+                continue
+            with os.scandir(prefix.path) as users:
+                for user in users:
+                    if user.is_dir(follow_symlinks=False):
+                        yield Path(user.path)
+
+
+def _scan_shard(path: Path) -> list[tuple[str, str, float, int]]:
+    """
+    (имя, путь, mtime, размер) файлов одного шарда <user>/<xx>/.
+    """
+    entries = []
+    try:
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    entries.append((entry.name, entry.path, st.st_mtime, st.st_size))
+    except FileNotFoundError:
+        pass
+    return entries
+
+
+def _db_names(shard: str, batch: int):
+    """
+    disk_name строк, попадающих в шард shard, по возрастанию —
+    keyset-пачками по batch (память не зависит от числа строк).
+    """
+    lower = uuid.UUID(shard.ljust(32, "0"))
+    qs = StoredFile.objects.filter(disk_name__gte=lower)
+    if shard != "ff":
+        upper = uuid.UUID(f"{int(shard, 16) + 1:02x}".ljust(32, "0"))
+        qs = qs.filter(disk_name__lt=upper)
+
+    last = None
+    while True:
+        page = qs if last is None else qs.filter(disk_name__gt=last)
+        names = list(page.order_by("disk_name").values_list("disk_name", flat=True)[:batch])
+        if not names:
+            return
+        for name in names:
+            yield str(name)
+        last = names[-1]
+
+
+def _is_blob_name(name: str) -> bool:
+    try:
+        return str(uuid.UUID(name)) == name
+    except ValueError:
+        return False
+
+
+class Command(BaseCommand):
+    help = (
+        "Find blobs without a StoredFile row and stale .tmp files under MEDIA_ROOT; "
+        "report them, or delete/quarantine them with --delete/--quarantine"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Only touch files older than this (uploads in flight are younger)",
+        )
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument("--delete", action="store_true", help="Delete orphans")
+        action.add_argument(
+            "--quarantine",
+            metavar="DIR",
+            default=None,
+            help="Move orphans to DIR keeping their relative paths",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Parallel scandir/unlink threads (default: STORAGE_UNLINK_WORKERS)",
+        )
+        parser.add_argument("--batch", type=int, default=5000, help="DB keyset batch size")
+        parser.add_argument("--json", action="store_true", help="Print metrics as JSON")
+
+    def handle(self, *args, **options):
+        self.root = Path(settings.MEDIA_ROOT)
+        self.quarantine = Path(options["quarantine"]) if options["quarantine"] else None
+        if self.quarantine is not None and self.quarantine.resolve().is_relative_to(
+            (self.root / "u").resolve()
+        ):
+            raise CommandError("Quarantine directory must be outside MEDIA_ROOT/u")
+        self.apply = options["delete"] or self.quarantine is not None
+
+        with advisory_lock(LOCK_NAME) as acquired:
+            if not acquired:
+                self.stdout.write("Another gc_blobs run holds the lock, skipping")
+                return
+            metrics = self._collect(options)
+
+        if options["json"]:
+            self.stdout.write(json.dumps(metrics))
+        else:
+            verb = "removed" if self.apply else "found (dry run)"
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Orphans {verb}: orphans={metrics['orphans']} temp={metrics['temp']} "
+                    f"bytes={metrics['bytes']} removed={metrics['removed']} "
+                    f"(scanned {metrics['files']} files, skipped {metrics['young']} young, "
+                    f"{metrics['unknown']} unknown) in {metrics['seconds']}s"
+                )
+            )
+
+    def _collect(self, options) -> dict:
+        cutoff = time.time() - options["grace_hours"] * 3600
+        workers = options["workers"] or settings.STORAGE_UNLINK_WORKERS
+
+        shards: dict[str, list[Path]] = {}
+        for user_dir in _user_dirs(self.root):
+            with os.scandir(user_dir) as it:
+                for entry in it:
+                    name = entry.name.lower()
+                    if (
+                        entry.is_dir(follow_symlinks=False)
+                        and len(name) == 2
+                        and all(c in "0123456789abcdef" for c in name)
+                    ):
+                        shards.setdefault(name, []).append(Path(entry.path))
+
+        metrics = {
+            "files": 0, "orphans": 0, "temp": 0, "unknown": 0,
+            "young": 0, "bytes": 0, "removed": 0,
+        }
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="gc") as pool:
+            # Шард за шардом: в памяти только файлы одного двухсимвольного префикса
+            for shard in sorted(shards):
+                entries = [e for chunk in pool.map(_scan_shard, shards[shard]) for e in chunk]
+                entries.sort()
+                victims = self._diff(shard, entries, cutoff, options["batch"], metrics)
+                if self.apply and victims:
+                    metrics["removed"] += sum(pool.map(self._dispose, victims))
+        metrics["seconds"] = round(time.monotonic() - started, 3)
+        metrics["applied"] = self.apply
+        return metrics
+
+    def _diff(self, shard, entries, cutoff, batch, metrics) -> list[str]:
+        """
+        Разность «файлы шарда минус disk_name из БД» слиянием двух
+        отсортированных потоков. Возвращает пути к удалению.
+        """
+        victims = []
+        db = _db_names(shard, batch)
+        current = next(db, None)
+        for name, path, mtime, size in entries:
+            metrics["files"] += 1
+            if name.endswith(TMP_SUFFIX):
+                kind = "temp"
+            elif _is_blob_name(name):
+                while current is not None and current < name:
+                    current = next(db, None)
+                if current == name:
+                    continue
+                kind = "orphans"
+            else:
+                metrics["unknown"] += 1
+                continue
+
+            if mtime > cutoff:
+                metrics["young"] += 1
+                continue
+            metrics[kind] += 1
+            metrics["bytes"] += size
+            victims.append(path)
+        return victims
+
+    def _dispose(self, path: str) -> bool:
+        try:
+            if self.quarantine is None:
+                os.unlink(path)
+                return True
+            target = self.quarantine / os.path.relpath(path, self.root)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(path, target)
+            return True
+        except FileNotFoundError:
+            return False
+        except OSError as exc:
+            self.stderr.write(f"Failed to remove {path}: {exc}")
+            return False
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from storageapp.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than IDEMPOTENCY_KEY_TTL"
+
+    def handle(self, *args, **options):
+        removed, _ = IdempotencyKey.objects.expired().delete()
+        self.stdout.write(self.style.SUCCESS(f"Idempotency keys removed: {removed}"))
@@ -0,0 +1,99 @@
+import json
+import logging
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from storageapp import services
+from storageapp.locks import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = "storageapp.purge_trash"
+
+
+class Command(BaseCommand):
+    help = "Permanently delete expired trash (older than 30 days) in batches"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Trash roots per transaction (their subtrees are deleted with them)",
+        )
+        parser.add_argument(
+            "--max-batches",
+            type=int,
+            default=None,
+            help="Stop after N batches (the rest is picked up by the next run)",
+        )
+        parser.add_argument(
+            "--unlink-rate",
+            type=int,
+            default=None,
+            help="Max blobs unlinked per second, 0 = unlimited "
+            "(default: STORAGE_PURGE_UNLINK_RATE)",
+        )
+        parser.add_argument(
+            "--every",
+            type=int,
+            default=None,
+            help="Keep running and purge every N seconds (in-process scheduler)",
+        )
+        parser.add_argument(
+            "--json",
+            action="store_true",
+            help="Print metrics as one JSON object per run",
+        )
+
+    def handle(self, *args, **options):
+        unlink_rate = options["unlink_rate"]
+        if unlink_rate is None:
+            unlink_rate = settings.STORAGE_PURGE_UNLINK_RATE
+
+        # SIGTERM/SIGINT дожидаются конца текущей пачки
+        stop = threading.Event()
+        previous = {
+            sig: signal.signal(sig, lambda *_: stop.set())
+            for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        try:
+            while True:
+                self._run_once(options, unlink_rate, stop)
+                if options["every"] is None or stop.wait(options["every"]):
+                    break
+        finally:
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+    def _run_once(self, options, unlink_rate: int, stop: threading.Event) -> None:
+        with advisory_lock(LOCK_NAME) as acquired:
+            if not acquired:
+                self.stdout.write("Another purge_trash run holds the lock, skipping")
+                return
+
+            started = time.monotonic()
+            metrics = services.purge_expired(
+                batch_size=options["batch_size"],
+                max_batches=options["max_batches"],
+                unlink_rate=unlink_rate,
+                should_stop=stop.is_set,
+            )
+            metrics["seconds"] = round(time.monotonic() - started, 3)
+            metrics["interrupted"] = stop.is_set()
+
+        logger.info("purge_trash finished", extra={"metrics": metrics})
+        if options["json"]:
+            self.stdout.write(json.dumps(metrics))
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Expired trash purged: batches={metrics['batches']} "
+                    f"rows={metrics['deleted']} files={metrics['files']} "
+                    f"bytes={metrics['bytes']} in {metrics['seconds']}s"
+                )
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from storageapp import services
+
+
+class Command(BaseCommand):
+    help = "Recalculate folder aggregates (total_size, file_count, child_count)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--user",
+            type=int,
+            default=None,
+            help="Rebuild only folders of the given owner id",
+        )
+
+    def handle(self, *args, **options):
+        changed = services.rebuild_folder_stats(owner_id=options["user"])
+        self.stdout.write(self.style.SUCCESS(f"Folders updated: {changed}"))
@@ -0,0 +1,216 @@
+import json
+import os
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from storageapp.locks import advisory_lock
+from storageapp.models import StorageChange, StoredFile, bump_storage_version
+
+LOCK_NAME = "storageapp.storage_fsck"
+
+ROW_FIELDS = (
+    "id", "owner_id", "parent_id", "rel_dir", "disk_name", "size", "is_deleted", "uploaded_at",
+)
+
+
+def _stat(path: str) -> int | None:
+    """
+    Размер файла на диске или None, если его нет.
+    """
+    try:
+        return os.stat(path).st_size
+    except FileNotFoundError:
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that every StoredFile blob exists on disk with the recorded size; "
+        "stream problems as JSON lines, optionally repair them"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=2000, help="Rows per keyset batch")
+        parser.add_argument(
+            "--grace-hours",
+            type=float,
+            default=24,
+            help="Skip rows uploaded more recently (their blobs may still be in flight)",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=None,
+            help="Parallel stat threads (default: STORAGE_UNLINK_WORKERS)",
+        )
+        parser.add_argument(
+            "--report",
+            metavar="FILE",
+            default=None,
+            help="Write the JSON lines report to FILE instead of stdout",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            metavar="FILE",
+            default=None,
+            help="Save progress to FILE after every batch and resume from it on restart",
+        )
+        parser.add_argument(
+            "--fix-sizes",
+            action="store_true",
+            help="Set size to the actual file size (folder aggregates follow)",
+        )
+        parser.add_argument(
+            "--trash-missing",
+            action="store_true",
+            help="Move live rows whose blob is missing to the trash",
+        )
+
+    def handle(self, *args, **options):
+        with advisory_lock(LOCK_NAME) as acquired:
+            if not acquired:
+                self.stderr.write("Another storage_fsck run holds the lock, skipping")
+                return
+
+            if options["report"]:
+                with open(options["report"], "a", encoding="utf-8") as report:
+                    summary = self._check(options, report)
+            else:
+                summary = self._check(options, self.stdout)
+
+        self.stderr.write(
+            f"Checked {summary['checked']} files: missing={summary['missing']} "
+            f"size_mismatch={summary['size_mismatch']} repaired={summary['repaired']} "
+            f"(skipped {summary['young']} young) "
+            f"in {summary['seconds']}s"
+        )
+
+    def _check(self, options, report) -> dict:
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        last_id = 0
+        if checkpoint is not None and checkpoint.exists():
+            last_id = json.loads(checkpoint.read_text())["last_id"]
+
+        summary = {
+            "checked": 0, "missing": 0, "size_mismatch": 0,
+            "repaired": 0, "young": 0, "resumed_from": last_id,
+        }
+        # save_uploaded создаёт строку до записи блоба и уточняет размер после:
+        # свежие строки не проверяются, чтобы не «чинить» идущие загрузки
+        cutoff = timezone.now() - timedelta(hours=options["grace_hours"])
+        media_root = Path(settings.MEDIA_ROOT)
+        workers = options["workers"] or settings.STORAGE_UNLINK_WORKERS
+        started = time.monotonic()
+
+        with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="fsck") as pool:
+            while True:
+                rows = list(
+                    StoredFile.objects.filter(is_folder=False, id__gt=last_id)
+                    .order_by("id")
+                    .values(*ROW_FIELDS)[: options["batch"]]
+                )
+                if not rows:
+                    break
+
+                last_id = rows[-1]["id"]
+                young = sum(1 for r in rows if r["uploaded_at"] > cutoff)
+                rows = [r for r in rows if r["uploaded_at"] <= cutoff]
+                summary["young"] += young
+                paths = [
+                    str(media_root / StoredFile.blob_rel_path(r["rel_dir"], r["disk_name"]))
+                    for r in rows
+                ]
+                problems = []
+                for row, actual in zip(rows, pool.map(_stat, paths)):
+                    if actual is None:
+                        problems.append({"problem": "missing", "actual": None, "row": row})
+                    elif actual != row["size"]:
+                        problems.append(
+                            {"problem": "size_mismatch", "actual": actual, "row": row}
+                        )
+
+                repaired = self._repair(problems, options) if problems else set()
+                for item in problems:
+                    row = item["row"]
+                    summary[item["problem"]] += 1
+                    report.write(
+                        json.dumps(
+                            {
+                                "id": row["id"],
+                                "owner": row["owner_id"],
+                                "path": StoredFile.blob_rel_path(
+                                    row["rel_dir"], row["disk_name"]
+                                ),
+                                "problem": item["problem"],
+                                "size": row["size"],
+                                "actual": item["actual"],
+                                "repaired": row["id"] in repaired,
+                            }
+                        )
+                        + "\n"
+                    )
+                report.flush()
+
+                summary["checked"] += len(rows)
+                summary["repaired"] += len(repaired)
+                if checkpoint is not None:
+                    tmp = checkpoint.with_name(checkpoint.name + ".tmp")
+                    tmp.write_text(json.dumps({"last_id": last_id}))
+                    os.replace(tmp, checkpoint)
+
+        # Проход завершён — следующий запуск начнёт сначала
+        if checkpoint is not None and checkpoint.exists():
+            checkpoint.unlink()
+
+        summary["seconds"] = round(time.monotonic() - started, 3)
+        report.write(json.dumps({"summary": summary}) + "\n")
+        return summary
+
+    def _repair(self, problems: list[dict], options) -> set[int]:
+        """
+        Исправляет найденное в пачке; возвращает id исправленных строк.
+        """
+        repaired: set[int] = set()
+
+        if options["fix_sizes"]:
+            actual = {
+                item["row"]["id"]: item["actual"]
+                for item in problems
+                if item["problem"] == "size_mismatch"
+            }
+            if actual:
+                with transaction.atomic():
+                    files = list(
+                        StoredFile.objects.select_for_update().filter(pk__in=actual)
+                    )
+                    for sf in files:
+                        delta = actual[sf.pk] - sf.size
+                        if not delta:
+                            continue
+                        sf.size = actual[sf.pk]
+                        sf.save(update_fields=["size"])
+                        StoredFile.objects.shift_folder_stats(sf.parent_id, size=delta)
+                        repaired.add(sf.pk)
+                    changed = [sf for sf in files if sf.pk in repaired]
+                    StorageChange.objects.record(StorageChange.CONTENT, changed)
+                    bump_storage_version(*{sf.owner_id for sf in changed})
+
+        if options["trash_missing"]:
+            missing = [
+                item["row"]["id"]
+                for item in problems
+                if item["problem"] == "missing" and not item["row"]["is_deleted"]
+            ]
+            if missing:
+                with transaction.atomic():
+                    StoredFile.objects.filter(pk__in=missing).move_to_trash()
+                repaired.update(missing)
+
+        return repaired
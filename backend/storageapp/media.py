@@ -0,0 +1,282 @@
+"""
+Тип содержимого по сигнатуре (magic bytes) и метаданные медиа из заголовка
+файла: размеры изображения/видео, длительность аудио/видео.
+
+Читается только начало файла (SNIFF_BYTES) — его save_uploaded уже держит
+в памяти, поэтому определение типа не требует повторного чтения блоба.
+Значения сохраняются в StoredFile при загрузке и больше не вычисляются.
+"""
+import mimetypes
+import struct
+
+# Сколько байт от начала файла нужно для определения типа и метаданных
+SNIFF_BYTES = 64 * 1024
+
+# Поля StoredFile, заполняемые sniff()
+MEDIA_FIELDS = ("content_type", "width", "height", "duration")
+
+# Контейнеры, внутри которых лежат форматы с собственным типом (docx, odt, jar, ...):
+# для них уточнённый по имени тип точнее сигнатуры
+_GENERIC_TYPES = {"application/zip", "application/octet-stream"}
+
+# Простые сигнатуры: префикс -> MIME-тип
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"PK\x05\x06", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"Rar!\x1a\x07", "application/vnd.rar"),
+    (b"\xfd7zXZ\x00", "application/x-xz"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"\x00\x00\x01\x00", "image/x-icon"),
+    (b"OggS", "audio/ogg"),
+    (b"\xff\xfb", "audio/mpeg"),
+    (b"\xff\xf3", "audio/mpeg"),
+    (b"\xff\xf2", "audio/mpeg"),
+    (b"\xff\xf1", "audio/aac"),
+    (b"\xff\xf9", "audio/aac"),
+)
+
+# Бренды ISO BMFF (ftyp), отличные от video/mp4
+_FTYP_BRANDS = {
+    b"qt  ": "video/quicktime",
+    b"M4A ": "audio/mp4",
+    b"M4B ": "audio/mp4",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"mif1": "image/heif",
+    b"avif": "image/avif",
+}
+
+# Размеры DIB-заголовка BMP: BITMAPCOREHEADER, INFO, V2..V5
+_BMP_DIB_SIZES = {12, 40, 52, 56, 64, 108, 124}
+
+# Верхняя граница размеров в пикселях (PositiveIntegerField на Postgres — int4)
+_MAX_DIMENSION = 2**31 - 1
+
+# Маркеры SOF в JPEG (кроме DHT/JPG/DAC), содержащие размеры кадра
+_JPEG_SOF = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+def sniff(head: bytes, name: str = "", size: int | None = None) -> dict:
+    """
+    {"content_type", "width", "height", "duration"} по первым байтам файла;
+    size — полный размер файла (сверяется с заголовком BMP).
+
+    Без распознанной сигнатуры (текст, svg, ...) тип берётся по имени
+    (mimetypes), неизвестное — пустая строка. Размеры и длительность —
+    None, если их нет в заголовке или они вне допустимого диапазона.
+    """
+    info = dict.fromkeys(MEDIA_FIELDS)
+    content_type, parse = _detect(head, size)
+    if parse is not None:
+        try:
+            info.update(parse(head))
+        except (struct.error, IndexError, ValueError):
+            # Обрезанный или повреждённый заголовок: тип известен, метаданных нет
+            pass
+    for field in ("width", "height"):
+        if info[field] is not None and not 0 < info[field] <= _MAX_DIMENSION:
+            info[field] = None
+    if not content_type or content_type in _GENERIC_TYPES:
+        guessed, _ = mimetypes.guess_type(name or "")
+        content_type = guessed or content_type
+    info["content_type"] = content_type
+    return info
+
+
+def _detect(head: bytes, size: int | None = None):
+    """
+    (MIME-тип, разборщик метаданных или None); ("", None) — сигнатура неизвестна.
+
+    Короткие сигнатуры (BM, ID3, BZh) встречаются в начале обычного текста,
+    поэтому для них проверяются и соседние поля заголовка.
+    """
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png", _png_size
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif", _gif_size
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg", _jpeg_size
+    if _is_bmp(head, size):
+        return "image/bmp", _bmp_size
+    if _is_id3(head):
+        return "audio/mpeg", None
+    if _is_bzip2(head):
+        return "application/x-bzip2", None
+    if head.startswith(b"RIFF"):
+        return _RIFF.get(head[8:12], ("", None))
+    if head.startswith(b"fLaC"):
+        return "audio/flac", _flac_duration
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4"), _mp4_meta
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return ("video/webm" if b"webm" in head[:64] else "video/x-matroska"), None
+    for prefix, content_type in _SIGNATURES:
+        if head.startswith(prefix):
+            return content_type, None
+    return "", None
+
+
+def _is_bmp(head: bytes, size: int | None) -> bool:
+    if not head.startswith(b"BM") or len(head) < 26:
+        return False
+    file_size, reserved, _, dib_size = struct.unpack("<IIII", head[2:18])
+    if reserved or dib_size not in _BMP_DIB_SIZES:
+        return False
+    return size is None or file_size == size
+
+
+def _is_id3(head: bytes) -> bool:
+    # ID3v2: версия 2..4, ревизия 0, младшие биты флагов нулевые,
+    # размер — 4 байта synchsafe (старший бит каждого — 0)
+    return (
+        head.startswith(b"ID3")
+        and len(head) >= 10
+        and head[3] in (2, 3, 4)
+        and head[4] == 0
+        and not head[5] & 0x0F
+        and all(b < 0x80 for b in head[6:10])
+    )
+
+
+def _is_bzip2(head: bytes) -> bool:
+    # "BZh" + уровень 1..9 + магия первого блока (π) или пустого потока (√π)
+    return (
+        head.startswith(b"BZh")
+        and head[3:4] in (b"1", b"2", b"3", b"4", b"5", b"6", b"7", b"8", b"9")
+        and head[4:10] in (b"1AY&SY", b"\x17\x72\x45\x38\x50\x90")
+    )
+
+
+def _png_size(head: bytes) -> dict:
+    width, height = struct.unpack(">II", head[16:24])
+    return {"width": width, "height": height}
+
+
+def _gif_size(head: bytes) -> dict:
+    width, height = struct.unpack("<HH", head[6:10])
+    return {"width": width, "height": height}
+
+
+def _bmp_size(head: bytes) -> dict:
+    # Высота отрицательна у BMP, записанных сверху вниз
+    width, height = struct.unpack("<ii", head[18:26])
+    return {"width": width, "height": abs(height)}
+
+
+def _jpeg_size(head: bytes) -> dict:
+    pos = 2
+    while pos + 9 <= len(head):
+        if head[pos] != 0xFF:
+            return {}
+        marker = head[pos + 1]
+        if marker == 0xFF:
+            pos += 1
+            continue
+        (length,) = struct.unpack(">H", head[pos + 2:pos + 4])
+        if marker in _JPEG_SOF:
+            height, width = struct.unpack(">HH", head[pos + 5:pos + 9])
+            return {"width": width, "height": height}
+        pos += 2 + length
+    return {}
+
+
+def _webp_size(head: bytes) -> dict:
+    chunk = head[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", head[26:30])
+        return {"width": width & 0x3FFF, "height": height & 0x3FFF}
+    if chunk == b"VP8L":
+        (bits,) = struct.unpack("<I", head[21:25])
+        return {"width": (bits & 0x3FFF) + 1, "height": ((bits >> 14) & 0x3FFF) + 1}
+    if chunk == b"VP8X":
+        width = int.from_bytes(head[24:27], "little") + 1
+        height = int.from_bytes(head[27:30], "little") + 1
+        return {"width": width, "height": height}
+    return {}
+
+
+def _wav_duration(head: bytes) -> dict:
+    pos = 12
+    byte_rate = None
+    while pos + 8 <= len(head):
+        chunk = head[pos:pos + 4]
+        (size,) = struct.unpack("<I", head[pos + 4:pos + 8])
+        if chunk == b"fmt ":
+            (byte_rate,) = struct.unpack("<I", head[pos + 16:pos + 20])
+        elif chunk == b"data":
+            if byte_rate:
+                return {"duration": round(size / byte_rate, 3)}
+            return {}
+        pos += 8 + size + (size & 1)
+    return {}
+
+
+# RIFF-контейнеры: форма (байты 8..12) -> (MIME-тип, разборщик)
+_RIFF = {
+    b"WEBP": ("image/webp", _webp_size),
+    b"WAVE": ("audio/wav", _wav_duration),
+    b"AVI ": ("video/x-msvideo", None),
+}
+
+
+def _flac_duration(head: bytes) -> dict:
+    # STREAMINFO — всегда первый блок: 20 бит частоты, ..., 36 бит числа сэмплов
+    packed = int.from_bytes(head[18:26], "big")
+    rate = packed >> 44
+    samples = packed & ((1 << 36) - 1)
+    if not rate or not samples:
+        return {}
+    return {"duration": round(samples / rate, 3)}
+
+
+def _boxes(data: bytes, start: int, end: int):
+    """
+    (тип, начало тела, конец тела) боксов ISO BMFF в data[start:end].
+    """
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack(">I4s", data[pos:pos + 8])
+        body = pos + 8
+        if size == 1:
+            (size,) = struct.unpack(">Q", data[body:body + 8])
+            body += 8
+        elif size == 0:
+            size = end - pos
+        if size < body - pos:
+            return
+        yield kind, body, min(pos + size, end)
+        pos += size
+
+
+def _mp4_meta(head: bytes) -> dict:
+    """
+    Длительность из moov/mvhd и размеры кадра из первого tkhd с ненулевой
+    шириной. Работает, когда moov в начале файла (faststart); иначе —
+    только тип.
+    """
+    meta = {}
+    for kind, body, end in _boxes(head, 0, len(head)):
+        if kind != b"moov":
+            continue
+        for child, cbody, cend in _boxes(head, body, end):
+            if child == b"mvhd":
+                if head[cbody] == 1:
+                    timescale, duration = struct.unpack(">IQ", head[cbody + 20:cbody + 32])
+                else:
+                    timescale, duration = struct.unpack(">II", head[cbody + 12:cbody + 20])
+                if timescale:
+                    meta["duration"] = round(duration / timescale, 3)
+            elif child == b"trak" and "width" not in meta:
+                for box, tbody, _ in _boxes(head, cbody, cend):
+                    if box != b"tkhd":
+                        continue
+                    offset = tbody + (88 if head[tbody] == 1 else 76)
+                    width, height = struct.unpack(">II", head[offset:offset + 8])
+                    if width:
+                        meta["width"], meta["height"] = width >> 16, height >> 16
+        break
+    return meta
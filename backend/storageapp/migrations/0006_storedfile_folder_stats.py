@@ -0,0 +1,101 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:00
+
+from django.db import migrations, models
+
+
+def backfill_folder_stats(apps, schema_editor):
+    """
+    Считает агрегаты папок по живым потомкам. Логика зафиксирована здесь
+    (а не взята из services.rebuild_folder_stats), чтобы миграция не
+    менялась вместе с живым кодом: на этот момент в корзину попадала
+    только сама строка, поддеревьев удалённых папок ещё не было.
+    """
+    StoredFile = apps.get_model("storageapp", "StoredFile")
+
+    parent_of = {}
+    stats = {}
+    alive_files = []
+    alive_folders = []
+    for pk, parent_id, is_folder, is_deleted, size in StoredFile.objects.values_list(
+        "id", "parent_id", "is_folder", "is_deleted", "size"
+    ).iterator(chunk_size=5000):
+        if is_folder:
+            parent_of[pk] = parent_id
+            stats[pk] = [0, 0, 0]
+            if not is_deleted:
+                alive_folders.append(pk)
+        elif not is_deleted and parent_id is not None:
+            alive_files.append((parent_id, int(size or 0)))
+
+    for parent_id, size in alive_files:
+        acc = stats.get(parent_id)
+        if acc is not None:
+            acc[0] += size
+            acc[1] += 1
+            acc[2] += 1
+
+    depth = {}
+
+    def _depth(pk):
+        chain = []
+        cur = pk
+        while cur is not None and cur not in depth and cur in parent_of:
+            chain.append(cur)
+            cur = parent_of[cur]
+        base = depth.get(cur, -1) if cur is not None else -1
+        for node in reversed(chain):
+            base += 1
+            depth[node] = base
+        return depth[pk]
+
+    # Снизу вверх: папка прибавляется к родителю после своих потомков
+    for pk in sorted(alive_folders, key=_depth, reverse=True):
+        acc = stats.get(parent_of[pk]) if parent_of[pk] is not None else None
+        if acc is not None:
+            acc[0] += stats[pk][0]
+            acc[1] += stats[pk][1]
+            acc[2] += 1
+
+    changed = []
+    folders = StoredFile.objects.filter(is_folder=True).only(
+        "id", "total_size", "file_count", "child_count"
+    )
+    for folder in folders.iterator(chunk_size=5000):
+        total_size, file_count, child_count = stats[folder.id]
+        if (folder.total_size, folder.file_count, folder.child_count) != (
+            total_size, file_count, child_count,
+        ):
+            folder.total_size = total_size
+            folder.file_count = file_count
+            folder.child_count = child_count
+            changed.append(folder)
+
+    StoredFile.objects.bulk_update(
+        changed, ["total_size", "file_count", "child_count"], batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storageapp', '0005_alter_storedfile_deleted_from'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='child_count',
+            field=models.IntegerField(default=0, help_text='Количество живых непосредственных потомков папки.'),
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='file_count',
+            field=models.BigIntegerField(default=0, help_text='Количество живых файлов в поддереве папки.'),
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='total_size',
+            field=models.BigIntegerField(default=0, help_text='Суммарный размер живых файлов в поддереве папки.'),
+        ),
+        migrations.RunPython(backfill_folder_stats, migrations.RunPython.noop),
+    ]
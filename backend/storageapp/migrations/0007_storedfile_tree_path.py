@@ -0,0 +1,62 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:03
+
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+
+
+def backfill_tree_paths(apps, schema_editor):
+    """
+    Заполняет tree_path уровень за уровнем, начиная с корневых объектов
+    (у них остаётся значение по умолчанию "/"). Дети читаются и
+    обновляются пачками по BATCH_SIZE.
+    """
+    StoredFile = apps.get_model("storageapp", "StoredFile")
+
+    frontier = {
+        pk: f"/{pk}/"
+        for pk in StoredFile.objects.filter(
+            parent__isnull=True, is_folder=True
+        ).values_list("id", flat=True)
+    }
+
+    while frontier:
+        parent_ids = list(frontier)
+        next_frontier = {}
+
+        pending = []
+
+        for start in range(0, len(parent_ids), BATCH_SIZE):
+            chunk = parent_ids[start:start + BATCH_SIZE]
+            children = StoredFile.objects.filter(parent_id__in=chunk).only(
+                "id", "parent_id", "is_folder", "tree_path"
+            )
+            for child in children.iterator(chunk_size=BATCH_SIZE):
+                child.tree_path = frontier[child.parent_id]
+                if child.is_folder:
+                    next_frontier[child.id] = f"{child.tree_path}{child.id}/"
+                pending.append(child)
+                if len(pending) >= BATCH_SIZE:
+                    StoredFile.objects.bulk_update(pending, ["tree_path"])
+                    pending = []
+
+        if pending:
+            StoredFile.objects.bulk_update(pending, ["tree_path"])
+
+        frontier = next_frontier
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storageapp', '0006_storedfile_folder_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='tree_path',
+            field=models.CharField(db_index=True, default='/', help_text="Материализованный путь: id предков от корня к родителю в виде /1/5/9/ ('/' — объект в корне).", max_length=1024),
+        ),
+        migrations.RunPython(backfill_tree_paths, migrations.RunPython.noop),
+    ]
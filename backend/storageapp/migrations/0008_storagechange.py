@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storageapp', '0007_storedfile_tree_path'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StorageChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('create', 'Создание'), ('rename', 'Переименование'), ('update', 'Изменение атрибутов'), ('move', 'Перемещение'), ('trash', 'Перемещение в корзину'), ('restore', 'Восстановление'), ('delete', 'Окончательное удаление'), ('content', 'Изменение содержимого')], max_length=16)),
+                ('file_id', models.BigIntegerField()),
+                ('parent_id', models.BigIntegerField(blank=True, null=True)),
+                ('name', models.CharField(max_length=255)),
+                ('is_folder', models.BooleanField(default=False)),
+                ('size', models.BigIntegerField(default=0)),
+                ('is_deleted', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='storage_changes', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['owner', 'id'], name='storageapp__owner_i_4fea6a_idx'), models.Index(fields=['owner', 'file_id', 'id'], name='storageapp__owner_i_9b75df_idx')],
+            },
+        ),
+    ]
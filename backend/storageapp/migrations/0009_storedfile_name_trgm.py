@@ -0,0 +1,36 @@
+from django.db import migrations
+
+
+# Триграммный индекс под поиск по подстроке имени:
+# Django строит icontains на Postgres как UPPER("original_name"::text) LIKE UPPER(%s),
+# поэтому индексируется ровно это выражение.
+INDEX_NAME = "storedfile_name_trgm"
+
+
+def create_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return  # SQLite (тесты, dev): поиск работает обычным LIKE
+    schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    schema_editor.execute(
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME} "
+        f"ON storageapp_storedfile USING gin (UPPER(original_name::text) gin_trgm_ops)"
+    )
+
+
+def drop_trgm_index(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}")
+
+
+class Migration(migrations.Migration):
+    # CONCURRENTLY нельзя выполнять внутри транзакции
+    atomic = False
+
+    dependencies = [
+        ("storageapp", "0008_storagechange"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trgm_index, drop_trgm_index),
+    ]
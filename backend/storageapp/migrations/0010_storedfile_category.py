@@ -0,0 +1,75 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:37
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Q
+
+# Снимок storageapp.models.CATEGORY_EXTENSIONS на момент миграции:
+# дальнейшие правки карты категорий не должны менять её результат
+FOLDER_CATEGORY = "folder"
+CATEGORY_EXTENSIONS = {
+    "image": {"jpg", "jpeg", "png", "gif", "bmp", "webp", "svg", "heic", "tif", "tiff", "ico"},
+    "video": {"mp4", "mov", "avi", "mkv", "webm", "m4v", "wmv"},
+    "audio": {"mp3", "wav", "flac", "ogg", "m4a", "aac"},
+    "document": {
+        "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx",
+        "odt", "ods", "odp", "txt", "rtf", "csv", "md",
+    },
+    "archive": {"zip", "rar", "7z", "tar", "gz", "bz2", "xz", "tgz"},
+}
+
+
+def backfill_categories(apps, schema_editor):
+    """
+    Проставляет category существующим строкам: по одному UPDATE на категорию
+    (совпадение расширения через iendswith), остальные остаются "other".
+    """
+    StoredFile = apps.get_model("storageapp", "StoredFile")
+
+    StoredFile.objects.filter(is_folder=True).update(category=FOLDER_CATEGORY)
+    for category, extensions in CATEGORY_EXTENSIONS.items():
+        by_extension = Q()
+        for ext in extensions:
+            by_extension |= Q(original_name__iendswith=f".{ext}")
+        StoredFile.objects.filter(by_extension, is_folder=False).update(category=category)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('storageapp', '0009_storedfile_name_trgm'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='category',
+            field=models.CharField(default='other', help_text='Тип файла для фильтра ?type= (см. file_category).', max_length=16),
+        ),
+        migrations.RunPython(backfill_categories, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['owner', 'parent', '-is_folder', 'original_name'], name='sf_dir_name'),
+        ),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['owner', 'parent', '-is_folder', '-total_size', '-size'], name='sf_dir_size'),
+        ),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['owner', 'parent', '-is_folder', '-uploaded_at'], name='sf_dir_uploaded'),
+        ),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['owner', 'parent', '-is_folder', '-last_downloaded_at'], name='sf_dir_downloaded'),
+        ),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['owner', '-uploaded_at'], name='sf_recent'),
+        ),
+        migrations.AddIndex(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False)), fields=['owner', 'category', '-uploaded_at'], name='sf_type_uploaded'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:42
+
+from django.conf import settings
+from django.db import migrations, models
+
+from storageapp.operations import (
+    AddIndexConcurrently,
+    AddUniqueConstraintConcurrently,
+    RemoveIndexConcurrently,
+)
+
+
+class Migration(migrations.Migration):
+    # Индексы на Postgres строятся CONCURRENTLY — вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('storageapp', '0010_storedfile_category'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    # Сначала строим новые индексы, затем убираем старые,
+    # чтобы запросы ни в какой момент не остались без индекса.
+    operations = [
+        AddIndexConcurrently(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['owner', '-deleted_at'], name='sf_trash'),
+        ),
+        AddIndexConcurrently(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', True)), fields=['deleted_at'], name='sf_trash_expiry'),
+        ),
+        AddIndexConcurrently(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_folder', False)), fields=['owner', 'size'], name='sf_usage'),
+        ),
+        AddUniqueConstraintConcurrently(
+            model_name='storedfile',
+            constraint=models.UniqueConstraint(condition=models.Q(('public_token__isnull', False)), fields=('public_token',), name='sf_public_token_uniq'),
+        ),
+        migrations.AlterField(
+            model_name='storedfile',
+            name='public_token',
+            field=models.CharField(blank=True, help_text='Токен публичной ссылки (уникален среди непустых, см. Meta).', max_length=64, null=True),
+        ),
+        # (owner, rel_dir) не использует ни один запрос
+        RemoveIndexConcurrently(
+            model_name='storedfile',
+            name='storageapp__owner_i_d4b18b_idx',
+        ),
+        # заменён частичным sf_trash_expiry
+        RemoveIndexConcurrently(
+            model_name='storedfile',
+            name='storageapp__is_dele_a42913_idx',
+        ),
+        migrations.AlterField(
+            model_name='storedfile',
+            name='is_deleted',
+            field=models.BooleanField(default=False, help_text='Флаг soft-delete: файл перемещён в корзину.'),
+        ),
+        migrations.AlterField(
+            model_name='storedfile',
+            name='is_folder',
+            field=models.BooleanField(default=False, help_text='Является ли объект папкой'),
+        ),
+    ]
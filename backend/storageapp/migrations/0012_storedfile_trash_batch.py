@@ -0,0 +1,62 @@
+# Generated by Django 5.2.5 on 2026-10-19 08:52
+
+import uuid
+
+from django.conf import settings
+from django.db import migrations, models
+
+from storageapp.operations import AddIndexConcurrently, RemoveIndexConcurrently
+
+
+def trash_legacy_subtrees(apps, schema_editor):
+    """
+    Раньше в корзину попадала только строка папки, а её поддерево
+    оставалось «живым». Помечаем такие поддеревья удалёнными той же
+    операцией, что и папку: один UPDATE на папку из корзины.
+
+    Агрегаты папок поддерева при этом уже посчитаны по живым потомкам,
+    то есть совпадают с тем, что вернёт restore().
+    """
+    StoredFile = apps.get_model("storageapp", "StoredFile")
+
+    roots = list(
+        StoredFile.objects.filter(is_deleted=True, trash_batch__isnull=True).values_list(
+            "id", "is_folder", "tree_path", "deleted_at"
+        )
+    )
+    for pk, is_folder, tree_path, deleted_at in roots:
+        batch = uuid.uuid4()
+        if is_folder:
+            StoredFile.objects.filter(tree_path__startswith=f"{tree_path}{pk}/").update(
+                is_deleted=True, deleted_at=deleted_at, trash_batch=batch
+            )
+        StoredFile.objects.filter(pk=pk).update(trash_batch=batch)
+
+
+class Migration(migrations.Migration):
+    # Индексы на Postgres строятся CONCURRENTLY — вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('storageapp', '0011_storedfile_index_review'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='trash_batch',
+            field=models.UUIDField(blank=True, help_text='Операция удаления в корзину: общая у папки и её поддерева, по ней восстанавливается ровно удалённое вместе с папкой.', null=True),
+        ),
+        migrations.RunPython(trash_legacy_subtrees, migrations.RunPython.noop, atomic=True),
+        # Корзина теперь содержит поддеревья папок — индекс листинга
+        # сужаем до корней корзины, затем убираем старый
+        AddIndexConcurrently(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', True), ('parent__isnull', True)), fields=['owner', '-deleted_at'], name='sf_trash_roots'),
+        ),
+        RemoveIndexConcurrently(
+            model_name='storedfile',
+            name='sf_trash',
+        ),
+    ]
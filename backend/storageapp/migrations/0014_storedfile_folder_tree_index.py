@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:30
+
+from django.conf import settings
+from django.db import migrations, models
+
+from storageapp.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Индекс на Postgres строится CONCURRENTLY — вне транзакции
+    atomic = False
+
+    dependencies = [
+        ('storageapp', '0013_idempotencykey'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_folder', True)), fields=['owner', 'tree_path', 'id', 'parent', 'original_name'], name='sf_folder_tree'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.5 on 2026-10-19 09:37
+
+from django.conf import settings
+from django.db import migrations, models
+
+from storageapp.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # Индекс на Postgres строится CONCURRENTLY — вне транзакции;
+    # существующие строки заполняет manage.py backfill_media
+    atomic = False
+
+    dependencies = [
+        ('storageapp', '0014_storedfile_folder_tree_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='storedfile',
+            name='content_type',
+            field=models.CharField(blank=True, default='', help_text="MIME-тип по сигнатуре содержимого ('' — не определён).", max_length=100),
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='duration',
+            field=models.FloatField(blank=True, help_text='Длительность аудио или видео, с.', null=True),
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='height',
+            field=models.PositiveIntegerField(blank=True, help_text='Высота изображения или кадра видео, px.', null=True),
+        ),
+        migrations.AddField(
+            model_name='storedfile',
+            name='width',
+            field=models.PositiveIntegerField(blank=True, help_text='Ширина изображения или кадра видео, px.', null=True),
+        ),
+        AddIndexConcurrently(
+            model_name='storedfile',
+            index=models.Index(condition=models.Q(('is_deleted', False), ('is_folder', False)), fields=['owner', 'content_type', 'width', 'height', 'duration'], name='sf_media'),
+        ),
+    ]
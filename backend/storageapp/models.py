@@ -3,9 +3,15 @@ from datetime import timedelta
 from pathlib import Path
 
 from django.conf import settings
-from django.db import models
+from django.contrib.auth import get_user_model
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction
+from django.db.models import Case, CharField, Exists, F, OuterRef, Q, Value, When
+from django.db.models.functions import Concat, Substr
 from django.utils import timezone
 
+from . import events
+
 
 class StoredFileQuerySet(models.QuerySet):
     """
@@ -32,6 +38,338 @@ class StoredFileQuerySet(models.QuerySet):
         limit = timezone.now() - timedelta(days=30)
         return self.filter(is_deleted=True, deleted_at__lt=limit)
 
+    def shift_folder_stats(
+        self,
+        folder_id: int | None,
+        *,
+        size: int = 0,
+        files: int = 0,
+        children: int = 0,
+        chain: list[int] | None = None,
+    ) -> None:
+        """
+        Применяет приращения к агрегатам папки folder_id и всех её предков.
+
+        size/files добавляются ко всей цепочке предков,
+        children — только к самой папке (непосредственные потомки).
+        chain — уже известная цепочка id от корня до folder_id включительно
+        (например, из tree_path ребёнка); без неё tree_path читается из БД.
+        """
+        if not folder_id or not (size or files or children):
+            return
+
+        if chain is None:
+            tree_path = (
+                self.model.objects.filter(pk=folder_id)
+                .values_list("tree_path", flat=True)
+                .first()
+            )
+            chain = [*parse_tree_path(tree_path or "/"), folder_id]
+
+        self.model.objects.filter(pk__in=chain).update(
+            total_size=F("total_size") + size,
+            file_count=F("file_count") + files,
+            child_count=Case(
+                When(pk=folder_id, then=F("child_count") + children),
+                default=F("child_count"),
+            ),
+        )
+
+    def descendants_of(self, folder: "StoredFile"):
+        """
+        Всё поддерево папки (без неё самой) — один префиксный запрос по tree_path.
+        """
+        return self.filter(tree_path__startswith=folder.subtree_prefix)
+
+    def rebase_tree_paths(self, old_prefix: str, new_prefix: str, **fields) -> int:
+        """
+        Заменяет префикс tree_path old_prefix -> new_prefix у всех строк,
+        путь которых начинается с old_prefix (перенос поддерева).
+        fields — дополнительные поля, обновляемые тем же UPDATE.
+        """
+        if old_prefix != new_prefix:
+            fields["tree_path"] = Concat(
+                Value(new_prefix),
+                Substr("tree_path", len(old_prefix) + 1),
+                output_field=CharField(),
+            )
+        if not fields:
+            return 0
+        return self.filter(tree_path__startswith=old_prefix).update(**fields)
+
+    def move_to_trash(self) -> int:
+        """
+        Отправляет живые объекты выборки в корзину вместе с поддеревьями.
+
+        Верхние объекты (без выбранных предков) отвязываются от родителя
+        (deleted_from запоминает папку) и становятся корнями корзины,
+        их потомки остаются на местах, но помечаются удалёнными.
+        Все строки операции получают общий trash_batch — по нему restore()
+        поднимает ровно то, что было удалено вместе с папкой, а не
+        удалённое из неё раньше. Агрегаты папок внутри корзины не трогаются.
+
+        Число запросов не зависит от размера поддеревьев: выборка верхних
+        объектов, по UPDATE агрегатов на исходную папку, по UPDATE поддеревьев
+        на исходный уровень (флаги и tree_path разом), UPDATE самих объектов.
+        В журнал изменений попадают только верхние объекты.
+
+        Возвращает число отправленных в корзину верхних объектов.
+        """
+        model = self.model
+        with transaction.atomic():
+            rows = list(
+                self.filter(is_deleted=False).values_list(
+                    "id", "owner_id", "parent_id", "tree_path",
+                    "is_folder", "size", "total_size", "file_count",
+                )
+            )
+            selected_folders = {row[0] for row in rows if row[4]}
+            top = [
+                row for row in rows
+                if not selected_folders.intersection(parse_tree_path(row[3]))
+            ]
+            if not top:
+                return 0
+
+            now = timezone.now()
+            batch = uuid.uuid4()
+            shifts: dict[int, list] = {}
+            subtrees: dict[str, list[int]] = {}
+            for pk, _, parent_id, tree_path, is_folder, size, total_size, files in top:
+                if is_folder:
+                    subtrees.setdefault(tree_path, []).append(pk)
+                if parent_id is None:
+                    continue
+                size, files = (total_size, files) if is_folder else (size or 0, 1)
+                acc = shifts.setdefault(parent_id, [0, 0, 0, parse_tree_path(tree_path)])
+                acc[0] += size
+                acc[1] += files
+                acc[2] += 1
+
+            for parent_id, (size, files, items, chain) in shifts.items():
+                model.objects.shift_folder_stats(
+                    parent_id, size=-size, files=-files, children=-items, chain=chain
+                )
+
+            for old_path, folder_ids in subtrees.items():
+                conditions = [Q(tree_path__startswith=f"{old_path}{pk}/") for pk in folder_ids]
+                for in_subtrees in subtree_filters(conditions):
+                    model.objects.filter(in_subtrees).rebase_tree_paths(
+                        old_path, "/", is_deleted=True, deleted_at=now, trash_batch=batch
+                    )
+
+            # Если вложенных выбранных нет, UPDATE идёт по самой выборке
+            # (селектор массовых операций), без списка id в запросе;
+            # строки, созданные после чтения, отсекаются по id
+            if len(top) == len(rows):
+                targets = self.filter(is_deleted=False, id__lte=max(row[0] for row in rows))
+            else:
+                targets = model.objects.filter(id__in=[row[0] for row in top])
+            trashed = targets.update(
+                deleted_from=F("parent"),
+                parent=None,
+                tree_path="/",
+                is_deleted=True,
+                deleted_at=now,
+                trash_batch=batch,
+            )
+            StorageChange.objects.record(
+                StorageChange.TRASH,
+                model.objects.filter(
+                    is_deleted=True, deleted_at=now, trash_batch=batch, parent__isnull=True
+                ).only(
+                    "id", "owner_id", "parent_id", "original_name",
+                    "is_folder", "size", "is_deleted",
+                ),
+            )
+            bump_storage_version(*{row[1] for row in top}, folders=any(row[4] for row in top))
+        return trashed
+
+    def restore_from_trash(self) -> int:
+        """
+        Восстанавливает корни корзины из выборки вместе с их поддеревьями.
+
+        Каждый объект возвращается в deleted_from, если это живая папка
+        того же владельца, иначе — в корень. Поддерево папки поднимается
+        по её trash_batch (удалённое из папки раньше остаётся в корзине).
+        Объекты, лежащие внутри удалённой папки, пропускаются — они
+        восстанавливаются только вместе с ней.
+
+        Запросов — по нескольку на каждую папку назначения, независимо от
+        числа объектов и размера поддеревьев. Возвращает число
+        восстановленных корней.
+        """
+        model = self.model
+        with transaction.atomic():
+            top = list(
+                self.filter(is_deleted=True, parent__isnull=True).values_list(
+                    "id", "owner_id", "deleted_from_id", "is_folder", "trash_batch",
+                    "size", "total_size", "file_count",
+                )
+            )
+            if not top:
+                return 0
+
+            targets = {
+                pk: (owner_id, tree_path)
+                for pk, owner_id, tree_path in model.objects.filter(
+                    id__in={row[2] for row in top if row[2] is not None},
+                    is_folder=True,
+                    is_deleted=False,
+                ).values_list("id", "owner_id", "tree_path")
+            }
+
+            batches = []
+            groups: dict[int | None, list] = {}
+            for pk, owner_id, deleted_from_id, is_folder, batch, size, total, files in top:
+                target = targets.get(deleted_from_id)
+                target_id = deleted_from_id if target and target[0] == owner_id else None
+                group = groups.setdefault(target_id, [[], [], 0, 0])
+                group[0].append(pk)
+                if is_folder:
+                    group[1].append(pk)
+                    if batch is not None:
+                        batches.append(Q(tree_path__startswith=f"/{pk}/", trash_batch=batch))
+                size, files = (total, files) if is_folder else (size or 0, 1)
+                group[2] += size
+                group[3] += files
+
+            for in_batches in subtree_filters(batches):
+                model.objects.filter(in_batches).update(
+                    is_deleted=False, deleted_at=None, trash_batch=None
+                )
+
+            restored = 0
+            for target_id, (ids, folder_ids, size, files) in groups.items():
+                if target_id is None:
+                    new_path = "/"
+                else:
+                    new_path = f"{targets[target_id][1]}{target_id}/"
+
+                conditions = [Q(tree_path__startswith=f"/{pk}/") for pk in folder_ids]
+                for in_subtrees in subtree_filters(conditions):
+                    model.objects.filter(in_subtrees).rebase_tree_paths("/", new_path)
+
+                restored += model.objects.filter(id__in=ids).update(
+                    parent_id=target_id,
+                    tree_path=new_path,
+                    deleted_from=None,
+                    is_deleted=False,
+                    deleted_at=None,
+                    trash_batch=None,
+                )
+                if target_id is not None:
+                    model.objects.shift_folder_stats(
+                        target_id,
+                        size=size,
+                        files=files,
+                        children=len(ids),
+                        chain=parse_tree_path(new_path),
+                    )
+
+            top_ids = [row[0] for row in top]
+            StorageChange.objects.record(
+                StorageChange.RESTORE,
+                model.objects.filter(id__in=top_ids).only(
+                    "id", "owner_id", "parent_id", "original_name",
+                    "is_folder", "size", "is_deleted",
+                ),
+            )
+            bump_storage_version(*{row[1] for row in top}, folders=any(row[3] for row in top))
+        return restored
+
+
+def bump_storage_version(*owner_ids: int, folders: bool = False) -> None:
+    """
+    Увеличивает User.storage_version владельцев — признак того, что
+    их списки файлов изменились (ETag и кэш листинга), и после коммита
+    уведомляет их SSE-подписчиков.
+    folders — изменение затронуло папки: растёт и User.folder_version
+    (ETag дерева папок).
+    """
+    ids = {pk for pk in owner_ids if pk is not None}
+    if ids:
+        versions = {"storage_version": F("storage_version") + 1}
+        if folders:
+            versions["folder_version"] = F("folder_version") + 1
+        get_user_model().objects.filter(pk__in=ids).update(**versions)
+        events.publish_storage_changed(*ids)
+
+
+def parse_tree_path(tree_path: str) -> list[int]:
+    """
+    "/1/5/9/" -> [1, 5, 9] (id предков от корня к родителю).
+    """
+    return [int(part) for part in tree_path.split("/") if part]
+
+
+# Сколько условий по поддеревьям объединять через OR в одном запросе
+# (SQLite ограничивает глубину выражения)
+SUBTREE_CHUNK = 100
+
+
+def subtree_filters(conditions: list[Q]):
+    """
+    Объединяет условия conditions через OR пачками по SUBTREE_CHUNK:
+    один запрос на пачку поддеревьев вместо запроса на каждое.
+    """
+    for start in range(0, len(conditions), SUBTREE_CHUNK):
+        combined = Q()
+        for condition in conditions[start:start + SUBTREE_CHUNK]:
+            combined |= condition
+        yield combined
+
+
+# Категории файлов для фильтра ?type= (по расширению имени)
+FOLDER_CATEGORY = "folder"
+OTHER_CATEGORY = "other"
+CATEGORY_EXTENSIONS = {
+    "image": {"jpg", "jpeg", "png", "gif", "bmp", "webp", "svg", "heic", "tif", "tiff", "ico"},
+    "video": {"mp4", "mov", "avi", "mkv", "webm", "m4v", "wmv"},
+    "audio": {"mp3", "wav", "flac", "ogg", "m4a", "aac"},
+    "document": {
+        "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx",
+        "odt", "ods", "odp", "txt", "rtf", "csv", "md",
+    },
+    "archive": {"zip", "rar", "7z", "tar", "gz", "bz2", "xz", "tgz"},
+}
+CATEGORIES = (*CATEGORY_EXTENSIONS, OTHER_CATEGORY, FOLDER_CATEGORY)
+_CATEGORY_BY_EXTENSION = {
+    ext: category for category, exts in CATEGORY_EXTENSIONS.items() for ext in exts
+}
+
+
+# Категории по MIME-типу содержимого для файлов с неизвестным расширением
+_CATEGORY_BY_CONTENT_TYPE = {
+    "application/pdf": "document",
+    "application/zip": "archive",
+    "application/gzip": "archive",
+    "application/x-7z-compressed": "archive",
+    "application/vnd.rar": "archive",
+    "application/x-xz": "archive",
+    "application/x-bzip2": "archive",
+}
+_MEDIA_CATEGORIES = {"image", "video", "audio"}
+
+
+def file_category(name: str, is_folder: bool = False, content_type: str = "") -> str:
+    """
+    "photo.JPG" -> "image"; папка -> "folder"; неизвестное -> "other".
+
+    content_type (StoredFile.content_type, по сигнатуре) важнее расширения
+    для медиа: "photo.dat" с содержимым JPEG — "image".
+    """
+    if is_folder:
+        return FOLDER_CATEGORY
+    media = (content_type or "").partition("/")[0]
+    if media in _MEDIA_CATEGORIES:
+        return media
+    _, dot, ext = (name or "").rpartition(".")
+    category = _CATEGORY_BY_EXTENSION.get(ext.lower(), OTHER_CATEGORY) if dot else OTHER_CATEGORY
+    if category == OTHER_CATEGORY:
+        return _CATEGORY_BY_CONTENT_TYPE.get(content_type, OTHER_CATEGORY)
+    return category
+
 
 class StoredFile(models.Model):
     owner = models.ForeignKey(
@@ -43,7 +381,6 @@ class StoredFile(models.Model):
 
     is_folder = models.BooleanField(
         default=False,
-        db_index=True,
         help_text="Является ли объект папкой",
     )
 
@@ -56,6 +393,16 @@ class StoredFile(models.Model):
         help_text="Родительская папка (null = корень)",
     )
 
+    tree_path = models.CharField(
+        max_length=1024,
+        default="/",
+        db_index=True,
+        help_text=(
+            "Материализованный путь: id предков от корня к родителю "
+            "в виде /1/5/9/ ('/' — объект в корне)."
+        ),
+    )
+
     deleted_from = models.ForeignKey(
         "self",
         null=True,
@@ -81,15 +428,57 @@ class StoredFile(models.Model):
     comment = models.TextField(blank=True, default="")
     public_token = models.CharField(
         max_length=64,
-        unique=True,
         null=True,
         blank=True,
+        help_text="Токен публичной ссылки (уникален среди непустых, см. Meta).",
+    )
+
+    category = models.CharField(
+        max_length=16,
+        default=OTHER_CATEGORY,
+        help_text="Тип файла для фильтра ?type= (см. file_category).",
+    )
+
+    # ---- Тип содержимого и метаданные медиа (заполняются при загрузке, см. media.sniff) ----
+    content_type = models.CharField(
+        max_length=100,
+        blank=True,
+        default="",
+        help_text="MIME-тип по сигнатуре содержимого ('' — не определён).",
+    )
+    width = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Ширина изображения или кадра видео, px.",
+    )
+    height = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Высота изображения или кадра видео, px.",
+    )
+    duration = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Длительность аудио или видео, с.",
+    )
+
+    # ---- Агрегаты папки (поддерживаются инкрементально) ----
+    total_size = models.BigIntegerField(
+        default=0,
+        help_text="Суммарный размер живых файлов в поддереве папки.",
+    )
+    file_count = models.BigIntegerField(
+        default=0,
+        help_text="Количество живых файлов в поддереве папки.",
+    )
+    child_count = models.IntegerField(
+        default=0,
+        help_text="Количество живых непосредственных потомков папки.",
     )
 
     # ---- Корзина ----
     is_deleted = models.BooleanField(
         default=False,
-        db_index=True,
         help_text="Флаг soft-delete: файл перемещён в корзину.",
     )
     deleted_at = models.DateTimeField(
@@ -97,56 +486,227 @@ class StoredFile(models.Model):
         blank=True,
         help_text="Момент перемещения файла в корзину.",
     )
+    trash_batch = models.UUIDField(
+        null=True,
+        blank=True,
+        help_text=(
+            "Операция удаления в корзину: общая у папки и её поддерева, "
+            "по ней восстанавливается ровно удалённое вместе с папкой."
+        ),
+    )
 
     objects = StoredFileQuerySet.as_manager()
 
     class Meta:
+        # Индексы подобраны под запросы views.py / admin_views.py / services.py,
+        # планы проверяет storageapp/tests/test_query_plans.py.
+        # Булевы is_folder / is_deleted отдельно не индексируются — они входят
+        # в условия частичных индексов.
         indexes = [
-            models.Index(fields=["owner", "rel_dir"]),
-            models.Index(fields=["is_deleted", "deleted_at"]),
+            # Листинг папки (?ordering=) — папки первыми, затем ключ сортировки
+            models.Index(
+                fields=["owner", "parent", "-is_folder", "original_name"],
+                name="sf_dir_name",
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=["owner", "parent", "-is_folder", "-total_size", "-size"],
+                name="sf_dir_size",
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=["owner", "parent", "-is_folder", "-uploaded_at"],
+                name="sf_dir_uploaded",
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=["owner", "parent", "-is_folder", "-last_downloaded_at"],
+                name="sf_dir_downloaded",
+                condition=models.Q(is_deleted=False),
+            ),
+            # «Недавние» и фильтр ?type= по всему хранилищу
+            models.Index(
+                fields=["owner", "-uploaded_at"],
+                name="sf_recent",
+                condition=models.Q(is_deleted=False),
+            ),
+            models.Index(
+                fields=["owner", "category", "-uploaded_at"],
+                name="sf_type_uploaded",
+                condition=models.Q(is_deleted=False),
+            ),
+            # Корзина пользователя (view=trash) — только корни корзины,
+            # поддеревья удалённых папок в индекс не попадают
+            models.Index(
+                fields=["owner", "-deleted_at"],
+                name="sf_trash_roots",
+                condition=models.Q(is_deleted=True, parent__isnull=True),
+            ),
+            # Очистка просроченной корзины (все удалённые строки)
+            models.Index(
+                fields=["deleted_at"],
+                name="sf_trash_expiry",
+                condition=models.Q(is_deleted=True),
+            ),
+            # Дерево папок (/api/folders/tree/): index-only scan на Postgres
+            models.Index(
+                fields=["owner", "tree_path", "id", "parent", "original_name"],
+                name="sf_folder_tree",
+                condition=models.Q(is_folder=True, is_deleted=False),
+            ),
+            # Выборки по MIME-типу и метаданным медиа (размеры, длительность)
+            models.Index(
+                fields=["owner", "content_type", "width", "height", "duration"],
+                name="sf_media",
+                condition=models.Q(is_deleted=False, is_folder=False),
+            ),
+            # Использование квоты (storage_usage): index-only scan на Postgres
+            models.Index(
+                fields=["owner", "size"],
+                name="sf_usage",
+                condition=models.Q(is_deleted=False, is_folder=False),
+            ),
+        ]
+        constraints = [
+            # Публичные ссылки есть у малой доли файлов — NULL в индекс не попадают
+            models.UniqueConstraint(
+                fields=["public_token"],
+                name="sf_public_token_uniq",
+                condition=models.Q(public_token__isnull=False),
+            ),
         ]
 
     def __str__(self) -> str:
         status = "deleted" if self.is_deleted else "alive"
         return f"{self.id} · {self.original_name} ({self.size} B, {status})"
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or {"original_name", "content_type"} & set(update_fields):
+            self.category = file_category(
+                self.original_name, self.is_folder, self.content_type
+            )
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "category"}
+        if adding:
+            self.tree_path = self._path_under(self.parent_id)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding and self.parent_id and not self.is_deleted:
+                size, files = self.stats_contribution()
+                StoredFile.objects.shift_folder_stats(
+                    self.parent_id, size=size, files=files, children=1
+                )
+            if adding:
+                StorageChange.objects.record(StorageChange.CREATE, [self])
+            bump_storage_version(self.owner_id, folders=self.is_folder)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Родитель есть у живых объектов и у потомков удалённой папки:
+            # в обоих случаях объект учтён в агрегатах цепочки предков
+            if self.parent_id:
+                size, files = self.stats_contribution()
+                StoredFile.objects.shift_folder_stats(
+                    self.parent_id, size=-size, files=-files, children=-1
+                )
+            StorageChange.objects.record(StorageChange.DELETE, [self])
+            bump_storage_version(self.owner_id, folders=self.is_folder)
+            return super().delete(*args, **kwargs)
+
+    # ---- Материализованный путь ----
+
+    @property
+    def ancestor_ids(self) -> list[int]:
+        return parse_tree_path(self.tree_path)
+
+    @property
+    def subtree_prefix(self) -> str:
+        """
+        Префикс tree_path, общий для всех потомков объекта.
+        """
+        return f"{self.tree_path}{self.id}/"
+
+    def is_descendant_of(self, folder: "StoredFile") -> bool:
+        return folder.id in self.ancestor_ids
+
+    def _path_under(self, parent_id: int | None) -> str:
+        if parent_id is None:
+            return "/"
+        if StoredFile.parent.is_cached(self) and self.parent is not None:
+            return self.parent.subtree_prefix
+        parent_path = (
+            StoredFile.objects.filter(pk=parent_id)
+            .values_list("tree_path", flat=True)
+            .first()
+        )
+        return f"{parent_path or '/'}{parent_id}/"
+
+    def _move_tree_path(self, new_path: str) -> None:
+        """
+        Меняет tree_path объекта и переписывает префикс всего его поддерева.
+        Саму строку объекта сохраняет вызывающий код.
+        """
+        old_prefix = self.subtree_prefix
+        self.tree_path = new_path
+        if self.is_folder:
+            StoredFile.objects.rebase_tree_paths(old_prefix, self.subtree_prefix)
+
     # ---- Вспомогательные свойства пути ----
 
+    @staticmethod
+    def blob_rel_path(rel_dir: str, disk_name) -> str:
+        """
+        Путь блоба относительно MEDIA_ROOT по значениям полей
+        (без загрузки объекта — для массовых операций).
+        """
+        return f"{rel_dir}/{str(disk_name)[:2]}/{disk_name}"
+
     @property
     def rel_path(self) -> str:
-        return f"{self.rel_dir}/{str(self.disk_name)[:2]}/{self.disk_name}"
+        return self.blob_rel_path(self.rel_dir, self.disk_name)
 
     @property
     def path_on_disk(self) -> Path:
         return Path(settings.MEDIA_ROOT) / self.rel_path
 
+    # ---- Агрегаты ----
+
+    def stats_contribution(self) -> tuple[int, int]:
+        """
+        (байты, файлы), которые объект вносит в агрегаты своих предков.
+        """
+        if self.is_folder:
+            return int(self.total_size or 0), int(self.file_count or 0)
+        return int(self.size or 0), 1
+
     # ---- Операции корзины ----
 
     def soft_delete(self) -> None:
         """
-        Переместить файл/папку в корзину (soft-delete)
-        и запомнить исходную папку.
+        Переместить файл/папку в корзину (soft-delete) вместе с поддеревом
+        и запомнить исходную папку (см. StoredFileQuerySet.move_to_trash).
         """
         if self.is_deleted:
             return
 
-        self.deleted_from_id = self.parent_id
-        self.parent_id = None
-
-        self.is_deleted = True
-        self.deleted_at = timezone.now()
-        self.save(
-            update_fields=[
+        StoredFile.objects.filter(pk=self.pk).move_to_trash()
+        self.refresh_from_db(
+            fields=[
                 "deleted_from",
                 "parent",
+                "tree_path",
                 "is_deleted",
                 "deleted_at",
+                "trash_batch",
             ]
         )
 
     def restore(self) -> None:
         """
-        Восстановить файл/папку из корзины.
+        Восстановить файл/папку из корзины вместе с поддеревом
+        (см. StoredFileQuerySet.restore_from_trash).
 
         Возвращает в deleted_from, если папка существует,
         является папкой, не удалена и принадлежит тому же владельцу.
@@ -154,27 +714,196 @@ class StoredFile(models.Model):
         if not self.is_deleted:
             return
 
-        target_parent = None
-        if self.deleted_from_id:
-            try:
-                target_parent = StoredFile.objects.get(
-                    pk=self.deleted_from_id,
-                    owner_id=self.owner_id,
-                    is_folder=True,
-                    is_deleted=False,
-                )
-            except StoredFile.DoesNotExist:
-                target_parent = None
-
-        self.parent = target_parent
-        self.deleted_from = None
-        self.is_deleted = False
-        self.deleted_at = None
-        self.save(
-            update_fields=[
+        StoredFile.objects.filter(pk=self.pk).restore_from_trash()
+        self.refresh_from_db(
+            fields=[
                 "parent",
+                "tree_path",
                 "deleted_from",
                 "is_deleted",
                 "deleted_at",
+                "trash_batch",
             ]
         )
+
+
+class StorageChangeQuerySet(models.QuerySet):
+    """
+    Журнал изменений хранилища: запись и уплотнение.
+    """
+
+    def record(self, kind: str, files) -> None:
+        """
+        Добавляет в журнал снимки состояния объектов files после
+        изменения kind. Вызывается внутри транзакции самой операции.
+
+        Курсор ленты — id записи, а id выдаются при INSERT, видны же
+        читателю только после коммита. Чтобы запись с меньшим id не
+        закоммитилась позже уже прочитанной (и не была пропущена), строки
+        владельцев блокируются до конца транзакции: записи одного владельца
+        получают id в порядке коммитов.
+        """
+        files = list(files)
+        owner_ids = sorted({sf.owner_id for sf in files})
+        list(
+            get_user_model().objects.select_for_update()
+            .filter(pk__in=owner_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        now = timezone.now()
+        entries = [
+            self.model(
+                owner_id=sf.owner_id,
+                kind=kind,
+                file_id=sf.pk,
+                parent_id=sf.parent_id,
+                name=sf.original_name,
+                is_folder=sf.is_folder,
+                size=sf.size or 0,
+                is_deleted=sf.is_deleted,
+                created_at=now,
+            )
+            for sf in files
+        ]
+        if entries:
+            self.bulk_create(entries, batch_size=1000)
+
+    def compact(self, older_than: timedelta) -> int:
+        """
+        Уплотняет журнал:
+        - удаляет записи, для которых есть более новая запись того же объекта
+          (каждая запись — полный снимок, старые ничего не добавляют);
+        - удаляет надгробия (kind=delete) старше older_than.
+
+        Возвращает число удалённых записей.
+        """
+        newer = self.model.objects.filter(
+            owner_id=OuterRef("owner_id"),
+            file_id=OuterRef("file_id"),
+            id__gt=OuterRef("id"),
+        )
+        superseded, _ = self.filter(Exists(newer)).delete()
+        tombstones, _ = self.filter(
+            kind=self.model.DELETE,
+            created_at__lt=timezone.now() - older_than,
+        ).delete()
+        return superseded + tombstones
+
+
+class StorageChange(models.Model):
+    """
+    Запись журнала изменений хранилища пользователя (append-only).
+
+    Хранит снимок состояния объекта после изменения, поэтому клиенту
+    синхронизации достаточно последней записи по каждому file_id.
+    """
+
+    CREATE = "create"
+    RENAME = "rename"
+    UPDATE = "update"
+    MOVE = "move"
+    TRASH = "trash"
+    RESTORE = "restore"
+    DELETE = "delete"
+    CONTENT = "content"
+
+    KIND_CHOICES = [
+        (CREATE, "Создание"),
+        (RENAME, "Переименование"),
+        (UPDATE, "Изменение атрибутов"),
+        (MOVE, "Перемещение"),
+        (TRASH, "Перемещение в корзину"),
+        (RESTORE, "Восстановление"),
+        (DELETE, "Окончательное удаление"),
+        (CONTENT, "Изменение содержимого"),
+    ]
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="storage_changes",
+    )
+    kind = models.CharField(max_length=16, choices=KIND_CHOICES)
+
+    # Без FK: запись должна пережить окончательное удаление объекта
+    file_id = models.BigIntegerField()
+    parent_id = models.BigIntegerField(null=True, blank=True)
+    name = models.CharField(max_length=255)
+    is_folder = models.BooleanField(default=False)
+    size = models.BigIntegerField(default=0)
+    is_deleted = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(default=timezone.now)
+
+    objects = StorageChangeQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["owner", "id"]),
+            models.Index(fields=["owner", "file_id", "id"]),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.id} · {self.kind} #{self.file_id} ({self.owner_id})"
+
+
+class IdempotencyKeyQuerySet(models.QuerySet):
+    def expired(self):
+        """
+        Ключи старше IDEMPOTENCY_KEY_TTL — повтор с ними выполняется заново.
+        """
+        limit = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        return self.filter(created_at__lt=limit)
+
+    def abandoned(self):
+        """
+        Незавершённые ключи без heartbeat дольше IDEMPOTENCY_CLAIM_TIMEOUT:
+        обработчик запроса погиб (SIGKILL, OOM, таймаут воркера), не
+        освободив ключ. Ключ выполняющегося запроса продлевается, сколько
+        бы тот ни длился.
+        """
+        limit = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_CLAIM_TIMEOUT)
+        return self.filter(status_code__isnull=True, heartbeat_at__lt=limit)
+
+
+class IdempotencyKey(models.Model):
+    """
+    Результат изменяющего запроса с заголовком Idempotency-Key.
+
+    Повтор запроса с тем же ключом (например, после таймаута загрузки)
+    получает сохранённый ответ, а не выполняется второй раз.
+    Пока исходный запрос выполняется, status_code пуст, а heartbeat_at
+    продлевается процессом-обработчиком.
+    fingerprint — хэш query string и заголовков тела (тип, длина,
+    Content-Digest): тот же ключ с другими параметрами — ошибка клиента,
+    а не повтор.
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="idempotency_keys",
+    )
+    key = models.CharField(max_length=255)
+    method = models.CharField(max_length=8)
+    path = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, blank=True, default="")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now)
+    heartbeat_at = models.DateTimeField(default=timezone.now)
+
+    objects = IdempotencyKeyQuerySet.as_manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["owner", "key"], name="idem_owner_key_uniq"),
+        ]
+        indexes = [
+            # Очистка просроченных ключей (purge_idempotency_keys)
+            models.Index(fields=["created_at"], name="idem_created"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.key} · {self.method} {self.path} ({self.owner_id})"
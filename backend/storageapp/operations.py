@@ -0,0 +1,102 @@
+"""
+Операции миграций для индексов на больших таблицах.
+
+На Postgres индексы строятся/удаляются CONCURRENTLY (без блокировки записи),
+на остальных СУБД (SQLite в тестах и dev) ведут себя как штатные операции.
+Миграция с ними должна быть объявлена с atomic = False.
+"""
+from django.db import migrations
+
+
+def _concurrent(schema_editor) -> bool:
+    if schema_editor.connection.vendor != "postgresql":
+        return False
+    if schema_editor.connection.in_atomic_block:
+        raise RuntimeError(
+            "Concurrent index operations require a non-atomic migration (atomic = False)."
+        )
+    return True
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    def describe(self):
+        return f"Concurrently {super().describe().lower()}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _concurrent(schema_editor):
+                schema_editor.add_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.add_index(model, self.index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            if _concurrent(schema_editor):
+                schema_editor.remove_index(model, self.index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, self.index)
+
+
+class RemoveIndexConcurrently(migrations.RemoveIndex):
+    def describe(self):
+        return f"Concurrently {super().describe().lower()}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = from_state.models[app_label, self.model_name_lower].get_index_by_name(
+                self.name
+            )
+            if _concurrent(schema_editor):
+                schema_editor.remove_index(model, index, concurrently=True)
+            else:
+                schema_editor.remove_index(model, index)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            index = to_state.models[app_label, self.model_name_lower].get_index_by_name(
+                self.name
+            )
+            if _concurrent(schema_editor):
+                schema_editor.add_index(model, index, concurrently=True)
+            else:
+                schema_editor.add_index(model, index)
+
+
+class AddUniqueConstraintConcurrently(migrations.AddConstraint):
+    """
+    Частичный UniqueConstraint (condition=...): на Postgres это уникальный
+    индекс, поэтому его тоже можно построить CONCURRENTLY.
+    """
+
+    def describe(self):
+        return f"Concurrently {super().describe().lower()}"
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _concurrent(schema_editor):
+            schema_editor.add_constraint(model, self.constraint)
+            return
+        sql = str(self.constraint.create_sql(model, schema_editor))
+        schema_editor.execute(
+            sql.replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1),
+            params=None,
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        if not _concurrent(schema_editor):
+            schema_editor.remove_constraint(model, self.constraint)
+            return
+        schema_editor.execute(
+            f"DROP INDEX CONCURRENTLY IF EXISTS "
+            f"{schema_editor.quote_name(self.constraint.name)}",
+            params=None,
+        )
@@ -1,14 +1,29 @@
 from __future__ import annotations
 
+import fcntl
+import logging
 import os
 import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
 from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, IntegerField, Q, Value, When
 from django.utils import timezone
 
-from .models import StoredFile
+from .media import MEDIA_FIELDS, SNIFF_BYTES, sniff
+from .models import (
+    StorageChange,
+    StoredFile,
+    bump_storage_version,
+    parse_tree_path,
+    subtree_filters,
+)
+
+logger = logging.getLogger(__name__)
 
 
 # Жёсткий лимит размера файла: 2 ГБ
@@ -43,6 +58,8 @@ def save_uploaded(
     - Пишет через временный файл с последующей атомарной заменой.
     - Применяет лимит 2 ГБ: проверяет заранее и в процессе записи.
     - parent: папка (StoredFile) или None. Должен быть уже провалидирован во views.py.
+    - Тип содержимого и метаданные медиа определяются по первым SNIFF_BYTES
+      записанных байт (media.sniff) — без повторного чтения файла.
     """
     size: Optional[int] = getattr(django_file, "size", None)
     if size is not None and size > MAX_FILE_BYTES:
@@ -68,6 +85,7 @@ def save_uploaded(
     tmp = dst.with_suffix(dst.suffix + ".tmp")
 
     bytes_written = 0
+    head = bytearray()
     try:
         chunks_iter = getattr(django_file, "chunks", None)
         if callable(chunks_iter):
@@ -83,6 +101,8 @@ def save_uploaded(
                 bytes_written += len(chunk)
                 if bytes_written > MAX_FILE_BYTES:
                     raise ValueError("File too large (max 2GB)")
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[: SNIFF_BYTES - len(head)]
                 out.write(chunk)
 
         os.replace(tmp, dst)
@@ -104,11 +124,23 @@ def save_uploaded(
         except Exception:
             pass
 
+    declared = sf.size
+    sf.size = dst.stat().st_size
     try:
-        sf.size = dst.stat().st_size
-        sf.save(update_fields=["size"])
+        info = sniff(bytes(head), sf.original_name, sf.size)
     except Exception:
-        pass
+        # Тип не определён — файл всё равно сохранён, метаданные остаются пустыми
+        logger.exception("Content sniffing failed for StoredFile %s", sf.pk)
+        info = {}
+    for field, value in info.items():
+        setattr(sf, field, value)
+    with transaction.atomic():
+        sf.save(update_fields=["size", *MEDIA_FIELDS])
+        if sf.size != declared:
+            StoredFile.objects.shift_folder_stats(
+                sf.parent_id, size=sf.size - declared
+            )
+            StorageChange.objects.record(StorageChange.CONTENT, [sf])
 
     return sf
 
@@ -131,6 +163,599 @@ def delete_stored_file(sf: StoredFile) -> None:
             pass
 
 
+def unlink_blobs(paths, rate: int | None = None) -> int:
+    """
+    Удаляет файлы paths с диска пулом из STORAGE_UNLINK_WORKERS потоков.
+    Уже отсутствующие файлы пропускаются, прочие ошибки ФС логируются.
+
+    rate — не больше rate файлов в секунду (фоновая очистка не должна
+    забирать весь I/O диска у загрузок/скачиваний); None/0 — без ограничения.
+    Возвращает число удалённых файлов.
+    """
+    paths = list(paths)
+    if not paths:
+        return 0
+
+    def _unlink(path: Path) -> bool:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        except OSError:
+            logger.warning("Failed to unlink blob %s", path, exc_info=True)
+            return False
+        return True
+
+    workers = max(1, min(settings.STORAGE_UNLINK_WORKERS, len(paths)))
+    step = rate or len(paths)
+    unlinked = 0
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="unlink") as pool:
+        for start in range(0, len(paths), step):
+            started = time.monotonic()
+            unlinked += sum(pool.map(_unlink, paths[start:start + step]))
+            if rate and start + step < len(paths):
+                time.sleep(max(0.0, 1.0 - (time.monotonic() - started)))
+    return unlinked
+
+
+def purge_items(qs, unlink_rate: int | None = None) -> dict:
+    """
+    Окончательно удаляет объекты qs вместе с их поддеревьями.
+
+    - Поддеревья (id, размеры, disk_name) собираются запросом по префиксам
+      tree_path (один на SUBTREE_CHUNK папок), без обхода коллектором.
+    - Строки удаляются пачками по STORAGE_PURGE_BATCH_SIZE, от глубоких
+      к мелким, в одной транзакции — SQL DELETE, без Collector: каскад
+      parent покрыт самим поддеревом, а SET_NULL ссылок deleted_from
+      выполняется заранее одним UPDATE на пачку папок.
+      Сигналы pre_delete/post_delete не отправляются.
+    - Блобы удаляются только после коммита (unlink_blobs, не быстрее
+      unlink_rate файлов в секунду): откат не оставит записей без файлов.
+
+    Возвращает {"deleted": строк, "files": файлов, "bytes": байт}, где
+    bytes — место, которое освободит удаление блобов (см. _reclaimable_bytes).
+    """
+    batch_size = settings.STORAGE_PURGE_BATCH_SIZE
+    with transaction.atomic():
+        rows = list(
+            qs.values_list(
+                "id", "owner_id", "parent_id", "tree_path", "is_folder",
+                "size", "total_size", "file_count", "rel_dir", "disk_name",
+            )
+        )
+        selected_folders = {row[0] for row in rows if row[4]}
+        top = [
+            row for row in rows
+            if not selected_folders.intersection(parse_tree_path(row[3]))
+        ]
+        if not top:
+            return {"deleted": 0, "files": 0, "bytes": 0}
+
+        # (id, tree_path, is_folder, size, rel_dir, disk_name) всех удаляемых строк
+        subtree = [(row[0], row[3], row[4], row[5], row[8], row[9]) for row in top]
+        conditions = [Q(tree_path__startswith=f"{row[3]}{row[0]}/") for row in top if row[4]]
+        for in_subtrees in subtree_filters(conditions):
+            subtree.extend(
+                StoredFile.objects.filter(in_subtrees).values_list(
+                    "id", "tree_path", "is_folder", "size", "rel_dir", "disk_name"
+                )
+            )
+        top_ids = [row[0] for row in top]
+
+        # Агрегаты: объект с родителем учтён в цепочке предков (живой
+        # или лежащий внутри удалённой папки), корни корзины — нет
+        shifts: dict[int, list] = {}
+        for _, _, parent_id, tree_path, is_folder, size, total_size, files, *_ in top:
+            if parent_id is None:
+                continue
+            size, files = (total_size, files) if is_folder else (size or 0, 1)
+            acc = shifts.setdefault(parent_id, [0, 0, 0, parse_tree_path(tree_path)])
+            acc[0] += size
+            acc[1] += files
+            acc[2] += 1
+        for parent_id, (size, files, items, chain) in shifts.items():
+            StoredFile.objects.shift_folder_stats(
+                parent_id, size=-size, files=-files, children=-items, chain=chain
+            )
+
+        StorageChange.objects.record(
+            StorageChange.DELETE,
+            StoredFile.objects.filter(id__in=top_ids).only(
+                "id", "owner_id", "parent_id", "original_name",
+                "is_folder", "size", "is_deleted",
+            ),
+        )
+
+        folder_ids = [row[0] for row in subtree if row[2]]
+        for start in range(0, len(folder_ids), batch_size):
+            StoredFile.objects.filter(
+                deleted_from_id__in=folder_ids[start:start + batch_size]
+            ).update(deleted_from=None)
+
+        # QuerySet.delete() прошёл бы через Collector: перед каждой пачкой
+        # он ищет потомков по parent и ссылки deleted_from, хотя первые
+        # удаляются той же выборкой, а вторые уже обнулены
+        subtree.sort(key=lambda row: row[1].count("/"), reverse=True)
+        table = connection.ops.quote_name(StoredFile._meta.db_table)
+        deleted = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(subtree), batch_size):
+                chunk = [row[0] for row in subtree[start:start + batch_size]]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"DELETE FROM {table} WHERE id IN ({placeholders})", chunk)
+                deleted += cursor.rowcount
+
+        media_root = Path(settings.MEDIA_ROOT)
+        blobs = [
+            media_root / StoredFile.blob_rel_path(rel_dir, disk_name)
+            for _, _, is_folder, _, rel_dir, disk_name in subtree
+            if not is_folder
+        ]
+        reclaimed = _reclaimable_bytes(blobs)
+        transaction.on_commit(lambda: unlink_blobs(blobs, rate=unlink_rate))
+        bump_storage_version(*{row[1] for row in top}, folders=bool(selected_folders))
+
+    return {"deleted": deleted, "files": len(blobs), "bytes": reclaimed}
+
+
+def _reclaimable_bytes(paths) -> int:
+    """
+    Сколько байт на диске освободит удаление paths.
+
+    Блоб с жёсткими ссылками (копии из clone_blob) освобождается, только
+    если удаляются все его ссылки; отсутствующие на диске не считаются.
+    """
+    inodes: dict[tuple[int, int], list[int]] = {}
+    for path in paths:
+        try:
+            st = path.stat()
+        except OSError:
+            continue
+        entry = inodes.setdefault((st.st_dev, st.st_ino), [0, st.st_nlink, st.st_size])
+        entry[0] += 1
+    return sum(size for links, nlink, size in inodes.values() if links >= nlink)
+
+
+def purge_expired(
+    batch_size: int = 500,
+    max_batches: int | None = None,
+    unlink_rate: int | None = None,
+    should_stop=None,
+) -> dict:
+    """
+    Окончательно удаляет просроченную корзину (StoredFileQuerySet.expired)
+    пачками по batch_size корней, каждая пачка — отдельная транзакция
+    purge_items вместе с поддеревьями.
+
+    Прогресс хранится в самой БД: после прерывания (should_stop() -> True,
+    падение процесса) повторный запуск продолжает с оставшихся строк.
+    Возвращает метрики {"batches", "deleted", "files", "bytes"}.
+    """
+    stats = {"batches": 0, "deleted": 0, "files": 0, "bytes": 0}
+    expired_roots = StoredFile.objects.expired().filter(parent__isnull=True)
+    while max_batches is None or stats["batches"] < max_batches:
+        if should_stop is not None and should_stop():
+            break
+        ids = list(
+            expired_roots.order_by("deleted_at", "id").values_list("id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        # Условие проверяется ещё раз в транзакции удаления: объект могли
+        # восстановить между выборкой и удалением
+        result = purge_items(expired_roots.filter(id__in=ids), unlink_rate=unlink_rate)
+        for key, value in result.items():
+            stats[key] += value
+        stats["batches"] += 1
+    return stats
+
+
+def move_items(qs, parent: StoredFile | None) -> int:
+    """
+    Переносит объекты qs в папку parent (None = корень)
+    с пересчётом агрегатов старых и новой цепочек предков.
+
+    Объект, у которого выбран и кто-то из предков, едет вместе с ним
+    и отдельно не переносится. Число запросов не зависит от числа
+    объектов и глубины: выборка, по UPDATE агрегатов на исходную папку,
+    по UPDATE путей поддеревьев на исходный уровень, один UPDATE самих
+    объектов (parent и tree_path).
+
+    Объекты из корзины не переносятся: их нет в агрегатах, а у живого
+    родителя они не видны ни в листинге, ни в корзине (только корни).
+
+    Возвращает число перенесённых объектов (результат UPDATE).
+    """
+    qs = qs.filter(is_deleted=False)
+    with transaction.atomic():
+        rows = list(
+            qs.values_list(
+                "id", "owner_id", "parent_id", "tree_path", "is_folder",
+                "is_deleted", "size", "total_size", "file_count", "original_name",
+            )
+        )
+        selected_folders = {row[0] for row in rows if row[4]}
+        top = [
+            row for row in rows
+            if not selected_folders.intersection(parse_tree_path(row[3]))
+        ]
+        if not top:
+            return 0
+
+        owners = {row[1] for row in top}
+        moved_bytes = moved_files = moved_items = 0
+        shifts: dict[int, list] = {}
+        subtrees: dict[str, list[int]] = {}
+        for pk, _, parent_id, tree_path, is_folder, _, size, total_size, files, _ in top:
+            if is_folder:
+                subtrees.setdefault(tree_path, []).append(pk)
+            size, files = (total_size, files) if is_folder else (size or 0, 1)
+            moved_bytes += size
+            moved_files += files
+            moved_items += 1
+            if parent_id is not None:
+                # tree_path объекта — это цепочка предков его родителя
+                acc = shifts.setdefault(parent_id, [0, 0, 0, parse_tree_path(tree_path)])
+                acc[0] += size
+                acc[1] += files
+                acc[2] += 1
+
+        for parent_id, (size, files, items, chain) in shifts.items():
+            StoredFile.objects.shift_folder_stats(
+                parent_id, size=-size, files=-files, children=-items, chain=chain
+            )
+
+        # Поддеревья с общим исходным уровнем переносятся одной заменой префикса
+        new_path = parent.subtree_prefix if parent is not None else "/"
+        for old_path, folder_ids in subtrees.items():
+            conditions = [Q(tree_path__startswith=f"{old_path}{pk}/") for pk in folder_ids]
+            for in_subtrees in subtree_filters(conditions):
+                StoredFile.objects.filter(in_subtrees).rebase_tree_paths(old_path, new_path)
+
+        # Без вложенных выбранных UPDATE идёт по самой выборке (селектор
+        # массовых операций), журнал — по уже прочитанным строкам;
+        # строки, созданные после чтения, отсекаются по id
+        if len(top) == len(rows):
+            targets = qs.filter(id__lte=max(row[0] for row in rows))
+        else:
+            targets = StoredFile.objects.filter(id__in=[row[0] for row in top])
+        moved = targets.update(parent=parent, tree_path=new_path)
+        StorageChange.objects.record(
+            StorageChange.MOVE,
+            [
+                StoredFile(
+                    id=row[0],
+                    owner_id=row[1],
+                    parent=parent,
+                    original_name=row[9],
+                    is_folder=row[4],
+                    size=row[6],
+                    is_deleted=row[5],
+                )
+                for row in top
+            ],
+        )
+
+        if parent is not None:
+            StoredFile.objects.shift_folder_stats(
+                parent.id,
+                size=moved_bytes,
+                files=moved_files,
+                children=moved_items,
+                chain=[*parent.ancestor_ids, parent.id],
+            )
+            owners.add(parent.owner_id)
+
+        bump_storage_version(*owners, folders=any(row[4] for row in top))
+
+    return moved
+
+
+# ioctl клонирования файла (reflink) в Linux: btrfs, XFS, OCFS2
+FICLONE = 0x40049409
+
+_COPY_FIELDS = (
+    "id", "owner_id", "parent_id", "tree_path", "is_folder", "original_name",
+    "comment", "size", "category", "rel_dir", "disk_name", *MEDIA_FIELDS,
+    "total_size", "file_count", "child_count",
+)
+
+
+def _copy_range(fd_in: int, fd_out: int, size: int) -> None:
+    """
+    Копирует size байт в ядре: copy_file_range, где его нет — sendfile.
+    """
+    copied = 0
+    if hasattr(os, "copy_file_range"):
+        try:
+            while copied < size:
+                n = os.copy_file_range(fd_in, fd_out, size - copied)
+                if not n:
+                    break
+                copied += n
+        except OSError:
+            pass
+    while copied < size:
+        n = os.sendfile(fd_out, fd_in, copied, size - copied)
+        if not n:
+            break
+        copied += n
+
+
+def clone_blob(src: Path, dst: Path) -> None:
+    """
+    Создаёт dst с содержимым src без чтения данных в userspace:
+    жёсткая ссылка (STORAGE_COPY_HARDLINKS), иначе reflink (FICLONE),
+    иначе копирование в ядре.
+    """
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if settings.STORAGE_COPY_HARDLINKS:
+        try:
+            os.link(src, dst)
+        except OSError:
+            pass
+        else:
+            # Ссылка наследует старый mtime исходного блоба: без обновления
+            # gc_blobs не увидит grace-периода, пока строка копии не закоммичена
+            os.utime(dst)
+            return
+
+    tmp = dst.with_name(dst.name + ".tmp")
+    try:
+        with open(src, "rb") as fin, open(tmp, "wb") as fout:
+            try:
+                fcntl.ioctl(fout.fileno(), FICLONE, fin.fileno())
+            except OSError:
+                _copy_range(fin.fileno(), fout.fileno(), os.fstat(fin.fileno()).st_size)
+        os.replace(tmp, dst)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def copy_items(qs, parent: StoredFile | None) -> list[StoredFile]:
+    """
+    Копирует живые объекты qs вместе с поддеревьями в папку parent
+    (None = корень) с тем же владельцем.
+
+    Строки создаются bulk_create по уровням вложенности (запросов —
+    по числу уровней, а не объектов), агрегаты папок копируются как есть,
+    к цепочке parent добавляется сумма копий. Блобы дублируются
+    clone_blob пулом потоков внутри транзакции: при любой ошибке до её
+    конца созданные файлы удаляются, а строки откатываются. Если откатится
+    внешняя транзакция вызывающего, свежие блобы без строк уберёт gc_blobs
+    после grace-периода.
+
+    Возвращает созданные копии верхнего уровня.
+    """
+    media_root = Path(settings.MEDIA_ROOT)
+    with transaction.atomic():
+        rows = list(qs.filter(is_deleted=False).values(*_COPY_FIELDS))
+        selected_folders = {row["id"] for row in rows if row["is_folder"]}
+        top = [
+            row for row in rows
+            if not selected_folders.intersection(parse_tree_path(row["tree_path"]))
+        ]
+        if not top:
+            return []
+
+        # Потомки выбранных папок по уровням: родитель создаётся раньше детей
+        levels: dict[int, list[dict]] = {}
+        conditions = [
+            Q(tree_path__startswith=f"{row['tree_path']}{row['id']}/")
+            for row in top
+            if row["is_folder"]
+        ]
+        for in_subtrees in subtree_filters(conditions):
+            for row in StoredFile.objects.filter(in_subtrees, is_deleted=False).values(
+                *_COPY_FIELDS
+            ):
+                levels.setdefault(len(parse_tree_path(row["tree_path"])), []).append(row)
+
+        now = timezone.now()
+        blobs: list[tuple[Path, Path]] = []
+        copies: dict[int, StoredFile] = {}
+        created: list[StoredFile] = []
+
+        def _create(batch: list[dict], target) -> list[StoredFile]:
+            objs = []
+            for row in batch:
+                new_parent = target(row)
+                sf = StoredFile(
+                    owner_id=row["owner_id"],
+                    parent_id=new_parent.id if new_parent is not None else None,
+                    tree_path=new_parent.subtree_prefix if new_parent is not None else "/",
+                    original_name=row["original_name"],
+                    comment=row["comment"],
+                    is_folder=row["is_folder"],
+                    size=row["size"],
+                    category=row["category"],
+                    **{field: row[field] for field in MEDIA_FIELDS},
+                    rel_dir=row["rel_dir"],
+                    uploaded_at=now,
+                    total_size=row["total_size"],
+                    file_count=row["file_count"],
+                    child_count=row["child_count"],
+                )
+                if not row["is_folder"]:
+                    blobs.append(
+                        tuple(
+                            media_root / StoredFile.blob_rel_path(row["rel_dir"], disk_name)
+                            for disk_name in (row["disk_name"], sf.disk_name)
+                        )
+                    )
+                objs.append(sf)
+            objs = StoredFile.objects.bulk_create(objs, batch_size=1000)
+            for row, sf in zip(batch, objs):
+                copies[row["id"]] = sf
+            created.extend(objs)
+            return objs
+
+        top_copies = _create(top, lambda row: parent)
+        for depth in sorted(levels):
+            _create(levels[depth], lambda row: copies[row["parent_id"]])
+
+        done: list[Path] = []
+
+        def _clone(pair: tuple[Path, Path]) -> None:
+            clone_blob(*pair)
+            done.append(pair[1])
+
+        try:
+            if blobs:
+                workers = max(1, min(settings.STORAGE_UNLINK_WORKERS, len(blobs)))
+                with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="copy") as pool:
+                    list(pool.map(_clone, blobs))
+
+            if parent is not None:
+                size = files = 0
+                for sf in top_copies:
+                    contribution = sf.stats_contribution()
+                    size += contribution[0]
+                    files += contribution[1]
+                StoredFile.objects.shift_folder_stats(
+                    parent.id,
+                    size=size,
+                    files=files,
+                    children=len(top_copies),
+                    chain=[*parent.ancestor_ids, parent.id],
+                )
+
+            StorageChange.objects.record(StorageChange.CREATE, created)
+            bump_storage_version(
+                *{sf.owner_id for sf in top_copies},
+                folders=any(sf.is_folder for sf in top_copies),
+            )
+        except BaseException:
+            # Транзакция откатится — клоны остались бы блобами без строк
+            unlink_blobs(done)
+            raise
+
+    return top_copies
+
+
+def rebuild_folder_stats(owner_id: int | None = None) -> int:
+    """
+    Полностью пересчитывает total_size/file_count/child_count папок
+    (всех или одного владельца). Возвращает число изменённых папок.
+    """
+    rows = StoredFile.objects.all()
+    if owner_id is not None:
+        rows = rows.filter(owner_id=owner_id)
+
+    # Объект учитывается в агрегатах родителя, если они в одном состоянии:
+    # оба живые или оба удалены одной операцией (поддерево папки в корзине
+    # хранит агрегаты на момент удаления — их вернёт restore()).
+    parent_of: dict[int, int | None] = {}
+    state_of: dict[int, tuple] = {}
+    stats: dict[int, list[int]] = {}
+    files: list[tuple[int, int, tuple]] = []
+
+    for pk, parent_id, is_folder, is_deleted, trash_batch, size in rows.values_list(
+        "id", "parent_id", "is_folder", "is_deleted", "trash_batch", "size"
+    ).iterator(chunk_size=5000):
+        state = (is_deleted, trash_batch)
+        if is_folder:
+            parent_of[pk] = parent_id
+            state_of[pk] = state
+            stats[pk] = [0, 0, 0]
+        elif parent_id is not None:
+            files.append((parent_id, int(size or 0), state))
+
+    for parent_id, size, state in files:
+        acc = stats.get(parent_id)
+        if acc is not None and state_of[parent_id] == state:
+            acc[0] += size
+            acc[1] += 1
+            acc[2] += 1
+
+    depth: dict[int, int] = {}
+
+    def _depth(pk: int) -> int:
+        chain = []
+        cur = pk
+        while cur is not None and cur not in depth and cur in parent_of:
+            chain.append(cur)
+            cur = parent_of[cur]
+        base = depth.get(cur, -1) if cur is not None else -1
+        for node in reversed(chain):
+            base += 1
+            depth[node] = base
+        return depth[pk]
+
+    for pk in sorted(parent_of, key=_depth, reverse=True):
+        parent_id = parent_of[pk]
+        acc = stats.get(parent_id) if parent_id is not None else None
+        if acc is not None and state_of[parent_id] == state_of[pk]:
+            acc[0] += stats[pk][0]
+            acc[1] += stats[pk][1]
+            acc[2] += 1
+
+    changed = []
+    folders = rows.filter(is_folder=True).only(
+        "id", "owner_id", "total_size", "file_count", "child_count"
+    )
+    for folder in folders.iterator(chunk_size=5000):
+        total_size, file_count, child_count = stats[folder.id]
+        if (folder.total_size, folder.file_count, folder.child_count) != (
+            total_size,
+            file_count,
+            child_count,
+        ):
+            folder.total_size = total_size
+            folder.file_count = file_count
+            folder.child_count = child_count
+            changed.append(folder)
+
+    StoredFile.objects.bulk_update(
+        changed, ["total_size", "file_count", "child_count"], batch_size=1000
+    )
+    bump_storage_version(*{folder.owner_id for folder in changed})
+    return len(changed)
+
+
+def resolve_folder_chains(
+    folder_ids, owner_id: int | None = None
+) -> dict[int, list[tuple[int, str]]]:
+    """
+    Для каждой папки из folder_ids — цепочка (id, имя) от корня до неё самой.
+
+    Не больше двух запросов независимо от числа папок и глубины:
+    сами папки (с tree_path) и все их предки разом.
+    owner_id ограничивает выборку папками одного владельца.
+    """
+    wanted = {pk for pk in folder_ids if pk is not None}
+    if not wanted:
+        return {}
+
+    folders = StoredFile.objects.filter(id__in=wanted)
+    if owner_id is not None:
+        folders = folders.filter(owner_id=owner_id)
+    rows = list(folders.values_list("id", "original_name", "tree_path"))
+    names = {pk: name for pk, name, _ in rows}
+    ancestors = {pk: parse_tree_path(tree_path) for pk, _, tree_path in rows}
+
+    missing = {a for chain in ancestors.values() for a in chain} - names.keys()
+    if missing:
+        names.update(
+            StoredFile.objects.filter(id__in=missing).values_list("id", "original_name")
+        )
+
+    return {
+        pk: [(a, names[a]) for a in chain if a in names] + [(pk, names[pk])]
+        for pk, chain in ancestors.items()
+    }
+
+
+def resolve_folder_paths(folder_ids, owner_id: int | None = None) -> dict[int, str]:
+    """
+    {folder_id: "A/B/C"} для набора папок (см. resolve_folder_chains).
+    """
+    return {
+        pk: "/".join(name for _, name in chain)
+        for pk, chain in resolve_folder_chains(folder_ids, owner_id=owner_id).items()
+    }
+
+
 def issue_public_link(sf: StoredFile) -> str:
     token = secrets.token_urlsafe(24)
     sf.public_token = token
@@ -149,3 +774,31 @@ def resolve_public_link(token: str) -> Optional[StoredFile]:
         return StoredFile.objects.get(public_token=token)
     except StoredFile.DoesNotExist:
         return None
+
+
+def search_files(owner_id: int, query: str):
+    """
+    Живые файлы и папки владельца, в имени которых есть подстрока query
+    (без учёта регистра), упорядоченные по релевантности:
+    0 — имя совпадает целиком, 1 — начинается с query, 2 — содержит query;
+    внутри ранга — по имени и id (ключ для курсорной пагинации).
+
+    На Postgres фильтр UPPER(original_name) LIKE '%Q%' обслуживает
+    триграммный GIN-индекс (миграция 0009), на SQLite — обычный LIKE.
+    """
+    return (
+        StoredFile.objects.filter(
+            owner_id=owner_id,
+            is_deleted=False,
+            original_name__icontains=query,
+        )
+        .annotate(
+            rank=Case(
+                When(original_name__iexact=query, then=Value(0)),
+                When(original_name__istartswith=query, then=Value(1)),
+                default=Value(2),
+                output_field=IntegerField(),
+            )
+        )
+        .order_by("rank", "original_name", "id")
+    )
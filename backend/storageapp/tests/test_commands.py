@@ -0,0 +1,378 @@
+import json
+import os
+import tempfile
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from storageapp.locks import advisory_lock
+from storageapp.management.commands import purge_trash
+from storageapp.models import IdempotencyKey, StorageChange, StoredFile
+
+User = get_user_model()
+
+
+class RebuildFolderStatsCommandTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="cmdowner",
+            email="cmd@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+
+    def test_rebuilds_drifted_aggregates(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", size=0, is_folder=True
+        )
+        StoredFile.objects.create(owner=self.owner, original_name="x", size=4, parent=folder)
+        StoredFile.objects.filter(id=folder.id).update(total_size=0, file_count=0)
+
+        out = StringIO()
+        call_command("rebuild_folder_stats", user=self.owner.id, stdout=out)
+
+        folder.refresh_from_db()
+        self.assertEqual(folder.total_size, 4)
+        self.assertEqual(folder.file_count, 1)
+        self.assertIn("Folders updated: 1", out.getvalue())
+
+
+class CompactChangesCommandTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="compactowner",
+            email="compact@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+
+    def test_keeps_latest_entry_per_object_and_drops_old_tombstones(self):
+        kept = StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+        kept.soft_delete()
+        gone = StoredFile.objects.create(owner=self.owner, original_name="b", size=1)
+        gone_id = gone.id
+        gone.delete()
+        StorageChange.objects.filter(file_id=gone_id).update(
+            created_at=timezone.now() - timedelta(days=90)
+        )
+
+        out = StringIO()
+        call_command("compact_changes", days=30, stdout=out)
+
+        self.assertEqual(
+            list(StorageChange.objects.filter(file_id=kept.id).values_list("kind", flat=True)),
+            [StorageChange.TRASH],
+        )
+        self.assertFalse(StorageChange.objects.filter(file_id=gone_id).exists())
+        self.assertIn("Change log entries removed: 3", out.getvalue())
+
+
+class PurgeIdempotencyKeysCommandTests(TestCase):
+    def test_removes_only_expired_keys(self):
+        owner = User.objects.create_user(
+            username="idemowner",
+            email="idem@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+        IdempotencyKey.objects.create(owner=owner, key="fresh", method="POST", path="/")
+        IdempotencyKey.objects.create(
+            owner=owner,
+            key="old",
+            method="POST",
+            path="/",
+            created_at=timezone.now() - timedelta(days=2),
+        )
+
+        out = StringIO()
+        call_command("purge_idempotency_keys", stdout=out)
+
+        self.assertIn("removed: 1", out.getvalue())
+        self.assertEqual(list(IdempotencyKey.objects.values_list("key", flat=True)), ["fresh"])
+
+
+class PurgeTrashCommandTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="purgeowner",
+            email="purge@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+
+    def _trashed_folder(self, name, days_ago):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name=name, size=0, is_folder=True
+        )
+        StoredFile.objects.create(owner=self.owner, original_name="x", size=3, parent=folder)
+        folder.soft_delete()
+        StoredFile.objects.filter(trash_batch=folder.trash_batch).update(
+            deleted_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return folder
+
+    def test_purges_only_expired_in_batches(self):
+        for i in range(3):
+            self._trashed_folder(f"old{i}", days_ago=45)
+        fresh = self._trashed_folder("fresh", days_ago=1)
+
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("purge_trash", batch_size=2, json=True, stdout=out)
+
+        metrics = json.loads(out.getvalue())
+        self.assertEqual(metrics["batches"], 2)
+        # bytes — освобождённое на диске место, блобов у этих строк нет
+        self.assertEqual((metrics["deleted"], metrics["files"], metrics["bytes"]), (6, 3, 0))
+        self.assertFalse(metrics["interrupted"])
+        self.assertEqual(
+            set(StoredFile.objects.filter(owner=self.owner).values_list("id", flat=True)),
+            {fresh.id, *StoredFile.objects.filter(parent=fresh).values_list("id", flat=True)},
+        )
+
+    def test_max_batches_leaves_rest_for_next_run(self):
+        for i in range(3):
+            self._trashed_folder(f"old{i}", days_ago=45)
+
+        call_command("purge_trash", batch_size=1, max_batches=1, stdout=StringIO())
+        self.assertEqual(StoredFile.objects.expired().filter(parent__isnull=True).count(), 2)
+
+        call_command("purge_trash", batch_size=1, stdout=StringIO())
+        self.assertFalse(StoredFile.objects.expired().exists())
+
+    def test_skips_when_another_run_holds_the_lock(self):
+        self._trashed_folder("old", days_ago=45)
+
+        out = StringIO()
+        with advisory_lock(purge_trash.LOCK_NAME) as acquired:
+            self.assertTrue(acquired)
+            call_command("purge_trash", stdout=out)
+
+        self.assertIn("holds the lock", out.getvalue())
+        self.assertTrue(StoredFile.objects.expired().exists())
+
+
+class GcBlobsCommandTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.owner = User.objects.create_user(
+            username="gcowner",
+            email="gc@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+        self.user_dir = os.path.join(self.media.name, "u", "gc", "gcowner")
+
+    def _put(self, name, age_hours=48):
+        path = os.path.join(self.user_dir, name[:2], name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fh:
+            fh.write(b"abc")
+        stamp = time.time() - age_hours * 3600
+        os.utime(path, (stamp, stamp))
+        return path
+
+    def _run(self, **options):
+        out = StringIO()
+        call_command("gc_blobs", json=True, stdout=out, **options)
+        return json.loads(out.getvalue())
+
+    def test_dry_run_reports_orphans_and_stale_temp_files(self):
+        sf = StoredFile.objects.create(
+            owner=self.owner, original_name="a.txt", size=3, rel_dir="u/gc/gcowner"
+        )
+        kept = self._put(str(sf.disk_name))
+        orphan = self._put(str(uuid.uuid4()))
+        temp = self._put(f"{uuid.uuid4()}.tmp")
+        young = self._put(str(uuid.uuid4()), age_hours=1)
+
+        metrics = self._run(batch=1)
+
+        self.assertEqual(
+            (metrics["files"], metrics["orphans"], metrics["temp"], metrics["young"]),
+            (4, 1, 1, 1),
+        )
+        self.assertEqual((metrics["bytes"], metrics["removed"]), (6, 0))
+        for path in (kept, orphan, temp, young):
+            self.assertTrue(os.path.exists(path))
+
+    def test_delete_keeps_referenced_blobs(self):
+        names = sorted(str(uuid.uuid4()) for _ in range(6))
+        for name in names[::2]:
+            StoredFile.objects.create(
+                owner=self.owner,
+                original_name="f",
+                size=3,
+                rel_dir="u/gc/gcowner",
+                disk_name=uuid.UUID(name),
+            )
+        paths = [self._put(name) for name in names]
+
+        metrics = self._run(delete=True, batch=2)
+
+        self.assertEqual((metrics["orphans"], metrics["removed"]), (3, 3))
+        self.assertEqual([os.path.exists(p) for p in paths], [True, False] * 3)
+
+    def test_quarantine_moves_orphans(self):
+        name = str(uuid.uuid4())
+        path = self._put(name)
+        quarantine = os.path.join(self.media.name, "quarantine")
+
+        metrics = self._run(quarantine=quarantine)
+
+        self.assertEqual(metrics["removed"], 1)
+        self.assertFalse(os.path.exists(path))
+        self.assertTrue(
+            os.path.exists(os.path.join(quarantine, "u", "gc", "gcowner", name[:2], name))
+        )
+
+
+class BackfillMediaCommandTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.owner = User.objects.create_user(
+            username="mediaowner",
+            email="media@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+
+    def _file(self, name, content=None):
+        sf = StoredFile.objects.create(
+            owner=self.owner, original_name=name, size=0, rel_dir="u/me/mediaowner"
+        )
+        if content is not None:
+            path = Path(self.media.name) / StoredFile.blob_rel_path(sf.rel_dir, sf.disk_name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+        return sf
+
+    def test_fills_legacy_rows_from_blob_headers(self):
+        image = self._file(
+            "legacy.bin",
+            b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+            + (32).to_bytes(4, "big") + (16).to_bytes(4, "big"),
+        )
+        self._file("gone.png")
+        version = User.objects.get(pk=self.owner.pk).storage_version
+
+        out = StringIO()
+        call_command("backfill_media", batch=1, stdout=out)
+
+        image.refresh_from_db()
+        self.assertEqual(
+            (image.content_type, image.width, image.height, image.category),
+            ("image/png", 32, 16, "image"),
+        )
+        self.assertIn("Files updated: 1 (missing on disk: 1)", out.getvalue())
+        self.assertGreater(User.objects.get(pk=self.owner.pk).storage_version, version)
+
+
+class StorageFsckCommandTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        override = override_settings(MEDIA_ROOT=self.media.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.owner = User.objects.create_user(
+            username="fsckowner",
+            email="fsck@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+        self.folder = StoredFile.objects.create(
+            owner=self.owner, original_name="docs", size=0, is_folder=True
+        )
+
+    def _file(self, size, content=None, age=timedelta(days=2)):
+        sf = StoredFile.objects.create(
+            owner=self.owner,
+            original_name="f",
+            size=size,
+            rel_dir="u/fs/fsckowner",
+            parent=self.folder,
+            uploaded_at=timezone.now() - age,
+        )
+        if content is not None:
+            path = Path(self.media.name) / StoredFile.blob_rel_path(sf.rel_dir, sf.disk_name)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+        return sf
+
+    def _run(self, **options):
+        out = StringIO()
+        call_command("storage_fsck", stdout=out, stderr=StringIO(), **options)
+        return [json.loads(line) for line in out.getvalue().splitlines()]
+
+    def test_reports_missing_and_size_mismatch(self):
+        self._file(3, b"abc")
+        missing = self._file(5)
+        drifted = self._file(10, b"abcd")
+
+        lines = self._run(batch=2)
+
+        problems = {line["id"]: line["problem"] for line in lines if "id" in line}
+        self.assertEqual(problems, {missing.id: "missing", drifted.id: "size_mismatch"})
+        summary = lines[-1]["summary"]
+        self.assertEqual((summary["checked"], summary["repaired"]), (3, 0))
+
+    def test_repairs_sizes_and_trashes_missing(self):
+        drifted = self._file(10, b"abcd")
+        missing = self._file(5)
+
+        self._run(fix_sizes=True, trash_missing=True)
+
+        drifted.refresh_from_db()
+        missing.refresh_from_db()
+        self.folder.refresh_from_db()
+        self.assertEqual(drifted.size, 4)
+        self.assertTrue(missing.is_deleted)
+        self.assertEqual(self.folder.total_size, 4)
+        self.assertEqual(self.folder.file_count, 1)
+
+    def test_skips_uploads_in_flight(self):
+        # Строка уже есть, блоб ещё пишется (save_uploaded)
+        fresh = self._file(5, age=timedelta(minutes=1))
+
+        lines = self._run(fix_sizes=True, trash_missing=True)
+
+        fresh.refresh_from_db()
+        self.assertFalse(fresh.is_deleted)
+        self.assertEqual([line for line in lines if "id" in line], [])
+        summary = lines[-1]["summary"]
+        self.assertEqual((summary["checked"], summary["young"]), (0, 1))
+
+        lines = self._run(grace_hours=0)
+        self.assertEqual([line["id"] for line in lines if "id" in line], [fresh.id])
+
+    def test_resumes_from_checkpoint(self):
+        first = self._file(5)
+        second = self._file(5)
+        checkpoint = os.path.join(self.media.name, "fsck.json")
+        with open(checkpoint, "w") as fh:
+            json.dump({"last_id": first.id}, fh)
+
+        lines = self._run(checkpoint=checkpoint)
+
+        self.assertEqual([line["id"] for line in lines if "id" in line], [second.id])
+        self.assertEqual(lines[-1]["summary"]["resumed_from"], first.id)
+        self.assertFalse(os.path.exists(checkpoint))
@@ -0,0 +1,125 @@
+import asyncio
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from storageapp import events
+from storageapp.models import StoredFile
+import storageapp.views as views
+
+User = get_user_model()
+
+
+class LocalBrokerTests(SimpleTestCase):
+    def test_publish_reaches_only_owner_subscribers(self):
+        async def scenario():
+            broker = events.LocalBroker()
+            mine = broker.subscribe(1)
+            other = broker.subscribe(2)
+            broker.publish(1, {"type": "storage"})
+            self.assertEqual(await mine.get(1), {"type": "storage"})
+            self.assertIsNone(await other.get(0.05))
+            mine.close()
+            other.close()
+            self.assertEqual(broker._subscribers, {})
+
+        asyncio.run(scenario())
+
+    def test_slow_subscriber_keeps_only_latest_event(self):
+        async def scenario():
+            broker = events.LocalBroker()
+            sub = broker.subscribe(1)
+            for i in range(100):
+                broker.publish(1, {"n": i})
+            await asyncio.sleep(0)
+            self.assertEqual(await sub.get(1), {"n": 99})
+            self.assertEqual(sub.coalesced, 99)
+            self.assertIsNone(await sub.get(0.05))
+            sub.close()
+
+        asyncio.run(scenario())
+
+
+class FileBrokerTests(SimpleTestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+    def test_publish_from_another_broker_is_delivered(self):
+        async def scenario():
+            # два брокера — как два воркера с общим каталогом
+            subscriber_side = events.FileBroker(path=self.tmpdir, poll_interval=3600)
+            publisher_side = events.FileBroker(path=self.tmpdir, poll_interval=3600)
+
+            sub = subscriber_side.subscribe(7)
+            publisher_side.publish(7, {"type": "storage", "n": 1})
+            subscriber_side.poll()
+            self.assertEqual(await sub.get(1), {"type": "storage", "n": 1})
+
+            # без новых публикаций повторный проход ничего не шлёт
+            subscriber_side.poll()
+            self.assertIsNone(await sub.get(0.05))
+            sub.close()
+
+        asyncio.run(scenario())
+
+
+class StorageEventsViewTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="sseowner", email="s@x", full_name="S", password="Abcdef1!"
+        )
+
+    def test_requires_auth(self):
+        res = self.client.get("/api/events/")
+        self.assertEqual(res.status_code, 403)
+
+    def test_stream_headers(self):
+        self.client.force_login(self.owner)
+        res = self.client.get("/api/events/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "text/event-stream")
+        self.assertEqual(res["X-Accel-Buffering"], "no")
+        res.close()
+
+    def test_stream_sends_heartbeat_and_events(self):
+        async def scenario():
+            broker = events.LocalBroker()
+            stream = views._sse_stream(broker, self.owner.id, heartbeat=0.05)
+            self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+            self.assertEqual(await anext(stream), b": ping\n\n")
+
+            broker.publish(self.owner.id, {"type": "storage"})
+            chunk = await anext(stream)
+            self.assertTrue(chunk.startswith(b"event: storage\ndata: {"))
+
+            await stream.aclose()
+            self.assertEqual(broker._subscribers, {})
+
+        asyncio.run(scenario())
+
+
+class PublishOnCommitTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="pubowner", email="p@x", full_name="P", password="Abcdef1!"
+        )
+
+    def test_mutation_notifies_after_commit(self):
+        published = []
+
+        class RecordingBroker(events.LocalBroker):
+            def publish(self, owner_id, payload):
+                published.append((owner_id, payload["type"]))
+
+        with patch.object(events, "get_broker", return_value=RecordingBroker()):
+            with self.captureOnCommitCallbacks(execute=True):
+                StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+                self.assertEqual(published, [])
+
+        self.assertEqual(published, [(self.owner.id, "storage")])
@@ -0,0 +1,100 @@
+import struct
+
+from django.test import SimpleTestCase
+
+from storageapp.media import sniff
+from storageapp.models import file_category
+
+
+def png(width: int, height: int) -> bytes:
+    return (
+        b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+        + struct.pack(">II", width, height)
+        + b"\x08\x02\x00\x00\x00"
+    )
+
+
+def wav(seconds: int, byte_rate: int = 88200) -> bytes:
+    fmt = struct.pack("<4sIHHIIHH", b"fmt ", 16, 1, 1, byte_rate // 2, byte_rate, 2, 16)
+    data = struct.pack("<4sI", b"data", seconds * byte_rate)
+    return b"RIFF" + struct.pack("<I", 36) + b"WAVE" + fmt + data
+
+
+def _box(kind: bytes, body: bytes) -> bytes:
+    return struct.pack(">I", 8 + len(body)) + kind + body
+
+
+def mp4(width: int, height: int, timescale: int, duration: int) -> bytes:
+    mvhd = _box(b"mvhd", bytes(12) + struct.pack(">II", timescale, duration) + bytes(80))
+    tkhd = _box(b"tkhd", bytes(76) + struct.pack(">II", width << 16, height << 16))
+    return _box(b"ftyp", b"isom\x00\x00\x02\x00") + _box(b"moov", mvhd + _box(b"trak", tkhd))
+
+
+class SniffTests(SimpleTestCase):
+    def test_image_dimensions(self):
+        self.assertEqual(
+            sniff(png(640, 480), "photo.dat"),
+            {"content_type": "image/png", "width": 640, "height": 480, "duration": None},
+        )
+        jpeg = (
+            b"\xff\xd8\xff\xe0" + struct.pack(">H", 16) + bytes(14)
+            + b"\xff\xc0" + struct.pack(">HBHH", 17, 8, 200, 300)
+        )
+        info = sniff(jpeg)
+        self.assertEqual(
+            (info["content_type"], info["width"], info["height"]), ("image/jpeg", 300, 200)
+        )
+
+    def test_durations(self):
+        self.assertEqual(sniff(wav(3))["duration"], 3.0)
+        info = sniff(mp4(1920, 1080, 1000, 12500), "clip")
+        self.assertEqual(
+            info,
+            {"content_type": "video/mp4", "width": 1920, "height": 1080, "duration": 12.5},
+        )
+
+    def test_falls_back_to_name_for_text_and_zip_containers(self):
+        self.assertEqual(sniff(b"hello", "notes.txt")["content_type"], "text/plain")
+        self.assertEqual(
+            sniff(b"PK\x03\x04...", "report.docx")["content_type"],
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+        )
+        self.assertEqual(sniff(b"PK\x03\x04...", "blob")["content_type"], "application/zip")
+        self.assertEqual(sniff(b"\x00\x01", "blob")["content_type"], "")
+
+    def test_weak_signatures_need_valid_header(self):
+        # Текст, начинающийся с "BM", "ID3", "BZh" — не BMP/MP3/bzip2
+        for text in (b"BM,2024-01-01,total,,,,,,,,,,,,\n", b"ID3 tags list\n", b"BZh... notes"):
+            self.assertEqual(sniff(text, "data.csv")["content_type"], "text/csv")
+
+        bmp = (
+            b"BM" + struct.pack("<IHHI", 70, 0, 0, 54)
+            + struct.pack("<IiiHH", 40, 4, -2, 1, 24) + bytes(16)
+        )
+        self.assertEqual(
+            sniff(bmp, "x", size=70),
+            {"content_type": "image/bmp", "width": 4, "height": 2, "duration": None},
+        )
+        self.assertEqual(sniff(bmp, "x", size=71)["content_type"], "")
+        self.assertEqual(
+            sniff(b"ID3\x04\x00\x00\x00\x00\x01\x7f", "x")["content_type"], "audio/mpeg"
+        )
+        self.assertEqual(sniff(b"BZh91AY&SY", "x")["content_type"], "application/x-bzip2")
+
+    def test_out_of_range_dimensions_are_dropped(self):
+        info = sniff(png(2**32 - 1, 0), "x.png")
+        self.assertEqual(
+            (info["content_type"], info["width"], info["height"]), ("image/png", None, None)
+        )
+
+    def test_truncated_header_keeps_type(self):
+        info = sniff(png(1, 1)[:12], "x.png")
+        self.assertEqual(info["content_type"], "image/png")
+        self.assertIsNone(info["width"])
+
+    def test_category_prefers_media_content_type(self):
+        self.assertEqual(file_category("photo.dat", content_type="image/png"), "image")
+        self.assertEqual(file_category("scan.bin", content_type="application/pdf"), "document")
+        self.assertEqual(file_category("book.epub.zip", content_type="application/zip"), "archive")
+        self.assertEqual(file_category("notes.txt", content_type="application/zip"), "document")
+        self.assertEqual(file_category("x", True, "image/png"), "folder")
@@ -1,13 +1,18 @@
+import threading
 from datetime import timedelta
 from pathlib import Path
+from unittest import skipUnless
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 
 
-from storageapp.models import StoredFile
+from storageapp.models import StorageChange, StoredFile
+from storageapp.services import rebuild_folder_stats
 
 User = get_user_model()
 
@@ -275,3 +280,261 @@ class StoredFileQuerySetTests(TestCase):
 
         self.assertIn(expired, qs)
         self.assertNotIn(recent, qs)
+
+
+class StoredFileFolderStatsTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="statsuser",
+            email="stats@example.com",
+            full_name="Stats User",
+            password="Abcdef1!",
+        )
+        self.root = StoredFile.objects.create(
+            owner=self.owner, original_name="root", size=0, is_folder=True
+        )
+        self.child = StoredFile.objects.create(
+            owner=self.owner, original_name="child", size=0, is_folder=True, parent=self.root
+        )
+
+    def _stats(self, folder):
+        folder.refresh_from_db()
+        return folder.total_size, folder.file_count, folder.child_count
+
+    def test_create_updates_ancestor_chain(self):
+        StoredFile.objects.create(owner=self.owner, original_name="a", size=10, parent=self.root)
+        StoredFile.objects.create(owner=self.owner, original_name="b", size=5, parent=self.child)
+
+        self.assertEqual(self._stats(self.root), (15, 2, 2))
+        self.assertEqual(self._stats(self.child), (5, 1, 1))
+
+    def test_soft_delete_and_restore_shift_stats(self):
+        f = StoredFile.objects.create(
+            owner=self.owner, original_name="a", size=7, parent=self.child
+        )
+
+        self.child.refresh_from_db()
+        self.child.soft_delete()
+        self.assertEqual(self._stats(self.root), (0, 0, 0))
+        self.assertEqual(self._stats(self.child), (7, 1, 1))
+
+        self.child.restore()
+        self.assertEqual(self._stats(self.root), (7, 1, 1))
+
+        f.soft_delete()
+        self.assertEqual(self._stats(self.root), (0, 0, 1))
+        self.assertEqual(self._stats(self.child), (0, 0, 0))
+
+    def test_delete_alive_object_subtracts_stats(self):
+        f = StoredFile.objects.create(
+            owner=self.owner, original_name="a", size=3, parent=self.child
+        )
+        f.delete()
+
+        self.assertEqual(self._stats(self.root), (0, 0, 1))
+        self.assertEqual(self._stats(self.child), (0, 0, 0))
+
+
+class StoredFileTreePathTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="treeuser",
+            email="tree@example.com",
+            full_name="Tree User",
+            password="Abcdef1!",
+        )
+        self.a = StoredFile.objects.create(
+            owner=self.owner, original_name="a", size=0, is_folder=True
+        )
+        self.b = StoredFile.objects.create(
+            owner=self.owner, original_name="b", size=0, is_folder=True, parent=self.a
+        )
+        self.f = StoredFile.objects.create(
+            owner=self.owner, original_name="f.txt", size=1, parent=self.b
+        )
+
+    def test_tree_path_set_on_create(self):
+        self.assertEqual(self.a.tree_path, "/")
+        self.assertEqual(self.b.tree_path, f"/{self.a.id}/")
+        self.assertEqual(self.f.tree_path, f"/{self.a.id}/{self.b.id}/")
+        self.assertEqual(self.f.ancestor_ids, [self.a.id, self.b.id])
+
+        by_id = StoredFile(owner=self.owner, original_name="g", size=1, parent_id=self.b.id)
+        by_id.save()
+        self.assertEqual(by_id.tree_path, self.f.tree_path)
+
+    def test_descendants_and_is_descendant_of(self):
+        ids = set(StoredFile.objects.descendants_of(self.a).values_list("id", flat=True))
+        self.assertEqual(ids, {self.b.id, self.f.id})
+        self.assertTrue(self.f.is_descendant_of(self.a))
+        self.assertFalse(self.a.is_descendant_of(self.b))
+
+    def test_soft_delete_and_restore_rewrite_subtree_paths(self):
+        self.b.soft_delete()
+        self.f.refresh_from_db()
+        self.assertEqual(self.b.tree_path, "/")
+        self.assertEqual(self.f.tree_path, f"/{self.b.id}/")
+
+        self.b.restore()
+        self.f.refresh_from_db()
+        self.assertEqual(self.b.tree_path, f"/{self.a.id}/")
+        self.assertEqual(self.f.tree_path, f"/{self.a.id}/{self.b.id}/")
+
+
+class StoredFileSubtreeTrashTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="subtreeuser",
+            email="subtree@example.com",
+            full_name="Subtree User",
+            password="Abcdef1!",
+        )
+        self.a = StoredFile.objects.create(
+            owner=self.owner, original_name="a", size=0, is_folder=True
+        )
+        self.b = StoredFile.objects.create(
+            owner=self.owner, original_name="b", size=0, is_folder=True, parent=self.a
+        )
+        self.f = StoredFile.objects.create(
+            owner=self.owner, original_name="f.txt", size=3, parent=self.b
+        )
+        self.g = StoredFile.objects.create(
+            owner=self.owner, original_name="g.txt", size=4, parent=self.a
+        )
+
+    def test_trash_marks_whole_subtree_with_one_batch(self):
+        self.a.soft_delete()
+
+        rows = StoredFile.objects.filter(id__in=[self.a.id, self.b.id, self.f.id, self.g.id])
+        self.assertEqual(set(rows.values_list("is_deleted", flat=True)), {True})
+        self.assertEqual(set(rows.values_list("trash_batch", flat=True)), {self.a.trash_batch})
+        self.assertEqual(set(rows.values_list("deleted_at", flat=True)), {self.a.deleted_at})
+        self.assertFalse(StoredFile.objects.alive().filter(owner=self.owner).exists())
+
+        # поддерево остаётся внутри папки, в корне корзины — только она сама
+        self.f.refresh_from_db()
+        self.assertEqual(self.f.parent_id, self.b.id)
+        self.assertEqual(self.f.tree_path, f"/{self.a.id}/{self.b.id}/")
+
+    def test_restore_brings_back_only_its_batch(self):
+        self.f.soft_delete()
+        self.a.soft_delete()
+        self.a.restore()
+
+        self.b.refresh_from_db()
+        self.g.refresh_from_db()
+        self.f.refresh_from_db()
+        self.assertFalse(self.b.is_deleted)
+        self.assertFalse(self.g.is_deleted)
+        self.assertIsNone(self.g.trash_batch)
+        self.assertTrue(self.f.is_deleted)
+        self.assertIsNone(self.f.parent_id)
+
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.total_size, self.a.file_count, self.a.child_count), (4, 1, 2))
+
+    def test_trash_query_count_does_not_depend_on_subtree_size(self):
+        def trash(count):
+            folder = StoredFile.objects.create(
+                owner=self.owner, original_name=f"big{count}", size=0, is_folder=True
+            )
+            StoredFile.objects.bulk_create(
+                StoredFile(
+                    owner=self.owner,
+                    original_name=f"{i}.txt",
+                    size=1,
+                    parent=folder,
+                    tree_path=folder.subtree_prefix,
+                )
+                for i in range(count)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                folder.soft_delete()
+            trashed = StoredFile.objects.filter(trash_batch=folder.trash_batch).count()
+            self.assertEqual(trashed, count + 1)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(trash(5), trash(500))
+
+    def test_rebuild_keeps_trashed_subtree_stats(self):
+        self.a.soft_delete()
+        self.assertEqual(rebuild_folder_stats(owner_id=self.owner.id), 0)
+
+        self.a.refresh_from_db()
+        self.assertEqual((self.a.total_size, self.a.file_count, self.a.child_count), (7, 2, 2))
+
+
+class StoredFileStorageVersionTests(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="veruser",
+            email="ver@example.com",
+            full_name="Version User",
+            password="Abcdef1!",
+        )
+
+    def _version(self):
+        self.owner.refresh_from_db()
+        return self.owner.storage_version
+
+    def test_mutations_bump_storage_version(self):
+        start = self._version()
+
+        f = StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+        after_create = self._version()
+        self.assertGreater(after_create, start)
+
+        f.soft_delete()
+        after_trash = self._version()
+        self.assertGreater(after_trash, after_create)
+
+        f.delete()
+        self.assertGreater(self._version(), after_trash)
+
+
+# SQLite сериализует пишущие транзакции сам, а общая in-memory тестовая БД
+# не даёт читать из другого потока — чередование проверяется на Postgres
+@skipUnless(connection.features.has_select_for_update, "needs row locks")
+class StorageChangeOrderingTests(TransactionTestCase):
+    def test_change_committed_late_is_not_behind_read_cursor(self):
+        owner = User.objects.create_user(
+            username="feedorder",
+            email="feed@example.com",
+            full_name="Feed Order",
+            password="Abcdef1!",
+        )
+        recorded = threading.Event()
+        release = threading.Event()
+
+        def write(name, hold):
+            try:
+                with transaction.atomic():
+                    StoredFile.objects.create(owner=owner, original_name=name, size=1)
+                    if hold:
+                        recorded.set()
+                        release.wait(10)
+            finally:
+                connection.close()
+
+        slow = threading.Thread(target=write, args=("slow", True))
+        slow.start()
+        self.assertTrue(recorded.wait(10))
+        fast = threading.Thread(target=write, args=("fast", False))
+        fast.start()
+        fast.join(1)
+
+        # Клиент читает ленту, пока первая транзакция ещё не закоммичена
+        seen = set(
+            StorageChange.objects.filter(owner=owner).values_list("id", flat=True)
+        )
+        release.set()
+        slow.join()
+        fast.join()
+
+        cursor = max(seen, default=0)
+        behind = set(
+            StorageChange.objects.filter(owner=owner, id__lte=cursor)
+            .values_list("id", flat=True)
+        )
+        self.assertEqual(behind, seen)
+        self.assertEqual(StorageChange.objects.filter(owner=owner).count(), 2)
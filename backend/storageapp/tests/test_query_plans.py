@@ -0,0 +1,199 @@
+"""
+Регрессия планов горячих запросов: листинги (каждая поддерживаемая
+комбинация фильтров/сортировки), корзина, квота, публичные ссылки и
+журнал изменений должны идти по своим индексам (StoredFile.Meta.indexes),
+а сортировка в направлении индекса — без отдельного шага сортировки.
+
+Запросы берутся из реальных вызовов view (CaptureQueriesContext),
+поэтому тест ловит и изменения в самих queryset'ах.
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from storageapp.models import StorageChange, StoredFile, file_category
+
+User = get_user_model()
+
+NAMES = ("report.pdf", "photo.jpg", "clip.mp4", "song.mp3", "backup.zip", "notes")
+
+
+def explain(sql: str) -> str:
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            cursor.execute(f"EXPLAIN {sql}")
+        else:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+        return "\n".join(" ".join(str(col) for col in row) for row in cursor.fetchall())
+
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class ListingQueryPlanTests(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(
+            username="planowner", email="plan@x", full_name="P", password="Abcdef1!"
+        )
+        other = User.objects.create_user(
+            username="planother", email="other@x", full_name="O", password="Abcdef1!"
+        )
+
+        now = timezone.now()
+        folders = StoredFile.objects.bulk_create(
+            StoredFile(
+                owner=owner,
+                original_name=f"dir{i}",
+                is_folder=True,
+                category=file_category("", True),
+                size=0,
+            )
+            for owner in (cls.owner, other)
+            for i in range(20)
+        )
+        cls.folder = folders[1]
+
+        rows = []
+        for i in range(4000):
+            name = f"{i}-{NAMES[i % len(NAMES)]}"
+            rows.append(
+                StoredFile(
+                    owner=cls.owner if i % 2 else other,
+                    parent=folders[i % len(folders)] if i % 5 else None,
+                    original_name=name,
+                    category=file_category(name),
+                    size=i,
+                    uploaded_at=now - timedelta(minutes=i),
+                    is_deleted=i % 17 == 0,
+                    deleted_at=now - timedelta(days=i % 60) if i % 17 == 0 else None,
+                )
+            )
+        StoredFile.objects.bulk_create(rows, batch_size=1000)
+
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def setUp(self):
+        self.client.force_authenticate(self.owner)
+
+    def _view_sql(self, url: str, params: dict, marker: str) -> str:
+        """
+        SQL единственного запроса к storageapp_storedfile, содержащего marker,
+        выполненного view при GET url.
+        """
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, 200)
+        selects = [
+            q["sql"]
+            for q in ctx.captured_queries
+            if q["sql"].startswith("SELECT")
+            and "storageapp_storedfile" in q["sql"]
+            and marker in q["sql"]
+        ]
+        self.assertEqual(len(selects), 1, selects)
+        return selects[0]
+
+    def assertPlanUses(self, plan: str, index: str, sorted_by_index: bool = True):
+        self.assertIn(index, plan, plan)
+        if sorted_by_index:
+            sort_step = "Sort" if connection.vendor == "postgresql" else "TEMP B-TREE"
+            self.assertNotIn(sort_step, plan, plan)
+
+    def assertUsesIndex(
+        self, params: dict, index: str, sorted_by_index: bool = True, marker: str = "LIMIT"
+    ):
+        sql = self._view_sql("/files/", params, marker)
+        self.assertPlanUses(explain(sql), index, sorted_by_index)
+
+    def test_folder_listing_default_ordering(self):
+        self.assertUsesIndex({"parent": self.folder.id}, "sf_dir_uploaded")
+
+    def test_root_listing_default_ordering(self):
+        self.assertUsesIndex({}, "sf_dir_uploaded")
+
+    def test_folder_listing_by_name(self):
+        self.assertUsesIndex({"parent": self.folder.id, "ordering": "name"}, "sf_dir_name")
+
+    def test_folder_listing_by_size(self):
+        self.assertUsesIndex({"parent": self.folder.id, "ordering": "-size"}, "sf_dir_size")
+
+    def test_folder_listing_by_last_download(self):
+        self.assertUsesIndex(
+            {"parent": self.folder.id, "ordering": "-last_downloaded_at"},
+            "sf_dir_downloaded",
+        )
+
+    def test_folder_listing_reverse_direction_still_filters_by_index(self):
+        # Обратное направление досортировывает содержимое одной папки,
+        # но выборка всё равно идёт по префиксу (owner, parent) индекса листинга
+        self.assertUsesIndex(
+            {"parent": self.folder.id, "ordering": "-name"},
+            "sf_dir_",
+            sorted_by_index=False,
+        )
+
+    def test_recent(self):
+        self.assertUsesIndex({"view": "recent"}, "sf_recent")
+
+    def test_recent_by_type(self):
+        self.assertUsesIndex({"view": "recent", "type": "image"}, "sf_type_uploaded")
+
+    # ---- Индексы из обзора запросов (миграция 0011) ----
+
+    def test_trash(self):
+        self.assertUsesIndex({"view": "trash"}, "sf_trash_roots", marker="DESC LIMIT")
+
+    def test_trash_oldest_for_etag(self):
+        self.assertUsesIndex({"view": "trash"}, "sf_trash_roots", marker="ASC LIMIT")
+
+    def test_trash_expiry(self):
+        self.assertPlanUses(StoredFile.objects.expired().only("id").explain(), "sf_trash_expiry")
+
+    def test_storage_usage(self):
+        sql = self._view_sql("/files/usage/", {}, "SUM")
+        self.assertPlanUses(explain(sql), "sf_usage")
+
+    def test_folder_tree(self):
+        sql = self._view_sql("/folders/tree/", {}, "tree_path")
+        self.assertPlanUses(explain(sql), "sf_folder_tree", sorted_by_index=True)
+
+    def test_media_metadata_lookup(self):
+        plan = (
+            StoredFile.objects.filter(
+                owner_id=self.owner.id,
+                is_deleted=False,
+                is_folder=False,
+                content_type="image/png",
+                width__gte=1000,
+            )
+            .only("id")
+            .explain()
+        )
+        self.assertPlanUses(plan, "sf_media")
+
+    def test_public_token_lookup(self):
+        plan = StoredFile.objects.filter(public_token="token").explain()
+        self.assertIn("sf_public_token_uniq", plan, plan)
+
+    def test_change_feed(self):
+        plan = (
+            StorageChange.objects.filter(owner_id=self.owner.id, id__gt=0)
+            .order_by("id")[:500]
+            .explain()
+        )
+        self.assertPlanUses(plan, "owner_id")
+
+    def test_rel_dir_index_is_gone(self):
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(
+                cursor, StoredFile._meta.db_table
+            )
+        indexed_columns = [c["columns"] for c in constraints.values() if c["index"]]
+        self.assertNotIn(["owner_id", "rel_dir"], indexed_columns)
+        self.assertNotIn(["is_deleted"], indexed_columns)
+        self.assertNotIn(["is_folder"], indexed_columns)
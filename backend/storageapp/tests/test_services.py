@@ -2,6 +2,7 @@ import os
 import shutil
 import tempfile
 from pathlib import Path
+from unittest.mock import patch
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
@@ -179,6 +180,162 @@ class StorageServicesTests(TestCase):
         # повторный вызов — no-op
         services_module.delete_stored_file(sf)
 
+    # -------------------------
+    # purge_items
+    # -------------------------
+
+    def _blob(self, name, data, parent=None):
+        sf = StoredFile.objects.create(
+            owner=self.user, original_name=name, size=len(data), parent=parent, rel_dir="u"
+        )
+        path = Path(settings.MEDIA_ROOT) / sf.rel_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return sf, path
+
+    def test_purge_items_removes_subtree_rows_and_blobs_after_commit(self):
+        folder = StoredFile.objects.create(
+            owner=self.user, original_name="A", size=0, is_folder=True
+        )
+        inner = StoredFile.objects.create(
+            owner=self.user, original_name="B", size=0, is_folder=True, parent=folder
+        )
+        _, p1 = self._blob("f.txt", b"12345", parent=inner)
+        _, p2 = self._blob("g.txt", b"12", parent=folder)
+        folder.soft_delete()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = services_module.purge_items(StoredFile.objects.filter(pk=folder.pk))
+            # до коммита блобы на месте — откат не оставит записей без файлов
+            self.assertTrue(p1.exists())
+            self.assertTrue(p2.exists())
+
+        self.assertEqual(result, {"deleted": 4, "files": 2, "bytes": 7})
+        self.assertFalse(StoredFile.objects.filter(owner=self.user).exists())
+        self.assertFalse(p1.exists())
+        self.assertFalse(p2.exists())
+
+    def test_purge_items_nested_item_shifts_ancestor_stats(self):
+        folder = StoredFile.objects.create(
+            owner=self.user, original_name="A", size=0, is_folder=True
+        )
+        sf, path = self._blob("f.txt", b"123", parent=folder)
+        self._blob("g.txt", b"4", parent=folder)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = services_module.purge_items(StoredFile.objects.filter(pk=sf.pk))
+
+        self.assertEqual(result, {"deleted": 1, "files": 1, "bytes": 3})
+        self.assertFalse(path.exists())
+        folder.refresh_from_db()
+        self.assertEqual((folder.total_size, folder.file_count, folder.child_count), (1, 1, 1))
+
+    def test_purge_items_clears_deleted_from_of_survivors(self):
+        folder = StoredFile.objects.create(
+            owner=self.user, original_name="A", size=0, is_folder=True
+        )
+        leaf = StoredFile.objects.create(owner=self.user, original_name="f", size=1, parent=folder)
+        StoredFile.objects.filter(pk=leaf.pk).move_to_trash()
+        StoredFile.objects.filter(pk=folder.pk).move_to_trash()
+
+        result = services_module.purge_items(StoredFile.objects.filter(pk=folder.pk))
+
+        self.assertEqual(result["deleted"], 1)
+        leaf.refresh_from_db()
+        self.assertIsNone(leaf.deleted_from_id)
+
+    def test_purge_items_counts_hardlinked_blob_once_all_links_go(self):
+        original, _ = self._blob("f.txt", b"12345")
+        with override_settings(STORAGE_COPY_HARDLINKS=True):
+            (copy,) = services_module.copy_items(StoredFile.objects.filter(pk=original.pk), None)
+        StoredFile.objects.filter(pk__in=[original.pk, copy.pk]).move_to_trash()
+
+        # Копия ещё ссылается на тот же inode — место не освобождается
+        with self.captureOnCommitCallbacks(execute=True):
+            result = services_module.purge_items(StoredFile.objects.filter(pk=original.pk))
+        self.assertEqual((result["files"], result["bytes"]), (1, 0))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = services_module.purge_items(StoredFile.objects.filter(pk=copy.pk))
+        self.assertEqual((result["files"], result["bytes"]), (1, 5))
+
+    def test_unlink_blobs_skips_missing(self):
+        _, path = self._blob("f.txt", b"1")
+        missing = path.with_name("missing")
+        self.assertEqual(services_module.unlink_blobs([path, missing]), 1)
+        self.assertFalse(path.exists())
+
+    # -------------------------
+    # copy_items
+    # -------------------------
+
+    def test_copy_items_duplicates_subtree_rows_and_blobs(self):
+        folder = StoredFile.objects.create(
+            owner=self.user, original_name="A", size=0, is_folder=True
+        )
+        inner = StoredFile.objects.create(
+            owner=self.user, original_name="B", size=0, is_folder=True, parent=folder
+        )
+        original, src = self._blob("f.txt", b"12345", parent=inner)
+        self._blob("g.txt", b"12", parent=folder)
+        target = StoredFile.objects.create(
+            owner=self.user, original_name="T", size=0, is_folder=True
+        )
+
+        (copy,) = services_module.copy_items(StoredFile.objects.filter(pk=folder.pk), target)
+
+        self.assertEqual(copy.parent_id, target.id)
+        self.assertEqual((copy.total_size, copy.file_count, copy.child_count), (7, 2, 2))
+        inner_copy = StoredFile.objects.get(parent=copy, is_folder=True)
+        leaf = StoredFile.objects.get(parent=inner_copy)
+        self.assertEqual(leaf.tree_path, f"/{target.id}/{copy.id}/{inner_copy.id}/")
+        self.assertNotEqual(leaf.disk_name, original.disk_name)
+        self.assertEqual((Path(settings.MEDIA_ROOT) / leaf.rel_path).read_bytes(), b"12345")
+        self.assertTrue(src.exists())
+
+        target.refresh_from_db()
+        self.assertEqual((target.total_size, target.file_count, target.child_count), (7, 2, 1))
+        self.assertEqual(StoredFile.objects.filter(owner=self.user).count(), 9)
+
+    def test_clone_blob_without_hardlinks_makes_independent_file(self):
+        sf, src = self._blob("f.txt", b"abc" * 1000)
+        dst = src.with_name("copy")
+
+        with override_settings(STORAGE_COPY_HARDLINKS=False):
+            services_module.clone_blob(src, dst)
+
+        self.assertEqual(dst.read_bytes(), b"abc" * 1000)
+        self.assertNotEqual(os.stat(src).st_ino, os.stat(dst).st_ino)
+        self.assertFalse(dst.with_name("copy.tmp").exists())
+
+    def test_clone_blob_hardlink_gets_fresh_mtime(self):
+        sf, src = self._blob("f.txt", b"abc")
+        os.utime(src, (1_000_000, 1_000_000))
+        dst = src.with_name("copy")
+
+        with override_settings(STORAGE_COPY_HARDLINKS=True):
+            services_module.clone_blob(src, dst)
+
+        self.assertEqual(os.stat(src).st_ino, os.stat(dst).st_ino)
+        self.assertGreater(os.stat(dst).st_mtime, 1_000_000)
+
+    def test_copy_items_removes_clones_when_transaction_fails(self):
+        self._blob("f.txt", b"abc")
+
+        def files():
+            return {p for p in Path(settings.MEDIA_ROOT).rglob("*") if p.is_file()}
+
+        before = files()
+
+        with patch.object(
+            services_module.StorageChange.objects, "record", side_effect=RuntimeError
+        ):
+            with self.assertRaises(RuntimeError):
+                services_module.copy_items(StoredFile.objects.filter(owner=self.user), None)
+
+        self.assertEqual(files(), before)
+        self.assertEqual(StoredFile.objects.filter(owner=self.user).count(), 1)
+
     # -------------------------
     # public links
     # -------------------------
@@ -257,3 +414,123 @@ class StorageServicesTests(TestCase):
         self.assertIsNone(
             services_module.resolve_public_link("nonexistent-token")
         )
+
+
+class FolderStatsServicesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="statsowner",
+            email="statsowner@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+        self.a = StoredFile.objects.create(
+            owner=self.user, original_name="A", size=0, is_folder=True
+        )
+        self.b = StoredFile.objects.create(
+            owner=self.user, original_name="B", size=0, is_folder=True, parent=self.a
+        )
+        self.target = StoredFile.objects.create(
+            owner=self.user, original_name="T", size=0, is_folder=True
+        )
+        self.f = StoredFile.objects.create(
+            owner=self.user, original_name="f", size=20, parent=self.b
+        )
+
+    def test_move_items_shifts_old_and_new_chains(self):
+        moved = services_module.move_items(
+            StoredFile.objects.filter(id=self.b.id), self.target
+        )
+        self.assertEqual(moved, 1)
+
+        for obj in (self.a, self.target):
+            obj.refresh_from_db()
+        self.assertEqual((self.a.total_size, self.a.file_count, self.a.child_count), (0, 0, 0))
+        self.assertEqual(
+            (self.target.total_size, self.target.file_count, self.target.child_count),
+            (20, 1, 1),
+        )
+
+    def test_move_items_nested_selection_moves_only_top_level(self):
+        # B выбран вместе со своим предком A — едет внутри A, а не отдельно
+        moved = services_module.move_items(
+            StoredFile.objects.filter(id__in=[self.a.id, self.b.id]), self.target
+        )
+        self.assertEqual(moved, 1)
+
+        for obj in (self.a, self.b, self.f, self.target):
+            obj.refresh_from_db()
+        self.assertEqual(self.b.parent_id, self.a.id)
+        self.assertEqual(self.a.tree_path, f"/{self.target.id}/")
+        self.assertEqual(self.b.tree_path, f"/{self.target.id}/{self.a.id}/")
+        self.assertEqual(self.f.tree_path, f"/{self.target.id}/{self.a.id}/{self.b.id}/")
+        self.assertEqual(
+            (self.target.total_size, self.target.file_count, self.target.child_count),
+            (20, 1, 1),
+        )
+        self.assertEqual((self.a.total_size, self.a.file_count, self.a.child_count), (20, 1, 1))
+
+    def test_move_items_skips_trashed_rows(self):
+        StoredFile.objects.filter(id=self.a.id).move_to_trash()
+
+        moved = services_module.move_items(
+            StoredFile.objects.filter(id__in=[self.b.id, self.f.id]), self.target
+        )
+        self.assertEqual(moved, 0)
+
+        self.b.refresh_from_db()
+        self.target.refresh_from_db()
+        self.assertEqual(self.b.parent_id, self.a.id)
+        self.assertEqual(
+            (self.target.total_size, self.target.file_count, self.target.child_count),
+            (0, 0, 0),
+        )
+
+    def test_rebuild_folder_stats_repairs_drift(self):
+        StoredFile.objects.filter(id__in=[self.a.id, self.b.id]).update(
+            total_size=999, file_count=9, child_count=9
+        )
+
+        changed = services_module.rebuild_folder_stats(owner_id=self.user.id)
+        self.assertEqual(changed, 2)
+
+        self.a.refresh_from_db()
+        self.b.refresh_from_db()
+        self.assertEqual((self.a.total_size, self.a.file_count, self.a.child_count), (20, 1, 1))
+        self.assertEqual((self.b.total_size, self.b.file_count, self.b.child_count), (20, 1, 1))
+
+        self.assertEqual(services_module.rebuild_folder_stats(owner_id=self.user.id), 0)
+
+
+class FolderPathResolutionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="pathowner",
+            email="pathowner@example.com",
+            full_name="Owner",
+            password="Abcdef1!",
+        )
+        self.a = StoredFile.objects.create(
+            owner=self.user, original_name="A", size=0, is_folder=True
+        )
+        self.b = StoredFile.objects.create(
+            owner=self.user, original_name="B", size=0, is_folder=True, parent=self.a
+        )
+        self.c = StoredFile.objects.create(
+            owner=self.user, original_name="C", size=0, is_folder=True, parent=self.b
+        )
+
+    def test_resolve_folder_paths_in_two_queries(self):
+        with self.assertNumQueries(2):
+            paths = services_module.resolve_folder_paths([self.c.id, self.b.id, None])
+        self.assertEqual(paths, {self.c.id: "A/B/C", self.b.id: "A/B"})
+
+    def test_resolve_folder_chains_single_query_when_ancestors_requested(self):
+        with self.assertNumQueries(1):
+            chains = services_module.resolve_folder_chains([self.a.id, self.b.id])
+        self.assertEqual(chains[self.b.id], [(self.a.id, "A"), (self.b.id, "B")])
+
+    def test_resolve_folder_chains_respects_owner(self):
+        self.assertEqual(
+            services_module.resolve_folder_chains([self.c.id], owner_id=self.user.id + 1), {}
+        )
@@ -65,6 +65,10 @@ class StorageUrlsResolveTests(TestCase):
         match = resolve("/folders/")
         self.assertIs(match.func, views.create_folder)
 
+    def test_folder_tree_resolves(self):
+        match = resolve("/folders/tree/")
+        self.assertIs(match.func, views.folder_tree)
+
     def test_bulk_move_resolves(self):
         match = resolve("/files/bulk-move/")
         self.assertIs(match.func, views.bulk_move)
@@ -73,11 +77,43 @@ class StorageUrlsResolveTests(TestCase):
         match = resolve("/files/bulk/trash/")
         self.assertIs(match.func, views.bulk_trash)
 
+    def test_bulk_restore_resolves(self):
+        match = resolve("/files/bulk/restore/")
+        self.assertIs(match.func, views.bulk_restore)
+
+    def test_bulk_delete_resolves(self):
+        match = resolve("/files/bulk/delete/")
+        self.assertIs(match.func, views.bulk_delete)
+
+    def test_empty_trash_resolves(self):
+        match = resolve("/files/trash/empty/")
+        self.assertIs(match.func, views.empty_trash)
+
     def test_download_archive_resolves(self):
         match = resolve("/files/archive/")
         self.assertIs(match.func, views.download_archive)
 
+    def test_copy_files_resolves(self):
+        match = resolve("/files/copy/")
+        self.assertIs(match.func, views.copy_files)
+
+    def test_batch_resolves(self):
+        match = resolve("/batch/")
+        self.assertIs(match.func, views.batch)
+
     def test_restore_file_resolves(self):
         match = resolve("/files/8/restore/")
         self.assertIs(match.func, views.restore_file)
         self.assertEqual(match.kwargs["pk"], 8)
+
+    def test_list_changes_resolves(self):
+        match = resolve("/changes/")
+        self.assertIs(match.func, views.list_changes)
+
+    def test_storage_events_resolves(self):
+        match = resolve("/events/")
+        self.assertIs(match.func, views.storage_events)
+
+    def test_search_files_resolves(self):
+        match = resolve("/files/search/")
+        self.assertIs(match.func, views.search_files)
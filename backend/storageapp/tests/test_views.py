@@ -1,13 +1,17 @@
 import io
+import json
 import shutil
 import tempfile
 import zipfile
 from pathlib import Path
 from datetime import timedelta
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
 from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from django.urls import get_resolver
 from django.conf import settings
@@ -15,7 +19,8 @@ from django.conf import settings
 from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 
-from storageapp.models import StoredFile
+from storageapp.models import IdempotencyKey, StorageChange, StoredFile
+import storageapp.idempotency as idempotency
 import storageapp.views as views
 
 User = get_user_model()
@@ -226,6 +231,180 @@ class ListFilesGetTests(APITestCase):
         ids = [x["id"] for x in res.data["results"]]
         self.assertEqual(ids, [f_recent.id], res.data)
 
+    def test_view_trash_reports_deleted_from_path(self):
+        a = StoredFile.objects.create(
+            owner=self.owner, original_name="A", is_folder=True, size=0, rel_dir=""
+        )
+        b = StoredFile.objects.create(
+            owner=self.owner, original_name="B", is_folder=True, size=0, parent=a
+        )
+        f = StoredFile.objects.create(owner=self.owner, original_name="f", size=1, parent=b)
+        f.soft_delete()
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/files/", {"view": "trash"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"][0]["deleted_from_path"], "A/B")
+
+    def _trash_listing_queries(self, depth: int) -> int:
+        parent = None
+        for i in range(depth):
+            parent = StoredFile.objects.create(
+                owner=self.owner, original_name=f"d{depth}-{i}", is_folder=True,
+                size=0, parent=parent,
+            )
+        for i in range(3):
+            StoredFile.objects.create(
+                owner=self.owner, original_name=f"f{depth}-{i}", size=1, parent=parent
+            ).soft_delete()
+
+        self.client.force_authenticate(self.owner)
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get("/files/", {"view": "trash"})
+        self.assertEqual(res.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_trash_listing_query_count_does_not_depend_on_depth(self):
+        shallow = self._trash_listing_queries(2)
+        deep = self._trash_listing_queries(8)
+        self.assertEqual(shallow, deep)
+
+    def test_fields_param_trims_items(self):
+        StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/files/", {"fields": "id,original_name,parent"})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(set(res.data["results"][0]), {"id", "original_name", "parent"})
+
+    def test_fields_param_rejects_unknown_keys(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/files/", {"fields": "id,nope"})
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["detail"], "Unknown fields: nope")
+
+    def test_v1_shape_aliases_results_and_v2_drops_them(self):
+        StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+        self.client.force_authenticate(self.owner)
+
+        res = self.client.get("/files/")
+        self.assertIs(res.data["items"], res.data["results"])
+        self.assertEqual(res.json()["data"], res.json()["results"])
+
+        res = self.client.get("/files/", HTTP_ACCEPT="application/json; version=2")
+        self.assertEqual(res.status_code, 200)
+        self.assertNotIn("items", res.data)
+        self.assertNotIn("data", res.data)
+        self.assertEqual(len(res.data["results"]), 1)
+
+    def test_stream_ndjson_returns_every_item(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        for i in range(5):
+            StoredFile.objects.create(
+                owner=self.owner, original_name=f"f{i}", size=i, parent=folder
+            )
+
+        self.client.force_authenticate(self.owner)
+        with patch.object(views, "NDJSON_CHUNK_SIZE", 2):
+            res = self.client.get(
+                "/files/", {"parent": folder.id, "stream": "ndjson", "fields": "id,size"}
+            )
+            body = b"".join(res.streaming_content)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "application/x-ndjson")
+        lines = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(lines), 5)
+        self.assertEqual(sorted(x["size"] for x in lines), [0, 1, 2, 3, 4])
+        self.assertEqual(set(lines[0]), {"id", "size"})
+
+    def test_etag_304_until_storage_changes(self):
+        StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+        self.owner.refresh_from_db()
+        self.client.force_authenticate(self.owner)
+
+        res = self.client.get("/files/")
+        self.assertEqual(res.status_code, 200)
+        etag = res["ETag"]
+
+        res = self.client.get("/files/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        res = self.client.get("/files/", {"view": "recent"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+
+        StoredFile.objects.create(owner=self.owner, original_name="b", size=1)
+        self.owner.refresh_from_db()
+        res = self.client.get("/files/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(len(res.data["results"]), 2)
+
+    def test_trash_etag_changes_when_item_expires(self):
+        now = timezone.now()
+        StoredFile.objects.create(
+            owner=self.owner, original_name="old", size=1,
+            is_deleted=True, deleted_at=now - timedelta(days=29),
+        )
+        StoredFile.objects.create(
+            owner=self.owner, original_name="new", size=1, is_deleted=True, deleted_at=now
+        )
+        self.owner.refresh_from_db()
+        self.client.force_authenticate(self.owner)
+
+        res = self.client.get("/files/", {"view": "trash"})
+        self.assertEqual(len(res.data["results"]), 2)
+        etag = res["ETag"]
+
+        # Версия хранилища та же, но "old" уже вышел за срок хранения
+        with patch("django.utils.timezone.now", return_value=now + timedelta(days=2)):
+            res = self.client.get("/files/", {"view": "trash"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([x["original_name"] for x in res.data["results"]], ["new"])
+
+    @override_settings(
+        CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+    )
+    def test_unchanged_listing_is_served_from_cache(self):
+        from django.core.cache import cache
+
+        cache.clear()
+        StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+        self.owner.refresh_from_db()
+        self.client.force_authenticate(self.owner)
+
+        first = self.client.get("/files/")
+        with CaptureQueriesContext(connection) as ctx:
+            second = self.client.get("/files/")
+
+        self.assertEqual(second.data, first.data)
+        self.assertFalse(
+            [q for q in ctx.captured_queries if "storageapp_storedfile" in q["sql"]]
+        )
+        cache.clear()
+
+    def test_breadcrumbs_for_current_folder(self):
+        a = StoredFile.objects.create(
+            owner=self.owner, original_name="A", is_folder=True, size=0
+        )
+        b = StoredFile.objects.create(
+            owner=self.owner, original_name="B", is_folder=True, size=0, parent=a
+        )
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/files/", {"parent": b.id})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(
+            res.data["breadcrumbs"],
+            [{"id": a.id, "name": "A"}, {"id": b.id, "name": "B"}],
+        )
+
+        self.client.force_authenticate(self.other)
+        res = self.client.get("/files/", {"parent": b.id})
+        self.assertEqual(res.data["breadcrumbs"], [])
+
     def test_folder_size_is_computed_recursively_for_list_page(self):
         root = StoredFile.objects.create(
             owner=self.owner,
@@ -316,6 +495,148 @@ class UploadFileTests(APITestCase):
 
         self.assertTrue(StoredFile.objects.filter(owner=self.owner, original_name="x.txt").exists())
 
+    def test_upload_stores_sniffed_content_type_and_dimensions(self):
+        self.client.force_authenticate(self.owner)
+        head = (
+            b"\x89PNG\r\n\x1a\n\x00\x00\x00\rIHDR"
+            + (640).to_bytes(4, "big") + (480).to_bytes(4, "big")
+        )
+        up = SimpleUploadedFile("scan.dat", head + b"\x00" * 100)
+        res = self.client.post("/files/", {"file": up}, format="multipart")
+        self.assertEqual(res.status_code, 201)
+
+        sf = StoredFile.objects.get(owner=self.owner, original_name="scan.dat")
+        self.assertEqual(
+            (sf.content_type, sf.width, sf.height, sf.duration, sf.category),
+            ("image/png", 640, 480, None, "image"),
+        )
+
+        res = self.client.get("/files/", {"type": "image"})
+        item = res.data["results"][0]
+        self.assertEqual((item["content_type"], item["width"]), ("image/png", 640))
+
+    def test_retry_with_idempotency_key_returns_original_response(self):
+        self.client.force_authenticate(self.owner)
+
+        def upload():
+            up = SimpleUploadedFile("x.txt", b"x", content_type="text/plain")
+            return self.client.post(
+                "/files/", {"file": up}, format="multipart", HTTP_IDEMPOTENCY_KEY="k-1"
+            )
+
+        responses = [upload()]
+        # Повтор отвечает сохранённым ответом, не разбирая тело
+        with patch("rest_framework.request.Request._parse", side_effect=AssertionError):
+            responses.append(upload())
+
+        first, retry = responses
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.data["id"], first.data["id"])
+        self.assertEqual(retry.headers.get("Idempotent-Replayed"), "true")
+        self.assertIsNone(first.headers.get("Idempotent-Replayed"))
+        self.assertEqual(StoredFile.objects.filter(owner=self.owner).count(), 1)
+
+    def test_idempotency_key_in_progress_or_reused_elsewhere(self):
+        IdempotencyKey.objects.create(
+            owner=self.owner, key="busy", method="POST", path="/files/", fingerprint="fp"
+        )
+        self.client.force_authenticate(self.owner)
+
+        with patch("storageapp.idempotency._fingerprint", return_value="fp"):
+            res = self.client.post("/files/", {}, HTTP_IDEMPOTENCY_KEY="busy")
+        self.assertEqual(res.status_code, 409)
+
+        res = self.client.post(
+            "/folders/", {"name": "A"}, format="json", HTTP_IDEMPOTENCY_KEY="busy"
+        )
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(StoredFile.objects.filter(original_name="A").exists())
+
+    def test_idempotency_key_with_other_body_or_query_returns_422(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/folders/", {"name": "A"}, format="json", HTTP_IDEMPOTENCY_KEY="k"
+        )
+        self.assertEqual(res.status_code, 201)
+
+        res = self.client.post(
+            "/folders/", {"name": "Bb"}, format="json", HTTP_IDEMPOTENCY_KEY="k"
+        )
+        self.assertEqual(res.status_code, 422)
+        # Тело той же длины различимо по Content-Digest клиента
+        res = self.client.post(
+            "/folders/", {"name": "B"}, format="json", HTTP_IDEMPOTENCY_KEY="k",
+            HTTP_CONTENT_DIGEST="sha-256=:Qg==:",
+        )
+        self.assertEqual(res.status_code, 422)
+        res = self.client.post(
+            f"/folders/?user={self.owner.id}", {"name": "A"}, format="json",
+            HTTP_IDEMPOTENCY_KEY="k",
+        )
+        self.assertEqual(res.status_code, 422)
+        self.assertFalse(StoredFile.objects.filter(original_name__startswith="B").exists())
+
+    def test_abandoned_idempotency_key_is_reclaimed(self):
+        # Воркер погиб посреди запроса: ключ занят, ответа нет, heartbeat стоит
+        IdempotencyKey.objects.create(
+            owner=self.owner,
+            key="dead",
+            method="POST",
+            path="/folders/",
+            heartbeat_at=timezone.now() - timedelta(minutes=10),
+        )
+        self.client.force_authenticate(self.owner)
+
+        res = self.client.post(
+            "/folders/", {"name": "A"}, format="json", HTTP_IDEMPOTENCY_KEY="dead"
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(IdempotencyKey.objects.get(key="dead").status_code, 201)
+
+    def test_long_request_keeps_its_idempotency_key_by_heartbeat(self):
+        # Медленная загрузка идёт дольше IDEMPOTENCY_CLAIM_TIMEOUT
+        record = IdempotencyKey.objects.create(
+            owner=self.owner,
+            key="slow",
+            method="POST",
+            path="/folders/",
+            fingerprint="fp",
+            created_at=timezone.now() - timedelta(hours=1),
+            heartbeat_at=timezone.now() - timedelta(hours=1),
+        )
+        idempotency._active.add(record.pk)
+        try:
+            idempotency._beat()
+        finally:
+            idempotency._release(record.pk)
+        self.client.force_authenticate(self.owner)
+
+        with patch("storageapp.idempotency._fingerprint", return_value="fp"):
+            res = self.client.post(
+                "/folders/", {"name": "A"}, format="json", HTTP_IDEMPOTENCY_KEY="slow"
+            )
+        self.assertEqual(res.status_code, 409)
+        self.assertFalse(StoredFile.objects.filter(original_name="A").exists())
+
+    def test_expired_idempotency_key_runs_request_again(self):
+        IdempotencyKey.objects.create(
+            owner=self.owner,
+            key="old",
+            method="POST",
+            path="/folders/",
+            status_code=201,
+            response={"id": 0},
+            created_at=timezone.now() - timedelta(days=2),
+        )
+        self.client.force_authenticate(self.owner)
+
+        res = self.client.post(
+            "/folders/", {"name": "A"}, format="json", HTTP_IDEMPOTENCY_KEY="old"
+        )
+        self.assertEqual(res.status_code, 201)
+        self.assertNotEqual(res.data["id"], 0)
+        self.assertEqual(IdempotencyKey.objects.get(key="old").response["id"], res.data["id"])
+
 
 # ======================================================
 # patch_file
@@ -446,6 +767,56 @@ class DeleteRestoreTests(APITestCase):
         self.sf.refresh_from_db()
         self.assertFalse(self.sf.is_deleted)
 
+    def test_trashed_folder_hides_subtree_from_listings_and_usage(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        inner = StoredFile.objects.create(
+            owner=self.owner, original_name="inner", size=10, parent=folder
+        )
+        folder.soft_delete()
+
+        self.client.force_authenticate(self.owner)
+        trash = self.client.get("/files/", {"view": "trash"})
+        self.assertEqual([item["id"] for item in trash.data["results"]], [folder.id])
+        recent = self.client.get("/files/", {"view": "recent"})
+        self.assertNotIn(inner.id, [item["id"] for item in recent.data["results"]])
+        usage = self.client.get("/files/usage/")
+        self.assertEqual(usage.data["used_bytes"], 1)
+
+    def test_delete_trashed_folder_forever_removes_subtree(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        StoredFile.objects.create(owner=self.owner, original_name="inner", size=10, parent=folder)
+        folder.soft_delete()
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.delete(f"/files/{folder.id}/delete/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["status"], "deleted_forever")
+        # Блоба на диске нет — освобождать нечего
+        self.assertEqual((res.data["deleted"], res.data["files"], res.data["bytes"]), (2, 1, 0))
+        self.assertFalse(StoredFile.objects.filter(owner=self.owner, size=10).exists())
+
+    def test_restore_item_trashed_with_folder_400(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        inner = StoredFile.objects.create(
+            owner=self.owner, original_name="inner", size=10, parent=folder
+        )
+        folder.soft_delete()
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(f"/files/{inner.id}/restore/")
+        self.assertEqual(res.status_code, 400)
+
+        res = self.client.post(f"/files/{folder.id}/restore/")
+        self.assertEqual(res.status_code, 200)
+        inner.refresh_from_db()
+        self.assertFalse(inner.is_deleted)
+
 
 # ======================================================
 # download/view + public links + create_folder + bulk_* + download_archive
@@ -527,6 +898,15 @@ class DownloadAndViewTests(APITestCase):
         self.assertIn("Content-Disposition", res.headers)
         self.assertIn("inline", res.headers["Content-Disposition"])
 
+    def test_view_uses_stored_content_type(self):
+        sf = self._mk_file(self.owner, name="scan.dat", content=b"abc")
+        StoredFile.objects.filter(pk=sf.pk).update(content_type="image/png")
+        self.client.force_authenticate(self.owner)
+
+        res = self.client.get(url_for_view(views.view_file, pk=sf.id))
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res["Content-Type"], "image/png")
+
     def test_view_forbidden_for_non_owner_non_admin(self):
         sf = self._mk_file(self.owner, name="x.txt", content=b"abc")
         self.client.force_authenticate(self.other)
@@ -667,6 +1047,93 @@ class CreateFolderMoreBranchesTests(APITestCase):
         self.assertTrue(res.data["is_folder"])
 
 
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class FolderTreeTests(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username="treeowner", email="t@x", full_name="T", password="Abcdef1!"
+        )
+        self.client.force_authenticate(self.owner)
+
+    def _folder(self, name, parent=None, **extra):
+        return StoredFile.objects.create(
+            owner=self.owner, original_name=name, is_folder=True, size=0,
+            parent=parent, **extra
+        )
+
+    def test_flat_tree_lists_parents_before_children(self):
+        a = self._folder("A")
+        b = self._folder("B", parent=a)
+        c = self._folder("C", parent=b)
+        self._folder("gone", parent=a).delete()
+        StoredFile.objects.create(owner=self.owner, original_name="f.txt", size=1, parent=a)
+
+        with self.assertNumQueries(1):
+            res = self.client.get("/folders/tree/")
+        self.assertEqual(res.status_code, 200)
+        rows = res.data["folders"]
+        self.assertEqual(
+            sorted(rows), sorted([[a.id, None, "A"], [b.id, a.id, "B"], [c.id, b.id, "C"]])
+        )
+        position = {row[0]: i for i, row in enumerate(rows)}
+        self.assertLess(position[a.id], position[b.id])
+        self.assertLess(position[b.id], position[c.id])
+
+    def test_etag_304_until_folders_change(self):
+        self._folder("A")
+        self.owner.refresh_from_db()
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/folders/tree/")
+        etag = res["ETag"]
+
+        with self.assertNumQueries(0):
+            res = self.client.get("/folders/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        # Файлы не меняют дерево папок
+        StoredFile.objects.create(owner=self.owner, original_name="f.txt", size=1)
+        self.owner.refresh_from_db()
+        res = self.client.get("/folders/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 304)
+
+        self._folder("B")
+        self.owner.refresh_from_db()
+        res = self.client.get("/folders/tree/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, 200)
+        self.assertNotEqual(res["ETag"], etag)
+        self.assertEqual(len(res.data["folders"]), 2)
+
+    def test_move_and_trash_of_folder_bump_version(self):
+        a = self._folder("A")
+        b = self._folder("B")
+        version = User.objects.get(pk=self.owner.pk).folder_version
+
+        from storageapp.services import move_items
+
+        move_items(StoredFile.objects.filter(pk=b.pk), a)
+        moved = User.objects.get(pk=self.owner.pk).folder_version
+        self.assertGreater(moved, version)
+
+        StoredFile.objects.filter(pk=a.pk).move_to_trash()
+        self.assertGreater(User.objects.get(pk=self.owner.pk).folder_version, moved)
+
+    def test_admin_reads_other_user_tree(self):
+        admin = User.objects.create_user(
+            username="treeadmin", email="ta@x", full_name="A", password="Abcdef1!"
+        )
+        admin.is_admin = True
+        admin.save()
+        a = self._folder("A")
+        self.client.force_authenticate(admin)
+        res = self.client.get("/folders/tree/", {"user": self.owner.id})
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["folders"], [[a.id, None, "A"]])
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/folders/tree/", {"user": admin.id})
+        self.assertEqual(res.status_code, 403)
+
+
 @override_settings(ROOT_URLCONF="storageapp.urls")
 class BulkOperationsTests(APITestCase):
     def setUp(self):
@@ -716,7 +1183,7 @@ class BulkOperationsTests(APITestCase):
         res = self.client.post(url, {"ids": [a.id, b.id]}, format="json")
         self.assertEqual(res.status_code, 400)
         self.assertIn(
-            "Cannot move objects belonging to different owners", res.data["detail"]
+            "Cannot trash objects belonging to different owners", res.data["detail"]
         )
 
     def test_bulk_trash_success_counts_only_newly_trashed(self):
@@ -767,6 +1234,61 @@ class BulkOperationsTests(APITestCase):
         self.assertEqual(res.status_code, 400)
         self.assertIn("Нельзя переместить папку", res.data["detail"])
 
+    def test_bulk_move_cannot_move_folder_into_its_descendant_400(self):
+        outer = StoredFile.objects.create(
+            owner=self.owner, original_name="Outer", is_folder=True, size=0, rel_dir=""
+        )
+        inner = StoredFile.objects.create(
+            owner=self.owner, original_name="Inner", is_folder=True, size=0, parent=outer
+        )
+        self.client.force_authenticate(self.owner)
+        url = url_for_view(views.bulk_move)
+        res = self.client.post(url, {"ids": [outer.id], "parent": inner.id}, format="json")
+        self.assertEqual(res.status_code, 400)
+
+    def test_bulk_move_rejects_trashed_items_400(self):
+        trashed_folder = StoredFile.objects.create(
+            owner=self.owner, original_name="A", is_folder=True, size=0
+        )
+        child = StoredFile.objects.create(
+            owner=self.owner, original_name="b", size=10, parent=trashed_folder
+        )
+        loose = StoredFile.objects.create(owner=self.owner, original_name="f", size=10)
+        StoredFile.objects.filter(pk__in=[trashed_folder.pk, loose.pk]).move_to_trash()
+        dst = StoredFile.objects.create(
+            owner=self.owner, original_name="C", is_folder=True, size=0
+        )
+
+        self.client.force_authenticate(self.owner)
+        url = url_for_view(views.bulk_move)
+        for ids in ([loose.id], [child.id]):
+            res = self.client.post(url, {"ids": ids, "parent": dst.id}, format="json")
+            self.assertEqual(res.status_code, 400)
+
+        child.refresh_from_db()
+        dst.refresh_from_db()
+        self.assertEqual((child.parent_id, child.is_deleted), (trashed_folder.id, True))
+        self.assertEqual((dst.total_size, dst.file_count, dst.child_count), (0, 0, 0))
+
+    def test_bulk_move_rewrites_subtree_paths(self):
+        src = StoredFile.objects.create(
+            owner=self.owner, original_name="Src", is_folder=True, size=0, rel_dir=""
+        )
+        leaf = StoredFile.objects.create(owner=self.owner, original_name="x", size=1, parent=src)
+        dst = StoredFile.objects.create(
+            owner=self.owner, original_name="Dst", is_folder=True, size=0, rel_dir=""
+        )
+
+        self.client.force_authenticate(self.owner)
+        url = url_for_view(views.bulk_move)
+        res = self.client.post(url, {"ids": [src.id], "parent": dst.id}, format="json")
+        self.assertEqual(res.status_code, 200)
+
+        src.refresh_from_db()
+        leaf.refresh_from_db()
+        self.assertEqual(src.tree_path, f"/{dst.id}/")
+        self.assertEqual(leaf.tree_path, f"/{dst.id}/{src.id}/")
+
     def test_bulk_move_success(self):
         folder = StoredFile.objects.create(
             owner=self.owner, original_name="F", is_folder=True, size=0, rel_dir=""
@@ -782,6 +1304,461 @@ class BulkOperationsTests(APITestCase):
         sf.refresh_from_db()
         self.assertEqual(sf.parent_id, folder.id)
 
+    def test_bulk_move_query_count_does_not_grow_with_selection(self):
+        dst = StoredFile.objects.create(
+            owner=self.owner, original_name="Dst", is_folder=True, size=0, rel_dir=""
+        )
+        self.client.force_authenticate(self.owner)
+        url = url_for_view(views.bulk_move)
+
+        def move(count):
+            ids = []
+            for i in range(count):
+                folder = StoredFile.objects.create(
+                    owner=self.owner, original_name=f"F{count}-{i}", is_folder=True, size=0
+                )
+                StoredFile.objects.create(
+                    owner=self.owner, original_name="x", size=1, parent=folder
+                )
+                ids.append(folder.id)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(url, {"ids": ids, "parent": dst.id}, format="json")
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data["moved"], count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(move(2), move(20))
+
+        dst.refresh_from_db()
+        self.assertEqual((dst.total_size, dst.file_count, dst.child_count), (22, 22, 22))
+        self.assertFalse(
+            StoredFile.objects.filter(owner=self.owner, original_name="x")
+            .exclude(tree_path__startswith=dst.subtree_prefix)
+            .exists()
+        )
+
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class BulkSelectorTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="owner01", email="o@x", full_name="O", password="Abcdef1!"
+        )
+        self.other = User.objects.create_user(
+            username="other01", email="x@x", full_name="X", password="Abcdef1!"
+        )
+        self.folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        self.dst = StoredFile.objects.create(
+            owner=self.owner, original_name="Dst", is_folder=True, size=0
+        )
+
+    def _files(self, count, ext, parent=None):
+        return [
+            StoredFile.objects.create(
+                owner=self.owner, original_name=f"{ext}{i}.{ext}", size=1,
+                parent=parent or self.folder,
+            )
+            for i in range(count)
+        ]
+
+    def test_trash_by_selector_with_type_and_exclude(self):
+        images = self._files(4, "jpg")
+        docs = self._files(2, "txt")
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/bulk/trash/",
+            {
+                "selector": {
+                    "parent": self.folder.id,
+                    "type": ["image"],
+                    "exclude": [images[0].id],
+                }
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["trashed"], 3)
+        self.assertEqual(
+            set(StoredFile.objects.filter(parent=self.folder).values_list("id", flat=True)),
+            {images[0].id, *(sf.id for sf in docs)},
+        )
+        self.folder.refresh_from_db()
+        self.assertEqual((self.folder.total_size, self.folder.child_count), (3, 3))
+
+    def test_move_by_selector_query_count_does_not_grow(self):
+        self.client.force_authenticate(self.owner)
+
+        def move(count):
+            source = StoredFile.objects.create(
+                owner=self.owner, original_name=f"S{count}", is_folder=True, size=0
+            )
+            self._files(count, "txt", parent=source)
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(
+                    "/files/bulk-move/",
+                    {"selector": {"parent": source.id}, "parent": self.dst.id},
+                    format="json",
+                )
+            self.assertEqual(res.status_code, 200)
+            self.assertEqual(res.data["moved"], count)
+            self.assertTrue(all(
+                len(q["sql"]) < 2000 for q in ctx.captured_queries
+                if not q["sql"].startswith("INSERT")
+            ))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(move(3), move(30))
+        self.dst.refresh_from_db()
+        self.assertEqual((self.dst.total_size, self.dst.child_count), (33, 33))
+
+    def test_selector_respects_upload_date(self):
+        old = self._files(2, "txt")
+        StoredFile.objects.filter(id__in=[sf.id for sf in old]).update(
+            uploaded_at=timezone.now() - timedelta(days=10)
+        )
+        self._files(1, "txt")
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/bulk/trash/",
+            {
+                "selector": {
+                    "parent": self.folder.id,
+                    "uploaded_before": (timezone.now() - timedelta(days=1)).isoformat(),
+                }
+            },
+            format="json",
+        )
+        self.assertEqual(res.data["trashed"], 2)
+        self.assertTrue(all(
+            StoredFile.objects.get(pk=sf.pk).is_deleted for sf in old
+        ))
+
+    def test_selector_of_foreign_folder_forbidden(self):
+        foreign = StoredFile.objects.create(
+            owner=self.other, original_name="X", is_folder=True, size=0
+        )
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/bulk/trash/", {"selector": {"parent": foreign.id}}, format="json"
+        )
+        self.assertEqual(res.status_code, 403)
+
+    def test_selector_unknown_type_400(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/bulk/trash/",
+            {"selector": {"parent": self.folder.id, "type": ["nope"]}},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 400)
+
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class BatchEndpointTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="owner01", email="o@x", full_name="O", password="Abcdef1!"
+        )
+        self.other = User.objects.create_user(
+            username="other01", email="x@x", full_name="X", password="Abcdef1!"
+        )
+        self.a = StoredFile.objects.create(owner=self.owner, original_name="a.txt", size=2)
+        self.b = StoredFile.objects.create(owner=self.owner, original_name="b.txt", size=3)
+
+    def test_runs_operations_in_order_with_references(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/batch/",
+            {
+                "operations": [
+                    {"op": "create_folder", "name": "Docs"},
+                    {"op": "create_folder", "name": "Inner", "parent": "$0"},
+                    {"op": "move", "ids": [self.a.id, self.b.id], "parent": "$1"},
+                    {"op": "patch", "id": self.a.id, "name": "renamed.txt"},
+                    {"op": "issue_public_link", "id": self.b.id},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, 200)
+        results = res.data["results"]
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[2], {"moved": 2})
+        self.assertEqual(results[3]["original_name"], "renamed.txt")
+        self.assertTrue(results[4]["url"].endswith(f"/d/{results[4]['token']}/"))
+
+        docs = StoredFile.objects.get(pk=results[0]["id"])
+        inner = StoredFile.objects.get(pk=results[1]["id"])
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.parent_id, inner.id)
+        self.assertEqual(self.a.tree_path, f"/{docs.id}/{inner.id}/")
+        self.assertEqual((docs.total_size, docs.file_count, docs.child_count), (5, 2, 1))
+
+    def test_failed_operation_rolls_back_whole_batch(self):
+        foreign = StoredFile.objects.create(owner=self.other, original_name="x", size=1)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/batch/",
+            {
+                "operations": [
+                    {"op": "create_folder", "name": "Docs"},
+                    {"op": "trash", "ids": [self.a.id]},
+                    {"op": "move", "ids": [foreign.id], "parent": "$0"},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual((res.data["failed"], res.data["op"]), (2, "move"))
+        self.assertFalse(StoredFile.objects.filter(original_name="Docs").exists())
+        self.a.refresh_from_db()
+        self.assertFalse(self.a.is_deleted)
+
+    def test_move_of_trashed_objects_fails_batch(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        child = StoredFile.objects.create(
+            owner=self.owner, original_name="x", size=4, parent=folder
+        )
+
+        self.client.force_authenticate(self.owner)
+        for ids in ([self.a.id], [child.id]):
+            res = self.client.post(
+                "/batch/",
+                {
+                    "operations": [
+                        {"op": "trash", "ids": [folder.id, self.a.id]},
+                        {"op": "create_folder", "name": "Docs"},
+                        {"op": "move", "ids": ids, "parent": "$1"},
+                    ]
+                },
+                format="json",
+            )
+            self.assertEqual(res.status_code, 400)
+            self.assertEqual((res.data["failed"], res.data["op"]), (2, "move"))
+
+        child.refresh_from_db()
+        self.assertEqual((child.parent_id, child.is_deleted), (folder.id, False))
+        self.assertFalse(StoredFile.objects.filter(original_name="Docs").exists())
+
+    def test_trash_then_restore_in_one_batch(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+        leaf = StoredFile.objects.create(
+            owner=self.owner, original_name="x", size=4, parent=folder
+        )
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/batch/",
+            {
+                "operations": [
+                    {"op": "trash", "ids": [folder.id]},
+                    {"op": "restore", "ids": [folder.id]},
+                ]
+            },
+            format="json",
+        )
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["results"], [{"trashed": 1}, {"restored": 1}])
+        leaf.refresh_from_db()
+        self.assertFalse(leaf.is_deleted)
+
+    def test_unknown_operation_400(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/batch/", {"operations": [{"op": "explode"}]}, format="json"
+        )
+        self.assertEqual(res.status_code, 400)
+        self.assertEqual(res.data["failed"], 0)
+
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class TrashBulkEndpointsTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="owner01", email="o@x", full_name="O", password="Abcdef1!"
+        )
+        self.other = User.objects.create_user(
+            username="other01", email="x@x", full_name="X", password="Abcdef1!"
+        )
+        self.folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+
+    def _trashed(self, count, parent=None, owner=None):
+        items = []
+        for i in range(count):
+            sub = StoredFile.objects.create(
+                owner=owner or self.owner,
+                original_name=f"D{i}",
+                is_folder=True,
+                size=0,
+                parent=parent,
+            )
+            StoredFile.objects.create(
+                owner=owner or self.owner, original_name="x", size=2, parent=sub
+            )
+            sub.soft_delete()
+            items.append(sub)
+        return items
+
+    def test_bulk_restore_returns_subtrees_to_original_folder(self):
+        items = self._trashed(3, parent=self.folder)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/bulk/restore/", {"ids": [sf.id for sf in items]}, format="json"
+        )
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data["restored"], 3)
+
+        self.folder.refresh_from_db()
+        self.assertEqual(
+            (self.folder.total_size, self.folder.file_count, self.folder.child_count),
+            (6, 3, 3),
+        )
+        self.assertFalse(
+            StoredFile.objects.filter(owner=self.owner, is_deleted=True).exists()
+        )
+        leaf = StoredFile.objects.get(parent=items[0])
+        self.assertEqual(leaf.tree_path, f"/{self.folder.id}/{items[0].id}/")
+
+    def test_bulk_restore_query_count_does_not_grow_with_selection(self):
+        self.client.force_authenticate(self.owner)
+
+        def restore(count):
+            ids = [sf.id for sf in self._trashed(count, parent=self.folder)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post("/files/bulk/restore/", {"ids": ids}, format="json")
+            self.assertEqual(res.data["restored"], count)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(restore(2), restore(20))
+
+    def test_bulk_restore_forbidden_for_foreign_objects(self):
+        foreign = self._trashed(1, owner=self.other)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post("/files/bulk/restore/", {"ids": [foreign[0].id]}, format="json")
+        self.assertEqual(res.status_code, 403)
+
+    def test_bulk_delete_purges_only_trashed(self):
+        trashed = self._trashed(2)
+        alive = StoredFile.objects.create(owner=self.owner, original_name="a", size=5)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/bulk/delete/",
+            {"ids": [trashed[0].id, trashed[1].id, alive.id]},
+            format="json",
+        )
+        self.assertEqual(res.status_code, 200)
+        # bytes — освобождённое на диске место, блобов у этих строк нет
+        self.assertEqual(res.data, {"deleted": 4, "files": 2, "bytes": 0})
+        self.assertTrue(StoredFile.objects.filter(pk=alive.pk).exists())
+
+    def test_empty_trash_purges_only_own_trash(self):
+        self._trashed(3)
+        self._trashed(1, owner=self.other)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post("/files/trash/empty/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.data, {"deleted": 6, "files": 3, "bytes": 0})
+        self.assertFalse(StoredFile.objects.filter(owner=self.owner, is_deleted=True).exists())
+        self.assertTrue(StoredFile.objects.filter(owner=self.other, is_deleted=True).exists())
+        self.assertTrue(StoredFile.objects.filter(pk=self.folder.pk).exists())
+
+    def test_empty_trash_of_other_user_requires_admin(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(f"/files/trash/empty/?user={self.other.id}")
+        self.assertEqual(res.status_code, 403)
+
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class CopyFilesTests(APITestCase):
+    def setUp(self):
+        self.tmp_media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_media, ignore_errors=True)
+        override = override_settings(MEDIA_ROOT=self.tmp_media)
+        override.enable()
+        self.addCleanup(override.disable)
+
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="copyowner", email="c@x", full_name="C", password="Abcdef1!"
+        )
+        self.other = User.objects.create_user(
+            username="copyother", email="d@x", full_name="D", password="Abcdef1!"
+        )
+        self.folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", is_folder=True, size=0
+        )
+
+    def _file(self, name, data, parent=None):
+        sf = StoredFile.objects.create(
+            owner=self.owner, original_name=name, size=len(data), parent=parent, rel_dir="u"
+        )
+        path = Path(self.tmp_media) / StoredFile.blob_rel_path(sf.rel_dir, sf.disk_name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        return sf
+
+    def test_copies_files_and_folders_into_target(self):
+        src = self._file("a.txt", b"abc")
+        sub = StoredFile.objects.create(
+            owner=self.owner, original_name="S", is_folder=True, size=0
+        )
+        self._file("b.txt", b"12", parent=sub)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/copy/", {"ids": [src.id, sub.id], "parent": self.folder.id}, format="json"
+        )
+
+        self.assertEqual(res.status_code, 201)
+        self.assertEqual(res.data["copied"], 2)
+        self.assertEqual(
+            sorted(item["original_name"] for item in res.data["items"]), ["S", "a.txt"]
+        )
+        self.folder.refresh_from_db()
+        self.assertEqual(
+            (self.folder.total_size, self.folder.file_count, self.folder.child_count),
+            (5, 2, 2),
+        )
+        copy = StoredFile.objects.get(parent=self.folder, original_name="a.txt")
+        blob = Path(self.tmp_media) / StoredFile.blob_rel_path(copy.rel_dir, copy.disk_name)
+        self.assertEqual(blob.read_bytes(), b"abc")
+
+    def test_copy_into_foreign_folder_forbidden(self):
+        src = self._file("a.txt", b"abc")
+        foreign = StoredFile.objects.create(
+            owner=self.other, original_name="X", is_folder=True, size=0
+        )
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.post(
+            "/files/copy/", {"ids": [src.id], "parent": foreign.id}, format="json"
+        )
+
+        self.assertEqual(res.status_code, 403)
+        self.assertEqual(StoredFile.objects.filter(original_name="a.txt").count(), 1)
+
 
 @override_settings(ROOT_URLCONF="storageapp.urls")
 class DownloadArchiveTests(APITestCase):
@@ -867,6 +1844,23 @@ class DownloadArchiveTests(APITestCase):
         self.assertIn("a.txt", names)
         self.assertTrue(any(n.startswith("a.txt") and n != "a.txt" for n in names))
 
+    def test_selector_archives_matching_files(self):
+        self._mk_file(self.owner, "a.jpg", b"a")
+        self._mk_file(self.owner, "b.png", b"b")
+        self._mk_file(self.owner, "c.txt", b"c")
+        self._mk_file(self.other, "d.jpg", b"d")
+
+        self.client.force_authenticate(self.owner)
+        url = url_for_view(views.download_archive)
+        res = self.client.post(
+            url, {"selector": {"parent": None, "type": ["image"]}}, format="json"
+        )
+        self.assertEqual(res.status_code, 200)
+
+        body = b"".join(res.streaming_content)
+        names = sorted(zipfile.ZipFile(io.BytesIO(body), "r").namelist())
+        self.assertEqual(names, ["a.jpg", "b.png"])
+
 
 # ======================================================
 # storage_usage
@@ -893,3 +1887,235 @@ class StorageUsageTests(APITestCase):
         self.assertEqual(res.status_code, 200)
         self.assertEqual(res.data["used_bytes"], 15)
         self.assertIn("quota_bytes", res.data)
+
+
+# ======================================================
+# list_changes
+# ======================================================
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class ChangeFeedTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="feedowner", email="f@x", full_name="F", password="Abcdef1!"
+        )
+        self.other = User.objects.create_user(
+            username="feedother", email="g@x", full_name="G", password="Abcdef1!"
+        )
+
+    def test_requires_auth(self):
+        res = self.client.get("/changes/")
+        self.assertEqual(res.status_code, 403)
+
+    def test_feed_returns_only_changes_after_cursor(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="F", size=0, is_folder=True
+        )
+        StoredFile.objects.create(owner=self.other, original_name="alien", size=1)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/changes/")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual([c["id"] for c in res.data["changes"]], [folder.id])
+        self.assertEqual(res.data["changes"][0]["kind"], StorageChange.CREATE)
+        self.assertFalse(res.data["has_more"])
+        cursor = res.data["cursor"]
+
+        sf = StoredFile.objects.create(owner=self.owner, original_name="a.txt", size=3)
+        self.client.patch(f"/files/{sf.id}/", {"name": "b.txt"}, format="json")
+        self.client.post("/files/bulk-move/", {"ids": [sf.id], "parent": folder.id}, format="json")
+
+        res = self.client.get("/changes/", {"since": cursor})
+        self.assertEqual(res.status_code, 200)
+        # create -> rename -> move схлопываются в один последний снимок
+        self.assertEqual(len(res.data["changes"]), 1)
+        change = res.data["changes"][0]
+        self.assertEqual(change["kind"], StorageChange.MOVE)
+        self.assertEqual(change["name"], "b.txt")
+        self.assertEqual(change["parent"], folder.id)
+
+        res = self.client.get("/changes/", {"since": res.data["cursor"]})
+        self.assertEqual(res.data["changes"], [])
+
+    def test_trash_restore_and_delete_are_recorded(self):
+        sf = StoredFile.objects.create(owner=self.owner, original_name="a", size=1)
+        sf.soft_delete()
+        sf.restore()
+        pk = sf.id
+        sf.delete()
+
+        kinds = list(
+            StorageChange.objects.filter(file_id=pk).order_by("id").values_list("kind", flat=True)
+        )
+        self.assertEqual(
+            kinds,
+            [
+                StorageChange.CREATE,
+                StorageChange.TRASH,
+                StorageChange.RESTORE,
+                StorageChange.DELETE,
+            ],
+        )
+
+    def test_pagination_sets_has_more(self):
+        for i in range(3):
+            StoredFile.objects.create(owner=self.owner, original_name=f"f{i}", size=1)
+
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/changes/", {"limit": 2})
+        self.assertEqual(len(res.data["changes"]), 2)
+        self.assertTrue(res.data["has_more"])
+
+        res = self.client.get("/changes/", {"since": res.data["cursor"], "limit": 2})
+        self.assertEqual(len(res.data["changes"]), 1)
+        self.assertFalse(res.data["has_more"])
+
+    def test_invalid_cursor_400(self):
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/changes/", {"since": "garbage"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_expired_cursor_410(self):
+        issued = int((timezone.now() - timedelta(days=365)).timestamp())
+        self.client.force_authenticate(self.owner)
+        res = self.client.get("/changes/", {"since": f"1.{issued}"})
+        self.assertEqual(res.status_code, 410)
+        self.assertTrue(res.data["reset"])
+
+
+# ======================================================
+# search_files
+# ======================================================
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class SearchFilesTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="searchowner", email="s@x", full_name="S", password="Abcdef1!"
+        )
+        self.other = User.objects.create_user(
+            username="searchother", email="t@x", full_name="T", password="Abcdef1!"
+        )
+        self.client.force_authenticate(self.owner)
+
+    def _mk(self, name, parent=None, owner=None, **kwargs):
+        return StoredFile.objects.create(
+            owner=owner or self.owner, original_name=name, size=1, parent=parent, **kwargs
+        )
+
+    def test_q_required(self):
+        res = self.client.get("/files/search/")
+        self.assertEqual(res.status_code, 400)
+
+    def test_ranks_exact_then_prefix_then_substring_across_folders(self):
+        docs = self._mk("Docs", is_folder=True)
+        deep = self._mk("2024", parent=docs, is_folder=True)
+        substring = self._mk("my report.pdf", parent=deep)
+        prefix = self._mk("Report 2024.pdf")
+        exact = self._mk("report", parent=docs)
+        trashed = self._mk("report old.pdf")
+        trashed.soft_delete()
+        self._mk("report", owner=self.other)
+
+        res = self.client.get("/files/search/", {"q": "REPORT"})
+        self.assertEqual(res.status_code, 200)
+        ids = [item["id"] for item in res.data["results"]]
+        self.assertEqual(ids, [exact.id, prefix.id, substring.id])
+        paths = {item["id"]: item["parent_path"] for item in res.data["results"]}
+        self.assertEqual(paths[substring.id], "Docs/2024")
+        self.assertEqual(paths[exact.id], "Docs")
+        self.assertEqual(paths[prefix.id], "")
+        self.assertIsNone(res.data["next_cursor"])
+
+    def test_cursor_pagination_walks_all_matches_once(self):
+        expected = [self._mk(f"note {i:02d}.txt").id for i in range(7)]
+
+        seen = []
+        params = {"q": "note", "limit": 3}
+        while True:
+            res = self.client.get("/files/search/", params)
+            self.assertEqual(res.status_code, 200)
+            seen.extend(item["id"] for item in res.data["results"])
+            if not res.data["next_cursor"]:
+                break
+            params["cursor"] = res.data["next_cursor"]
+
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor_400(self):
+        res = self.client.get("/files/search/", {"q": "x", "cursor": "!!!"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_other_user_requires_admin(self):
+        res = self.client.get("/files/search/", {"q": "x", "user": self.other.id})
+        self.assertEqual(res.status_code, 403)
+
+
+@override_settings(ROOT_URLCONF="storageapp.urls")
+class ListOrderingAndTypeTests(APITestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.owner = User.objects.create_user(
+            username="sortowner", email="so@x", full_name="S", password="Abcdef1!"
+        )
+        self.client.force_authenticate(self.owner)
+
+    def _names(self, params):
+        res = self.client.get("/files/", params)
+        self.assertEqual(res.status_code, 200)
+        return [item["original_name"] for item in res.data["results"]]
+
+    def test_ordering_by_name_and_size_keeps_folders_first(self):
+        big = StoredFile.objects.create(
+            owner=self.owner, original_name="Zdir", size=0, is_folder=True
+        )
+        StoredFile.objects.create(owner=self.owner, original_name="in.bin", size=50, parent=big)
+        StoredFile.objects.create(
+            owner=self.owner, original_name="Adir", size=0, is_folder=True
+        )
+        StoredFile.objects.create(owner=self.owner, original_name="b.txt", size=10)
+        StoredFile.objects.create(owner=self.owner, original_name="a.txt", size=20)
+
+        self.assertEqual(self._names({"ordering": "name"}), ["Adir", "Zdir", "a.txt", "b.txt"])
+        self.assertEqual(self._names({"ordering": "-name"}), ["Zdir", "Adir", "b.txt", "a.txt"])
+        self.assertEqual(self._names({"ordering": "-size"}), ["Zdir", "Adir", "a.txt", "b.txt"])
+
+    def test_recent_orders_folders_and_files_by_one_size_key(self):
+        folder = StoredFile.objects.create(
+            owner=self.owner, original_name="mid", size=0, is_folder=True
+        )
+        StoredFile.objects.create(owner=self.owner, original_name="a.bin", size=12, parent=folder)
+        StoredFile.objects.create(owner=self.owner, original_name="b.bin", size=8, parent=folder)
+        StoredFile.objects.create(owner=self.owner, original_name="small.txt", size=5)
+        StoredFile.objects.create(owner=self.owner, original_name="big.txt", size=30)
+
+        expected = ["big.txt", "mid", "a.bin", "b.bin", "small.txt"]
+        self.assertEqual(self._names({"view": "recent", "ordering": "-size"}), expected)
+        self.assertEqual(self._names({"view": "recent", "ordering": "size"}), expected[::-1])
+
+    def test_unknown_ordering_400(self):
+        res = self.client.get("/files/", {"ordering": "owner"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_type_filter(self):
+        StoredFile.objects.create(owner=self.owner, original_name="a.JPG", size=1)
+        StoredFile.objects.create(owner=self.owner, original_name="b.pdf", size=1)
+        StoredFile.objects.create(owner=self.owner, original_name="c.mp4", size=1)
+
+        res = self.client.get("/files/", {"view": "recent", "type": "image,video"})
+        self.assertEqual(
+            sorted(item["original_name"] for item in res.data["results"]), ["a.JPG", "c.mp4"]
+        )
+        self.assertEqual(res.data["results"][0]["category"], "video")
+
+    def test_unknown_type_400(self):
+        res = self.client.get("/files/", {"type": "spreadsheet"})
+        self.assertEqual(res.status_code, 400)
+
+    def test_rename_updates_category(self):
+        sf = StoredFile.objects.create(owner=self.owner, original_name="a.txt", size=1)
+        self.client.patch(f"/files/{sf.id}/", {"name": "a.png"}, format="json")
+        sf.refresh_from_db()
+        self.assertEqual(sf.category, "image")
@@ -17,6 +17,9 @@ urlpatterns = [
     # просмотр файла в браузере
     path("files/<int:pk>/view/", views.view_file),  # GET (inline preview)
 
+    # поиск по имени во всём хранилище
+    path("files/search/", views.search_files),  # GET
+
     # использование хранилища
     path("files/usage/", views.storage_usage),  # GET
 
@@ -30,11 +33,27 @@ urlpatterns = [
     # создание папки
     path("folders/", views.create_folder),  # POST
 
+    # дерево всех папок пользователя (ETag по версии папок)
+    path("folders/tree/", views.folder_tree),  # GET
+
     # массовые операции
     path("files/bulk-move/", views.bulk_move),      # POST
     path("files/bulk/trash/", views.bulk_trash),    # POST
+    path("files/bulk/restore/", views.bulk_restore),  # POST
+    path("files/bulk/delete/", views.bulk_delete),    # POST
+    path("files/trash/empty/", views.empty_trash),    # POST
     path("files/archive/", views.download_archive), # POST
+    path("files/copy/", views.copy_files),          # POST
+
+    # несколько операций одним запросом (одна транзакция)
+    path("batch/", views.batch),  # POST
 
     # восстановление из корзины
     path("files/<int:pk>/restore/", views.restore_file),  # POST
+
+    # журнал изменений для синхронизации (?since=<cursor>)
+    path("changes/", views.list_changes),  # GET
+
+    # живые уведомления об изменениях (SSE, ASGI)
+    path("events/", views.storage_events),  # GET
 ]
@@ -1,15 +1,23 @@
 from urllib.parse import quote as urlquote
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+import hashlib
+import json
 from tempfile import NamedTemporaryFile
 import zipfile
 import mimetypes
 from datetime import timedelta
 from pathlib import Path
 
-from django.http import FileResponse, Http404
+from django.core.cache import cache
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from django.conf import settings
-from django.db.models import Sum
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, When
+from django.utils.dateparse import parse_datetime
+from django.utils.http import parse_etags
+from django.views.decorators.http import require_GET
 
 from rest_framework import status
 from rest_framework.pagination import PageNumberPagination
@@ -17,8 +25,11 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
-from .models import StoredFile
-from . import services
+from mycloud.renderers import dumps
+
+from .models import CATEGORIES, StorageChange, StoredFile
+from . import events, services
+from .idempotency import idempotent
 
 
 # ================= HELPERS =================
@@ -30,95 +41,183 @@ def _is_admin(user) -> bool:
     )
 
 
-def _folder_path(folder: StoredFile | None) -> str | None:
-    if folder is None:
-        return None
-
-    parts = []
-    cur = folder
-    while cur is not None:
-        parts.append(cur.original_name)
-        cur = cur.parent
-    return "/".join(reversed(parts))
-
-
-def _serialize(sf: StoredFile) -> dict:
-    deleted_from_obj = getattr(sf, "deleted_from", None)
+# Колонки элемента списка; порядок совпадает с распаковкой в _serialize_row
+_ROW_FIELDS = (
+    "id",
+    "original_name",
+    "size",
+    "uploaded_at",
+    "last_downloaded_at",
+    "comment",
+    "public_token",
+    "is_deleted",
+    "deleted_at",
+    "is_folder",
+    "parent_id",
+    "deleted_from_id",
+    "total_size",
+    "file_count",
+    "child_count",
+    "category",
+    "content_type",
+    "width",
+    "height",
+    "duration",
+)
+_PARENT = _ROW_FIELDS.index("parent_id")
+_DELETED_FROM = _ROW_FIELDS.index("deleted_from_id")
+
+# Ключи элемента списка, допустимые в ?fields=
+_ITEM_KEYS = (
+    "id",
+    "original_name",
+    "size",
+    "file_count",
+    "child_count",
+    "category",
+    "content_type",
+    "width",
+    "height",
+    "duration",
+    "uploaded_at",
+    "last_downloaded_at",
+    "comment",
+    "public_token",
+    "has_public_link",
+    "is_deleted",
+    "deleted_at",
+    "is_folder",
+    "parent",
+    "deleted_from",
+    "deleted_from_path",
+)
+
+
+def _serialize_row(row: tuple, paths: dict[int, str]) -> dict:
+    (
+        pk,
+        name,
+        size,
+        uploaded_at,
+        last_downloaded_at,
+        comment,
+        public_token,
+        is_deleted,
+        deleted_at,
+        is_folder,
+        parent_id,
+        deleted_from_id,
+        total_size,
+        file_count,
+        child_count,
+        category,
+        content_type,
+        width,
+        height,
+        duration,
+    ) = row
     return {
-        "id": sf.id,
-        "original_name": sf.original_name,
-        "size": sf.size,
-        "uploaded_at": sf.uploaded_at.isoformat() if sf.uploaded_at else None,
+        "id": pk,
+        "original_name": name,
+        "size": total_size if is_folder else size,
+        "file_count": file_count,
+        "child_count": child_count,
+        "category": category,
+        "content_type": content_type,
+        "width": width,
+        "height": height,
+        "duration": duration,
+        "uploaded_at": uploaded_at.isoformat() if uploaded_at else None,
         "last_downloaded_at": (
-            sf.last_downloaded_at.isoformat()
-            if sf.last_downloaded_at else None
+            last_downloaded_at.isoformat() if last_downloaded_at else None
         ),
-        "comment": sf.comment,
-        "public_token": sf.public_token,
-        "has_public_link": bool(sf.public_token),
-        "is_deleted": sf.is_deleted,
-        "deleted_at": sf.deleted_at.isoformat() if sf.deleted_at else None,
-        "is_folder": bool(sf.is_folder),
-        "parent": sf.parent_id,
-        "deleted_from": sf.deleted_from_id,
-        "deleted_from_path": _folder_path(deleted_from_obj),
+        "comment": comment,
+        "public_token": public_token,
+        "has_public_link": bool(public_token),
+        "is_deleted": is_deleted,
+        "deleted_at": deleted_at.isoformat() if deleted_at else None,
+        "is_folder": bool(is_folder),
+        "parent": parent_id,
+        "deleted_from": deleted_from_id,
+        "deleted_from_path": paths.get(deleted_from_id),
     }
 
-def _folder_sizes_recursive(owner_id: int, root_folder_ids: list[int]) -> dict[int, int]:
+
+def _serialize(sf: StoredFile, paths: dict[int, str] | None = None) -> dict:
     """
-    Возвращает {root_folder_id: total_bytes} для каждой папки из root_folder_ids.
-    total_bytes считается рекурсивно по всем вложенным подпапкам и файлам.
+    paths — заранее разрешённые пути папок (services.resolve_folder_paths);
+    без него путь deleted_from разрешается отдельным вызовом.
     """
-    if not root_folder_ids:
-        return {}
+    if paths is None:
+        paths = services.resolve_folder_paths([sf.deleted_from_id])
+    return _serialize_row(tuple(getattr(sf, f) for f in _ROW_FIELDS), paths)
 
-    # root_of[folder_id] = root_folder_id
-    root_of: dict[int, int] = {fid: fid for fid in root_folder_ids}
-    totals: dict[int, int] = {fid: 0 for fid in root_folder_ids}
 
-    frontier = list(root_folder_ids)
+# Размер пачки строк для ?stream=ndjson (chunk_size серверного курсора)
+NDJSON_CHUNK_SIZE = 1000
 
-    while frontier:
-        parent_ids = frontier
-        frontier = []
 
-        file_rows = (
-            StoredFile.objects.filter(
-                owner_id=owner_id,
-                is_deleted=False,
-                is_folder=False,
-                parent_id__in=parent_ids,
-            )
-            .values("parent_id")
-            .annotate(total=Sum("size"))
-        )
-
-        for row in file_rows:
-            parent_id = row["parent_id"]
-            total = int(row["total"] or 0)
-            root_id = root_of.get(parent_id)
-            if root_id is not None:
-                totals[root_id] += total
-
-        child_folders = (
-            StoredFile.objects.filter(
-                owner_id=owner_id,
-                is_deleted=False,
-                is_folder=True,
-                parent_id__in=parent_ids,
-            )
-            .values_list("id", "parent_id")
-        )
+def _ndjson_lines(qs, owner_id: int, fields: list[str]):
+    """
+    Генератор NDJSON: строки читаются серверным курсором пачками,
+    каждая пачка сериализуется и отдаётся сразу (память не растёт
+    с размером папки).
+    """
+    rows = qs.values_list(*_ROW_FIELDS).iterator(chunk_size=NDJSON_CHUNK_SIZE)
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= NDJSON_CHUNK_SIZE:
+            yield _ndjson_batch(batch, owner_id, fields)
+            batch = []
+    if batch:
+        yield _ndjson_batch(batch, owner_id, fields)
+
+
+def _ndjson_batch(rows: list[tuple], owner_id: int, fields: list[str]) -> bytes:
+    paths = services.resolve_folder_paths(
+        {row[_DELETED_FROM] for row in rows}, owner_id=owner_id
+    )
+    out = []
+    for row in rows:
+        item = _serialize_row(row, paths)
+        if fields:
+            item = {f: item[f] for f in fields}
+        out.append(dumps(item))
+    out.append(b"")
+    return b"\n".join(out)
+
+
+# ?ordering= -> колонки сортировки; "-" в начале — по убыванию.
+# Размер папки — total_size (у файлов 0), файла — size (у папок 0).
+_ORDERINGS = {
+    "name": ("original_name",),
+    "size": ("total_size", "size"),
+    "uploaded_at": ("uploaded_at",),
+    "last_downloaded_at": ("last_downloaded_at",),
+}
+DEFAULT_ORDERING = "-uploaded_at"
+
+
+def _ordering_fields(raw: str | None, folders_first: bool = True) -> list | None:
+    """
+    "-size" -> ["-total_size", "-size"]; None — неизвестный ключ.
 
-        for child_id, parent_id in child_folders:
-    
-            root_id = root_of.get(parent_id)
-            if root_id is None:
-                continue
-            root_of[child_id] = root_id
-            frontier.append(child_id)
+    Пара колонок размера верна, только когда папки уже отделены от файлов
+    (folders_first). В смешанных списках (view=recent) у всех файлов
+    total_size = 0, поэтому размер сортируется одним выражением.
+    """
+    raw = raw or DEFAULT_ORDERING
+    desc = raw.startswith("-")
+    key = raw.lstrip("-")
+    columns = _ORDERINGS.get(key)
+    if columns is None:
+        return None
+    if key == "size" and not folders_first:
+        size = Case(When(is_folder=True, then=F("total_size")), default=F("size"))
+        return [size.desc() if desc else size.asc()]
+    return [f"-{c}" if desc else c for c in columns]
 
-    return totals
 
 class FilePagination(PageNumberPagination):
     page_size = 20
@@ -130,6 +229,7 @@ class FilePagination(PageNumberPagination):
 
 @api_view(["GET", "POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def list_files(request):
     view = request.GET.get("view", "my")
     parent_param = request.GET.get("parent")
@@ -223,20 +323,49 @@ def list_files(request):
                 status=status.HTTP_400_BAD_REQUEST,
             )
         qs = StoredFile.objects.filter(owner_id=uid)
-        owner_id_for_sizes = uid
+        owner_id = uid
     else:
         qs = StoredFile.objects.filter(owner=request.user)
-        owner_id_for_sizes = request.user.id
+        owner_id = request.user.id
 
+    fields = [f for f in (request.GET.get("fields") or "").split(",") if f]
+    unknown = [f for f in fields if f not in _ITEM_KEYS]
+    if unknown:
+        return Response(
+            {"detail": f"Unknown fields: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    ordering = _ordering_fields(request.GET.get("ordering"))
+    if ordering is None:
+        return Response(
+            {"detail": f"Unknown ordering, use one of: {', '.join(_ORDERINGS)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
+    types = [t for t in (request.GET.get("type") or "").split(",") if t]
+    unknown = [t for t in types if t not in CATEGORIES]
+    if unknown:
+        return Response(
+            {"detail": f"Unknown type: {', '.join(unknown)}"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if types:
+        qs = qs.filter(category__in=types)
+
+    pid = None
     if view == "trash":
         limit = timezone.now() - timedelta(days=30)
+        # Только корни корзины: поддерево удалённой папки видно внутри неё
         qs = qs.filter(
             is_deleted=True,
+            parent__isnull=True,
             deleted_at__gte=limit,
         ).order_by("-deleted_at")
 
     elif view == "recent":
-        qs = qs.filter(is_deleted=False).order_by("-uploaded_at")
+        ordering = _ordering_fields(request.GET.get("ordering"), folders_first=False)
+        qs = qs.filter(is_deleted=False).order_by(*ordering)
 
     else:
         qs = qs.filter(is_deleted=False)
@@ -252,25 +381,90 @@ def list_files(request):
                 )
             qs = qs.filter(parent_id=pid)
 
-        qs = qs.order_by("-is_folder", "-uploaded_at")
+        # Папки всегда первыми (индексы sf_dir_* в StoredFile.Meta)
+        qs = qs.order_by("-is_folder", *ordering)
 
-    paginator = FilePagination()
-    page = paginator.paginate_queryset(qs, request)
+    # ?stream=ndjson — весь список одним потоком, без пагинации и COUNT
+    if request.GET.get("stream") == "ndjson":
+        response = StreamingHttpResponse(
+            _ndjson_lines(qs, owner_id, fields),
+            content_type="application/x-ndjson",
+        )
+        response["X-Accel-Buffering"] = "no"
+        return response
+
+    # --- ETag / кэш по версии хранилища владельца ---
+    version = _storage_version(request, owner_id)
+    # Корзина меняется и без новой версии: объекты выпадают из неё по сроку
+    # хранения. Старейший deleted_at входит в ETag — когда он истекает,
+    # валидатор меняется.
+    oldest = None
+    if view == "trash":
+        oldest = qs.order_by("deleted_at").values_list("deleted_at", flat=True).first()
+    etag = _listing_etag(request, owner_id, version, oldest)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
 
-    folder_ids = [x.id for x in page if getattr(x, "is_folder", False)]
-    folder_sizes = _folder_sizes_recursive(owner_id_for_sizes, folder_ids)
+    cache_key = f"storage:list:{etag}"
+    data = cache.get(cache_key)
+    if data is None:
+        data = _listing_data(request, qs, owner_id, pid, fields)
+        cache.set(cache_key, data, settings.LISTING_CACHE_TIMEOUT)
 
-    serialized = []
-    for x in page:
-        obj = _serialize(x)
-        if obj.get("is_folder"):
-            obj["size"] = int(folder_sizes.get(x.id, 0))
-        serialized.append(obj)
+    return Response(data, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
 
-    response = paginator.get_paginated_response(serialized)
-    response.data["items"] = response.data.get("results", [])
-    response.data["data"] = response.data.get("results", [])
-    return response
+
+def _storage_version(request, owner_id: int) -> int:
+    if owner_id == request.user.id:
+        return request.user.storage_version
+    from django.contrib.auth import get_user_model
+
+    version = (
+        get_user_model().objects.filter(pk=owner_id)
+        .values_list("storage_version", flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def _listing_etag(request, owner_id: int, version: int, oldest=None) -> str:
+    """
+    Слабый ETag списка: владелец + версия его хранилища + параметры запроса
+    (view, parent, page, fields, формат ответа, хост для ссылок next/previous);
+    для корзины — ещё и deleted_at старейшего объекта в ней.
+    """
+    params = repr(
+        (sorted(request.GET.lists()), request.version, request.get_host(), oldest)
+    )
+    digest = hashlib.sha1(params.encode()).hexdigest()[:16]
+    return f'W/"{owner_id}-{version}-{digest}"'
+
+
+def _listing_data(request, qs, owner_id: int, pid: int | None, fields: list[str]):
+    # Страница читается кортежами (values_list) без создания моделей
+    paginator = FilePagination()
+    page = paginator.paginate_queryset(qs.values_list(*_ROW_FIELDS), request)
+
+    # Пути папок (deleted_from + хлебные крошки) — пачкой, без обхода .parent
+    chains = services.resolve_folder_chains(
+        {row[_DELETED_FROM] for row in page} | {pid}, owner_id=owner_id
+    )
+    paths = {pk: "/".join(name for _, name in chain) for pk, chain in chains.items()}
+
+    # Размер папки — готовый агрегат total_size (см. StoredFile.shift_folder_stats)
+    serialized = [_serialize_row(row, paths) for row in page]
+    if fields:
+        serialized = [{f: item[f] for f in fields} for item in serialized]
+
+    data = paginator.get_paginated_response(serialized).data
+    data["breadcrumbs"] = [
+        {"id": pk, "name": name} for pk, name in chains.get(pid, [])
+    ]
+    # Формат v1: те же результаты под items/data (рендерер кодирует их один раз)
+    if request.version == "1":
+        data["items"] = data["results"]
+        data["data"] = data["results"]
+    return data
 
 # ================= PATCH =================
 
@@ -282,26 +476,40 @@ def patch_file(request, pk: int):
     if not (_is_admin(request.user) or request.user == sf.owner):
         return Response({"detail": "Forbidden"}, status=403)
 
+    _apply_patch(sf, request.data)
+    return Response(_serialize(sf))
+
+
+def _apply_patch(sf: StoredFile, data) -> None:
+    """
+    Применяет к объекту имя (original_name/name) и комментарий из data
+    и записывает изменение в журнал (общая часть PATCH и /api/batch/).
+    """
     updated_fields: list[str] = []
 
     new_name = None
-    if "original_name" in request.data:
-        new_name = request.data["original_name"]
-    elif "name" in request.data:
-        new_name = request.data["name"]
+    if "original_name" in data:
+        new_name = data["original_name"]
+    elif "name" in data:
+        new_name = data["name"]
 
     if new_name is not None:
         sf.original_name = str(new_name).strip()
         updated_fields.append("original_name")
 
-    if "comment" in request.data:
-        sf.comment = str(request.data["comment"])
+    if "comment" in data:
+        sf.comment = str(data["comment"])
         updated_fields.append("comment")
 
     if updated_fields:
-        sf.save(update_fields=updated_fields)
-
-    return Response(_serialize(sf))
+        kind = (
+            StorageChange.RENAME
+            if "original_name" in updated_fields
+            else StorageChange.UPDATE
+        )
+        with transaction.atomic():
+            sf.save(update_fields=updated_fields)
+            StorageChange.objects.record(kind, [sf])
 
 # ================= DELETE =================
 
@@ -317,16 +525,9 @@ def delete_file(request, pk: int):
         sf.soft_delete()
         return Response({"status": "trashed"})
 
-    if not sf.is_folder:
-        try:
-            p = sf.path_on_disk
-            if p.exists():
-                p.unlink()
-        except Exception:
-            pass
-
-    sf.delete()
-    return Response({"status": "deleted_forever"})
+    # Вместе с поддеревом папки; блобы удаляются после коммита
+    purged = services.purge_items(StoredFile.objects.filter(pk=sf.pk))
+    return Response({"status": "deleted_forever", **purged})
 
 
 # ================= RESTORE =================
@@ -345,6 +546,13 @@ def restore_file(request, pk: int):
             status=status.HTTP_400_BAD_REQUEST,
         )
 
+    if sf.parent_id is not None:
+        # Объект удалён вместе с папкой — восстанавливается только с ней
+        return Response(
+            {"detail": "File was trashed with its folder, restore the folder instead"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+
     sf.restore()
     return Response(_serialize(sf))
 
@@ -396,7 +604,8 @@ def view_file(request, pk: int):
 
     resp = FileResponse(f)
 
-    ctype, _ = mimetypes.guess_type(sf.original_name)
+    # Тип определён при загрузке; по имени — только для строк без него
+    ctype = sf.content_type or mimetypes.guess_type(sf.original_name)[0]
     if ctype:
         resp["Content-Type"] = ctype
 
@@ -462,8 +671,23 @@ def public_download(request, token: str):
 
 # ================= CREATE FOLDER =================
 
+def _folder_name_error(name: str) -> dict | None:
+    """
+    Ошибка валидации имени новой папки (тело ответа 400) или None.
+    """
+    if not name:
+        return {"name": ["Введите имя папки"]}
+
+    forbidden = '\\/:*?"<>|'
+    if any(ch in forbidden for ch in name):
+        return {"name": ['Недопустимые символы: \\ / : * ? " < > |']}
+
+    return None
+
+
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def create_folder(request):
     name = (request.data.get("name") or "").strip()
     parent_id = request.data.get("parent")
@@ -489,18 +713,9 @@ def create_folder(request):
             return Response({"detail": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
 
-    if not name:
-        return Response(
-            {"name": ["Введите имя папки"]},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
-
-    forbidden = '\\/:*?"<>|'
-    if any(ch in forbidden for ch in name):
-        return Response(
-            {"name": ['Недопустимые символы: \\ / : * ? " < > |']},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+    error = _folder_name_error(name)
+    if error is not None:
+        return Response(error, status=status.HTTP_400_BAD_REQUEST)
 
     parent = None
     if parent_id not in (None, "", "null"):
@@ -528,6 +743,61 @@ def create_folder(request):
 
     return Response(_serialize(folder), status=status.HTTP_201_CREATED)
 
+# ================= FOLDER TREE =================
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def folder_tree(request):
+    """
+    Все живые папки пользователя (выбор папки для перемещения) одним
+    запросом по индексу sf_folder_tree:
+
+      {"version": N, "folders": [[id, parent_id, name], ...]}
+
+    Родитель всегда идёт раньше своих потомков (сортировка по tree_path).
+    ETag — по User.folder_version: пока папки не менялись, клиент получает
+    304 без запроса к StoredFile. Админ смотрит чужое дерево через ?user=.
+    """
+    owner_id = request.user.id
+    target_user_id = request.GET.get("user")
+    if target_user_id is not None:
+        if not _is_admin(request.user):
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            owner_id = int(target_user_id)
+        except ValueError:
+            return Response(
+                {"detail": "Invalid user parameter"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    if owner_id == request.user.id:
+        version = request.user.folder_version
+    else:
+        from django.contrib.auth import get_user_model
+
+        version = (
+            get_user_model().objects.filter(pk=owner_id)
+            .values_list("folder_version", flat=True)
+            .first()
+        ) or 0
+
+    etag = f'W/"tree-{owner_id}-{version}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    folders = (
+        StoredFile.objects.filter(owner_id=owner_id, is_folder=True, is_deleted=False)
+        .order_by("tree_path", "id")
+        .values_list("id", "parent_id", "original_name")
+    )
+    return Response(
+        {"version": version, "folders": [list(row) for row in folders]},
+        headers=headers,
+    )
+
+
 # ================= ZIP DOWNLOAD =================
 
 @api_view(["GET"])
@@ -557,21 +827,116 @@ def download_file(request, pk: int):
 
 # ================= BULK OPERATIONS =================
 
-@api_view(["POST"])
-@permission_classes([IsAuthenticated])
-def bulk_trash(request):
+def _selector_queryset(request, selector):
+    """
+    Выборка массовой операции по предикату вместо списка id:
+
+      {"parent": <id папки | null>, "type": ["image", ...],
+       "uploaded_after": ISO-8601, "uploaded_before": ISO-8601,
+       "exclude": [id, ...]}
+
+    Выбираются живые непосредственные потомки папки parent (null — корень
+    пользователя, админ указывает владельца через ?user=). Фильтры остаются
+    в SQL: размер запроса и стоимость проверки не зависят от числа объектов.
+
+    Возвращает (queryset, None) или (None, Response с ошибкой).
+    """
+    if not isinstance(selector, dict):
+        return None, Response(
+            {"detail": "selector must be an object"},
+            status=400,
+        )
+
+    parent_id = selector.get("parent")
+    if parent_id in (None, "", "null"):
+        owner_id = request.user.id
+        target_user_id = request.GET.get("user")
+        if target_user_id is not None:
+            if not _is_admin(request.user):
+                return None, Response({"detail": "Forbidden"}, status=403)
+            try:
+                owner_id = int(target_user_id)
+            except ValueError:
+                return None, Response({"detail": "Invalid user parameter"}, status=400)
+        qs = StoredFile.objects.filter(owner_id=owner_id, parent__isnull=True)
+    else:
+        try:
+            parent = StoredFile.objects.only("id", "owner_id").get(
+                id=int(parent_id),
+                is_folder=True,
+                is_deleted=False,
+            )
+        except (StoredFile.DoesNotExist, ValueError, TypeError):
+            return None, Response(
+                {"parent": ["Родительская папка не найдена"]},
+                status=400,
+            )
+        if not (_is_admin(request.user) or parent.owner_id == request.user.id):
+            return None, Response({"detail": "Forbidden"}, status=403)
+        qs = StoredFile.objects.filter(owner_id=parent.owner_id, parent_id=parent.id)
+    qs = qs.filter(is_deleted=False)
+
+    types = selector.get("type") or []
+    if isinstance(types, str):
+        types = [t for t in types.split(",") if t]
+    if not isinstance(types, list) or not all(t in CATEGORIES for t in types):
+        return None, Response(
+            {"detail": f"type must be a list of: {', '.join(CATEGORIES)}"},
+            status=400,
+        )
+    if types:
+        qs = qs.filter(category__in=types)
+
+    for key, lookup in (("uploaded_after", "gte"), ("uploaded_before", "lt")):
+        raw = selector.get(key)
+        if raw in (None, ""):
+            continue
+        moment = parse_datetime(raw) if isinstance(raw, str) else None
+        if moment is None:
+            return None, Response({"detail": f"Invalid {key}"}, status=400)
+        if timezone.is_naive(moment):
+            moment = timezone.make_aware(moment)
+        qs = qs.filter(**{f"uploaded_at__{lookup}": moment})
+
+    exclude = selector.get("exclude") or []
+    try:
+        exclude = {int(x) for x in exclude}
+    except (TypeError, ValueError):
+        return None, Response(
+            {"detail": "exclude must be a list of integers"},
+            status=400,
+        )
+    if exclude:
+        qs = qs.exclude(id__in=exclude)
+
+    return qs, None
+
+
+def _bulk_selection(request, action: str):
+    """
+    Разбирает {"ids": [...]} массовой операции и одним запросом проверяет,
+    что все объекты существуют и доступны пользователю.
+    Вместо ids можно передать {"selector": {...}} (см. _selector_queryset).
+    action — название операции для текста ошибки ("trash", "delete", ...).
+
+    Возвращает (queryset, None) или (None, Response с ошибкой).
+    """
+    selector = request.data.get("selector")
+    if selector is not None:
+        return _selector_queryset(request, selector)
+
     ids = request.data.get("ids")
 
     if not isinstance(ids, list) or not ids:
-        return Response(
+        return None, Response(
             {"detail": "ids must be non-empty list"},
             status=400,
         )
 
     try:
-        ids = [int(x) for x in ids]
+        ids = {int(x) for x in ids}
     except (TypeError, ValueError):
-        return Response(
+        return None, Response(
             {"detail": "ids must be integers"},
             status=400,
         )
@@ -581,63 +946,187 @@ def bulk_trash(request):
     if not _is_admin(request.user):
         qs = qs.filter(owner=request.user)
 
-    if qs.count() != len(set(ids)):
-        return Response({"detail": "Forbidden"}, status=403)
+    owners = dict(qs.values_list("id", "owner_id"))
+    if len(owners) != len(ids):
+        return None, Response({"detail": "Forbidden"}, status=403)
 
-      # Admin safety: do not allow cross-owner moves.
-      # In admin UI we always operate within a single user storage.
-    if _is_admin(request.user):
-        owner_ids = set(qs.values_list("owner_id", flat=True))
-        if len(owner_ids) != 1:
+    # Admin safety: do not allow cross-owner operations.
+    # In admin UI we always operate within a single user storage.
+    if len(set(owners.values())) != 1:
+        return None, Response(
+            {"detail": f"Cannot {action} objects belonging to different owners in one request"},
+            status=400,
+        )
+
+    return qs, None
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@idempotent
+def bulk_trash(request):
+    qs, error = _bulk_selection(request, "trash")
+    if error is not None:
+        return error
+
+    trashed = qs.move_to_trash()
+    return Response({"trashed": trashed})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@idempotent
+def bulk_restore(request):
+    """
+    Восстанавливает выбранные корни корзины вместе с поддеревьями.
+    Не лежащие в корзине объекты и объекты внутри удалённой папки
+    пропускаются. Ответ: {"restored": N}.
+    """
+    qs, error = _bulk_selection(request, "restore")
+    if error is not None:
+        return error
+
+    restored = qs.restore_from_trash()
+    return Response({"restored": restored})
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@idempotent
+def bulk_delete(request):
+    """
+    Окончательно удаляет выбранные объекты корзины вместе с поддеревьями
+    (живые объекты пропускаются). Ответ: {"deleted", "files", "bytes"}.
+    """
+    qs, error = _bulk_selection(request, "delete")
+    if error is not None:
+        return error
+
+    return Response(services.purge_items(qs.filter(is_deleted=True)))
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@idempotent
+def empty_trash(request):
+    """
+    Окончательно удаляет всю корзину пользователя (?user= — чужую, админ).
+    Ответ: {"deleted", "files", "bytes"}.
+    """
+    owner_id = request.user.id
+    target_user_id = request.GET.get("user")
+    if target_user_id is not None:
+        if not _is_admin(request.user):
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            owner_id = int(target_user_id)
+        except ValueError:
             return Response(
-                {"detail": "Cannot move objects belonging to different owners in one request"},
+                {"detail": "Invalid user parameter"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    roots = StoredFile.objects.filter(owner_id=owner_id, is_deleted=True, parent__isnull=True)
+    return Response(services.purge_items(roots))
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@idempotent
+def copy_files(request):
+    """
+    Копирует выбранные объекты (папки — с поддеревьями) в папку parent
+    (null — корень) на сервере, без скачивания и повторной загрузки.
+    Ответ 201: {"copied": N, "items": [...]} — копии верхнего уровня.
+    """
+    qs, error = _bulk_selection(request, "copy")
+    if error is not None:
+        return error
+
+    parent_id = request.data.get("parent")
+    parent = None
+    if parent_id not in (None, "", "null"):
+        try:
+            parent = StoredFile.objects.get(
+                id=int(parent_id),
+                is_folder=True,
+                is_deleted=False,
+            )
+        except (StoredFile.DoesNotExist, ValueError, TypeError):
+            return Response(
+                {"parent": ["Родительская папка не найдена"]},
                 status=400,
             )
 
-    trashed = 0
-    for sf in qs:
-        if sf.is_deleted:
-            continue
-        sf.soft_delete()
-        trashed += 1
+        owner_id = qs.values_list("owner_id", flat=True).first()
+        if not (_is_admin(request.user) or parent.owner_id == request.user.id):
+            return Response({"detail": "Forbidden"}, status=403)
+        if parent.owner_id != owner_id:
+            return Response(
+                {"detail": "Parent folder belongs to a different owner"},
+                status=400,
+            )
 
-    return Response({"trashed": trashed})
+    try:
+        copies = services.copy_items(qs, parent)
+    except OSError as e:
+        return Response(
+            {"detail": f"copy failed: {e}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR,
+        )
+
+    return Response(
+        {"copied": len(copies), "items": [_serialize(sf) for sf in copies]},
+        status=status.HTTP_201_CREATED,
+    )
 
 
 @api_view(["POST"])
 @permission_classes([IsAuthenticated])
+@idempotent
 def bulk_move(request):
     ids = request.data.get("ids")
     parent_id = request.data.get("parent")
 
-    if not isinstance(ids, list) or not ids:
-        return Response(
-            {"detail": "ids must be a non-empty list"},
-            status=400,
-        )
+    if request.data.get("selector") is not None:
+        qs, error = _bulk_selection(request, "move")
+        if error is not None:
+            return error
+    else:
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {"detail": "ids must be a non-empty list"},
+                status=400,
+            )
 
-    try:
-        ids = [int(x) for x in ids]
-    except (TypeError, ValueError):
-        return Response(
-            {"detail": "ids must be integers"},
-            status=400,
-        )
+        try:
+            ids = [int(x) for x in ids]
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "ids must be integers"},
+                status=400,
+            )
 
-    qs = StoredFile.objects.filter(id__in=ids)
+        qs = StoredFile.objects.filter(id__in=ids)
 
-    if not _is_admin(request.user):
-        qs = qs.filter(owner=request.user)
+        if not _is_admin(request.user):
+            qs = qs.filter(owner=request.user)
 
-    if qs.count() != len(set(ids)):
-        return Response({"detail": "Forbidden"}, status=403)
+        if qs.count() != len(set(ids)):
+            return Response({"detail": "Forbidden"}, status=403)
+
+        if qs.filter(is_deleted=True).exists():
+            return Response(
+                {"detail": "Cannot move objects that are in the trash"},
+                status=400,
+            )
 
     # Admin safety: do not allow cross-owner moves.
     # In admin UI we always operate within a single user storage.
     owner_ids = None
     if _is_admin(request.user):
-        owner_ids = set(qs.values_list("owner_id", flat=True))
-        if len(owner_ids) != 1:
+        owner_ids = set(qs.values_list("owner_id", flat=True).distinct())
+        if len(owner_ids) > 1:
             return Response(
                 {"detail": "Cannot move objects belonging to different owners in one request"},
                 status=400,
@@ -662,33 +1151,351 @@ def bulk_move(request):
             return Response({"detail": "Forbidden"}, status=403)
 
         # Ensure we do not move items into a folder of another owner (even for admins).
-        if _is_admin(request.user) and parent is not None and parent.owner_id not in owner_ids:
+        if owner_ids and parent.owner_id not in owner_ids:
             return Response(
                 {"detail": "Parent folder belongs to a different owner"},
                 status=400,
             )
 
-    def is_descendant(folder, target):
-        while target:
-            if target.id == folder.id:
-                return True
-            target = target.parent
-        return False
-
-    for sf in qs:
-        if parent and sf.is_folder and is_descendant(sf, parent):
+    # Цикл: выбрана целевая папка или любой её предок (цепочка — из tree_path)
+    if parent is not None:
+        name = (
+            qs.filter(id__in=[*parent.ancestor_ids, parent.id])
+            .values_list("original_name", flat=True)
+            .first()
+        )
+        if name is not None:
             return Response(
                 {
                     "detail": (
                         f"Нельзя переместить папку "
-                        f"'{sf.original_name}' внутрь самой себя"
+                        f"'{name}' внутрь самой себя"
                     )
                 },
                 status=400,
             )
 
-    qs.update(parent=parent)
-    return Response({"moved": qs.count()})
+    moved = services.move_items(qs, parent)
+    return Response({"moved": moved})
+
+
+# ================= BATCH =================
+
+BATCH_MAX_OPERATIONS = 100
+
+
+class _BatchError(Exception):
+    """
+    Ошибка операции пакета: откатывает весь пакет, data и status_code
+    уходят в ответ.
+    """
+
+    def __init__(self, data: dict, status_code: int = 400):
+        super().__init__(data)
+        self.data = data
+        self.status_code = status_code
+
+
+class _BatchContext:
+    """
+    Общее состояние операций одного пакета: владелец хранилища, кэш
+    объектов (все упомянутые id читаются одним запросом) и результаты
+    выполненных операций для ссылок вида "$0" — id объекта из результата
+    операции с этим номером.
+    """
+
+    def __init__(self, request, owner_id: int, operations: list[dict]):
+        self.request = request
+        self.owner_id = owner_id
+        self.results: list[dict] = []
+
+        ids = set()
+        for op in operations:
+            refs = [op.get("id"), op.get("parent")]
+            if isinstance(op.get("ids"), list):
+                refs.extend(op["ids"])
+            ids.update(ref for ref in refs if isinstance(ref, int))
+        self._objects = StoredFile.objects.in_bulk(ids) if ids else {}
+
+    def resolve_id(self, raw) -> int:
+        if isinstance(raw, str) and raw.startswith("$"):
+            try:
+                return int(self.results[int(raw[1:])]["id"])
+            except (ValueError, IndexError, KeyError, TypeError):
+                raise _BatchError({"detail": f"Invalid reference: {raw}"})
+        try:
+            return int(raw)
+        except (TypeError, ValueError):
+            raise _BatchError({"detail": "ids must be integers"})
+
+    def get(self, raw) -> StoredFile:
+        pk = self.resolve_id(raw)
+        sf = self._objects.get(pk)
+        if sf is None:
+            sf = StoredFile.objects.filter(pk=pk).first()
+            if sf is None:
+                raise _BatchError({"detail": "Not found"}, status.HTTP_404_NOT_FOUND)
+            self._objects[pk] = sf
+        if sf.owner_id != self.owner_id:
+            raise _BatchError({"detail": "Forbidden"}, status.HTTP_403_FORBIDDEN)
+        return sf
+
+    def folder(self, raw) -> StoredFile | None:
+        if raw in (None, "", "null"):
+            return None
+        try:
+            sf = self.get(raw)
+        except _BatchError:
+            sf = None
+        if sf is None or not sf.is_folder or sf.is_deleted:
+            raise _BatchError({"parent": ["Родительская папка не найдена"]})
+        return sf
+
+    def selection(self, raw_ids):
+        if not isinstance(raw_ids, list) or not raw_ids:
+            raise _BatchError({"detail": "ids must be non-empty list"})
+        return StoredFile.objects.filter(id__in={self.get(raw).pk for raw in raw_ids})
+
+    def add(self, sf: StoredFile) -> None:
+        self._objects[sf.pk] = sf
+
+    def refresh(self) -> None:
+        """
+        Перечитывает кэш одним запросом после перемещений/корзины
+        (меняются parent, tree_path и флаги удаления).
+        """
+        if self._objects:
+            self._objects = StoredFile.objects.in_bulk(list(self._objects))
+
+
+def _batch_create_folder(ctx: _BatchContext, op: dict) -> dict:
+    name = (op.get("name") or "").strip()
+    error = _folder_name_error(name)
+    if error is not None:
+        raise _BatchError(error)
+
+    folder = StoredFile.objects.create(
+        owner_id=ctx.owner_id,
+        original_name=name,
+        is_folder=True,
+        parent=ctx.folder(op.get("parent")),
+        size=0,
+        rel_dir="",
+    )
+    ctx.add(folder)
+    return _serialize(folder)
+
+
+def _batch_patch(ctx: _BatchContext, op: dict) -> dict:
+    sf = ctx.get(op.get("id"))
+    _apply_patch(sf, op)
+    return _serialize(sf)
+
+
+def _batch_move(ctx: _BatchContext, op: dict) -> dict:
+    qs = ctx.selection(op.get("ids"))
+    if qs.filter(is_deleted=True).exists():
+        raise _BatchError({"detail": "Cannot move objects that are in the trash"})
+    parent = ctx.folder(op.get("parent"))
+    if parent is not None and qs.filter(id__in=[*parent.ancestor_ids, parent.id]).exists():
+        raise _BatchError({"detail": "Нельзя переместить папку внутрь самой себя"})
+
+    moved = services.move_items(qs, parent)
+    ctx.refresh()
+    return {"moved": moved}
+
+
+def _batch_trash(ctx: _BatchContext, op: dict) -> dict:
+    trashed = ctx.selection(op.get("ids")).move_to_trash()
+    ctx.refresh()
+    return {"trashed": trashed}
+
+
+def _batch_restore(ctx: _BatchContext, op: dict) -> dict:
+    restored = ctx.selection(op.get("ids")).restore_from_trash()
+    ctx.refresh()
+    return {"restored": restored}
+
+
+def _batch_issue_public_link(ctx: _BatchContext, op: dict) -> dict:
+    sf = ctx.get(op.get("id"))
+    if sf.is_folder:
+        raise _BatchError({"detail": "Folders cannot be shared"})
+
+    token = services.issue_public_link(sf)
+    url = ctx.request.build_absolute_uri(f"/d/{token}/")
+    return {"id": sf.id, "token": token, "url": url}
+
+
+_BATCH_OPERATIONS = {
+    "create_folder": _batch_create_folder,
+    "patch": _batch_patch,
+    "move": _batch_move,
+    "trash": _batch_trash,
+    "restore": _batch_restore,
+    "issue_public_link": _batch_issue_public_link,
+}
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+@idempotent
+def batch(request):
+    """
+    Выполняет упорядоченный список операций одной транзакцией:
+
+      {"operations": [
+        {"op": "create_folder", "name": "Отчёты", "parent": null},
+        {"op": "move", "ids": [5, 6, 7], "parent": "$0"},
+        {"op": "patch", "id": 5, "name": "итог.pdf"}
+      ]}
+
+    Операции: create_folder, patch, move, trash, restore, issue_public_link;
+    "$N" — id из результата операции N. Админ работает с хранилищем ?user=.
+
+    Ответ 200: {"results": [...]} — по результату на операцию. При ошибке
+    пакет откатывается целиком, ответ — {"failed": N, "op": ..., "error": {...}}
+    со статусом ошибки операции.
+    """
+    operations = request.data.get("operations")
+    if not isinstance(operations, list) or not operations:
+        return Response(
+            {"detail": "operations must be non-empty list"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    if len(operations) > BATCH_MAX_OPERATIONS:
+        return Response(
+            {"detail": f"At most {BATCH_MAX_OPERATIONS} operations per batch"},
+            status=status.HTTP_400_BAD_REQUEST,
+        )
+    for index, op in enumerate(operations):
+        if not isinstance(op, dict) or op.get("op") not in _BATCH_OPERATIONS:
+            return Response(
+                {
+                    "failed": index,
+                    "error": {
+                        "detail": f"Unknown op, use one of: {', '.join(_BATCH_OPERATIONS)}"
+                    },
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    owner_id = request.user.id
+    target_user_id = request.GET.get("user")
+    if target_user_id is not None:
+        if not _is_admin(request.user):
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            owner_id = int(target_user_id)
+        except ValueError:
+            return Response(
+                {"detail": "Invalid user parameter"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    index = 0
+    try:
+        with transaction.atomic():
+            ctx = _BatchContext(request, owner_id, operations)
+            for index, op in enumerate(operations):
+                ctx.results.append(_BATCH_OPERATIONS[op["op"]](ctx, op))
+    except _BatchError as exc:
+        return Response(
+            {"failed": index, "op": operations[index]["op"], "error": exc.data},
+            status=exc.status_code,
+        )
+
+    return Response({"results": ctx.results})
+
+
+# ================= SEARCH =================
+
+SEARCH_PAGE_SIZE = 20
+SEARCH_MAX_PAGE_SIZE = 100
+
+
+def _encode_search_cursor(rank: int, name: str, pk: int) -> str:
+    return urlsafe_b64encode(json.dumps([rank, name, pk]).encode()).decode()
+
+
+def _decode_search_cursor(raw: str) -> tuple[int, str, int] | None:
+    try:
+        rank, name, pk = json.loads(urlsafe_b64decode(raw.encode()))
+        return int(rank), str(name), int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def search_files(request):
+    """
+    Поиск по подстроке имени во всём хранилище (без корзины).
+
+    ?q= — строка поиска, ?cursor= — курсор следующей страницы,
+    ?limit= — размер страницы, ?user= — хранилище другого пользователя (админ).
+    Каждый результат дополнен путём родительской папки (parent_path).
+    """
+    query = (request.GET.get("q") or "").strip()
+    if not query:
+        return Response({"detail": "q is required"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(query) > 255:
+        return Response({"detail": "q is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+    owner_id = request.user.id
+    target_user_id = request.GET.get("user")
+    if target_user_id is not None:
+        if not _is_admin(request.user):
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        try:
+            owner_id = int(target_user_id)
+        except ValueError:
+            return Response(
+                {"detail": "Invalid user parameter"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+    try:
+        limit = int(request.GET.get("limit", SEARCH_PAGE_SIZE))
+    except ValueError:
+        return Response({"detail": "limit must be integer"}, status=400)
+    limit = max(1, min(limit, SEARCH_MAX_PAGE_SIZE))
+
+    qs = services.search_files(owner_id, query)
+
+    raw_cursor = request.GET.get("cursor")
+    if raw_cursor:
+        cursor = _decode_search_cursor(raw_cursor)
+        if cursor is None:
+            return Response({"detail": "Invalid cursor"}, status=400)
+        rank, name, pk = cursor
+        # Keyset по (rank, original_name, id) — без OFFSET
+        qs = qs.filter(
+            Q(rank__gt=rank)
+            | Q(rank=rank, original_name__gt=name)
+            | Q(rank=rank, original_name=name, id__gt=pk)
+        )
+
+    rows = list(qs.values_list(*_ROW_FIELDS, "rank")[: limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    paths = services.resolve_folder_paths(
+        {row[_PARENT] for row in rows}, owner_id=owner_id
+    )
+    results = []
+    for row in rows:
+        item = _serialize_row(row[:-1], paths)
+        item["parent_path"] = paths.get(row[_PARENT], "")
+        results.append(item)
+
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = _encode_search_cursor(last[-1], last[1], last[0])
+
+    return Response({"results": results, "next_cursor": next_cursor})
+
 
 # ================= STORAGE USAGE =================
 
@@ -723,37 +1530,43 @@ def download_archive(request):
     Собирает ZIP-архив из выбранных файлов и отдаёт его как attachment.
 
     Ожидает JSON:
-      {"ids": [1,2,3]}
+      {"ids": [1,2,3]} или {"selector": {...}} (см. _selector_queryset)
 
     Ограничения:
       - архивируются только файлы (is_folder=False)
       - доступ: владелец или админ
     """
-    ids = request.data.get("ids")
+    if request.data.get("selector") is not None:
+        qs, error = _bulk_selection(request, "archive")
+        if error is not None:
+            return error
+        qs = qs.filter(is_folder=False).order_by("id")
+    else:
+        ids = request.data.get("ids")
 
-    if not isinstance(ids, list) or not ids:
-        return Response(
-            {"detail": "ids must be non-empty list"},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+        if not isinstance(ids, list) or not ids:
+            return Response(
+                {"detail": "ids must be non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-    try:
-        ids = [int(x) for x in ids]
-    except (TypeError, ValueError):
-        return Response(
-            {"detail": "ids must be integers"},
-            status=status.HTTP_400_BAD_REQUEST,
-        )
+        try:
+            ids = [int(x) for x in ids]
+        except (TypeError, ValueError):
+            return Response(
+                {"detail": "ids must be integers"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-    qs = StoredFile.objects.filter(id__in=ids, is_folder=False)
+        qs = StoredFile.objects.filter(id__in=ids, is_folder=False)
 
-    # Права: админ видит всё, обычный пользователь — только своё
-    if not _is_admin(request.user):
-        qs = qs.filter(owner=request.user)
+        # Права: админ видит всё, обычный пользователь — только своё
+        if not _is_admin(request.user):
+            qs = qs.filter(owner=request.user)
 
-    # Если чего-то не нашли или нет прав — считаем это forbidden
-    if qs.count() != len(set(ids)):
-        return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
+        # Если чего-то не нашли или нет прав — считаем это forbidden
+        if qs.count() != len(set(ids)):
+            return Response({"detail": "Forbidden"}, status=status.HTTP_403_FORBIDDEN)
 
     # Создаём ZIP во временном файле
     tmp = NamedTemporaryFile(prefix="mycloud_", suffix=".zip", delete=False)
@@ -800,3 +1613,152 @@ def download_archive(request):
             {"detail": f"archive build failed: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR,
         )
+
+
+# ================= CHANGE FEED =================
+
+CHANGES_PAGE_SIZE = 500
+CHANGES_MAX_PAGE_SIZE = 2000
+
+_CHANGE_FIELDS = (
+    "id",
+    "kind",
+    "file_id",
+    "parent_id",
+    "name",
+    "is_folder",
+    "size",
+    "is_deleted",
+    "created_at",
+)
+
+
+def _encode_cursor(last_id: int) -> str:
+    return f"{last_id}.{int(timezone.now().timestamp())}"
+
+
+def _decode_cursor(raw: str) -> tuple[int, int] | None:
+    """
+    "<id последней записи>.<unix-время выдачи>" -> (id, время); None, если мусор.
+    """
+    last_id, _, issued = raw.partition(".")
+    try:
+        return int(last_id), int(issued)
+    except ValueError:
+        return None
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def list_changes(request):
+    """
+    Изменения хранилища текущего пользователя после курсора ?since=.
+
+    Возвращает пачку снимков (по одному — последнему — на объект),
+    новый курсор и признак has_more. Без since — весь сохранённый журнал.
+    Курсор старше срока хранения журнала -> 410 (нужна полная пересинхронизация).
+    """
+    since_id = 0
+    since = request.query_params.get("since")
+    if since:
+        cursor = _decode_cursor(since)
+        if cursor is None:
+            return Response({"detail": "Invalid cursor"}, status=400)
+        since_id, issued = cursor
+        retention = timedelta(days=settings.STORAGE_CHANGES_RETENTION_DAYS)
+        if issued < (timezone.now() - retention).timestamp():
+            return Response(
+                {"detail": "Cursor expired, full resync required", "reset": True},
+                status=status.HTTP_410_GONE,
+            )
+
+    try:
+        limit = int(request.query_params.get("limit", CHANGES_PAGE_SIZE))
+    except ValueError:
+        return Response({"detail": "limit must be integer"}, status=400)
+    limit = max(1, min(limit, CHANGES_MAX_PAGE_SIZE))
+
+    rows = list(
+        StorageChange.objects.filter(owner_id=request.user.id, id__gt=since_id)
+        .order_by("id")
+        .values_list(*_CHANGE_FIELDS)[: limit + 1]
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Внутри пачки клиенту нужен только последний снимок каждого объекта
+    latest: dict[int, tuple] = {}
+    for row in rows:
+        latest.pop(row[2], None)
+        latest[row[2]] = row
+
+    changes = [
+        {
+            "seq": seq,
+            "kind": kind,
+            "id": file_id,
+            "parent": parent_id,
+            "name": name,
+            "is_folder": is_folder,
+            "size": size,
+            "is_deleted": is_deleted,
+            "at": created_at,
+        }
+        for seq, kind, file_id, parent_id, name, is_folder, size, is_deleted, created_at
+        in latest.values()
+    ]
+
+    return Response(
+        {
+            "changes": changes,
+            "cursor": _encode_cursor(rows[-1][0] if rows else since_id),
+            "has_more": has_more,
+        }
+    )
+
+
+# ================= LIVE UPDATES (SSE) =================
+
+async def _sse_stream(broker, owner_id: int, heartbeat: float):
+    """
+    Поток text/event-stream: событие storage на каждое (схлопнутое)
+    изменение и комментарий-пинг, если событий не было heartbeat секунд.
+
+    Медленный клиент сам тормозит генератор (ASGI ждёт отправки чанка),
+    а подписка тем временем хранит только последнее событие.
+    """
+    sub = broker.subscribe(owner_id)
+    try:
+        yield b"retry: 5000\n\n"
+        while True:
+            payload = await sub.get(heartbeat)
+            if payload is None:
+                yield b": ping\n\n"
+            else:
+                yield b"event: storage\ndata: " + dumps(payload) + b"\n\n"
+    finally:
+        sub.close()
+
+
+@require_GET
+async def storage_events(request):
+    """
+    SSE-канал уведомлений об изменениях хранилища текущего пользователя.
+    После события клиент дочитывает изменения через /api/changes/?since=.
+
+    Держит соединение открытым, поэтому рассчитан на запуск под ASGI.
+    """
+    user = await request.auser()
+    if not user.is_authenticated:
+        return JsonResponse(
+            {"detail": "Authentication credentials were not provided."},
+            status=403,
+        )
+
+    response = StreamingHttpResponse(
+        _sse_stream(events.get_broker(), user.id, settings.STORAGE_EVENTS_HEARTBEAT),
+        content_type="text/event-stream",
+    )
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response